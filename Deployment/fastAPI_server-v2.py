@@ -3,9 +3,11 @@ from pydantic import BaseModel
 from vllm import LLM
 from vllm.sampling_params import SamplingParams
 from vllm.entrypoints.chat_utils import ChatCompletionMessageParam
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 from contextlib import asynccontextmanager
 from typing import cast
+import itertools
+from prompts import PROMPT_REGISTRY, assemble_prompt
 
 # Default values
 DEFAULT_TEMPERATURE = 0.2
@@ -22,12 +24,19 @@ class ChatRequest(BaseModel):
     messages: List[Message]
     temperature: Optional[float] = DEFAULT_TEMPERATURE
     max_tokens: Optional[int] = DEFAULT_MAX_TOKENS
+    stop: Optional[Union[str, List[str]]] = None
+    # Registry prompt to prepend as the system prompt (see prompts/registry.json)
+    prompt_id: Optional[str] = None
+    prompt_version: Optional[str] = None
 
 
 class ModelManager:
     """Manages the LLM instance"""
     def __init__(self):
         self.llm: Optional[LLM] = None
+        # prompt ID -> system prompt text / pre-tokenized prompt
+        self.prompts: Dict[str, str] = {}
+        self.prompt_tokens: Dict[str, List[int]] = {}
     
     def load(self):
         print("Loading model...")
@@ -37,8 +46,32 @@ class ModelManager:
             max_model_len=4096,
             gpu_memory_utilization=0.9,
             dtype="auto",
+            # Requests with the same registry prompt share its KV cache blocks
+            enable_prefix_caching=True,
         )
         print("Model loaded successfully!")
+        self.load_prompts()
+    
+    def load_prompts(self):
+        """Assemble and tokenize every registry prompt, and warm the prefix cache with them"""
+        order = PROMPT_REGISTRY["module_order"]
+        prompt_ids = ["medical"] + [
+            "+".join(combination)
+            for size in range(1, len(order) + 1)
+            for combination in itertools.combinations(order, size)
+        ]
+        tokenizer = self.llm.get_tokenizer()
+        warmup = SamplingParams(max_tokens=1)
+        for prompt_id in prompt_ids:
+            text = assemble_prompt(PROMPT_REGISTRY, prompt_id)
+            self.prompts[prompt_id] = text
+            self.prompt_tokens[prompt_id] = tokenizer.encode(text, add_special_tokens=False)
+            self.llm.chat(
+                messages=[{"role": "system", "content": text}, {"role": "user", "content": "hi"}],
+                sampling_params=warmup,
+                use_tqdm=False,
+            )
+        print(f"Loaded prompt registry v{PROMPT_REGISTRY['version']} ({PROMPT_REGISTRY['hash'][:12]}): {len(self.prompts)} prompts")
     
     def get_llm(self) -> LLM:
         if self.llm is None:
@@ -65,6 +98,16 @@ app = FastAPI(title="Medical LLaMA API", lifespan=lifespan)
 async def health():
     return {"status": "healthy"}
 
+@app.get("/prompts")
+async def prompts():
+    """Registry version and hash, checked by the backend before it sends prompt IDs"""
+    return {
+        "version": PROMPT_REGISTRY["version"],
+        "hash": PROMPT_REGISTRY["hash"],
+        "prompts": {prompt_id: len(tokens) for prompt_id, tokens in model_manager.prompt_tokens.items()},
+    }
+
+
 @app.post("/predict")
 async def chat_completions(request: ChatRequest):
     try:
@@ -76,28 +119,35 @@ async def chat_completions(request: ChatRequest):
     #     {"role": m.role, "content": m.content}
     #     for m in request.messages
     # ]
-    messages = cast(
-        list[ChatCompletionMessageParam],
-        [{"role": m.role, "content": m.content} for m in request.messages]
-    )
-
-    temperature = request.temperature or DEFAULT_TEMPERATURE
+    messages = [{"role": m.role, "content": m.content} for m in request.messages]
+
+    if request.prompt_id is not None:
+        # The backend assembled its messages against a registry with this hash
+        if request.prompt_version != PROMPT_REGISTRY["hash"] or request.prompt_id not in model_manager.prompts:
+            raise HTTPException(status_code=409, detail="Prompt registry mismatch")
+        system_prompt = model_manager.prompts[request.prompt_id]
+        if messages and messages[0]["role"] == "system":
+            # e.g. the conversation summary, sent after the registry prompt
+            messages[0]["content"] = f"{system_prompt}\n\n{messages[0]['content']}"
+        else:
+            messages.insert(0, {"role": "system", "content": system_prompt})
+
+    messages = cast(list[ChatCompletionMessageParam], messages)
+
+    # 0.0 (greedy, used for tool calls) is a valid temperature
+    temperature = request.temperature if request.temperature is not None else DEFAULT_TEMPERATURE
     max_tokens = request.max_tokens or DEFAULT_MAX_TOKENS
 
-    # Emergency cap
-    last_user_msg = request.messages[-1].content.lower()
-    if any(k in last_user_msg for k in [
-        "heart attack", "chest pain", "unconscious",
-        "not breathing", "stroke", "emergency"
-    ]):
-        max_tokens = min(max_tokens, 50)
+    # The backend picks max_tokens and stop sequences per query class
+    # (emergency, tool call, booking, ...), so no keyword cap is applied here
+    stop = [request.stop] if isinstance(request.stop, str) else request.stop
 
     sampling_params = SamplingParams(
         temperature=temperature,
         max_tokens=max_tokens,
         # repetition_penalty=1.35,
         top_p=0.9,
-        
+        stop=stop,
         # stop=["<|eot_id|>","</s>", "<|user|>", "<|system|>"],
         # ignore_eos=False,
     )
@@ -107,7 +157,8 @@ async def chat_completions(request: ChatRequest):
         sampling_params=sampling_params,
     )
 
-    output_text = outputs[0].outputs[0].text.strip()
+    output = outputs[0].outputs[0]
+    output_text = output.text.strip()
     # return output_text
 
     return {
@@ -121,9 +172,13 @@ async def chat_completions(request: ChatRequest):
                     "role": "assistant",
                     "content": output_text
                 },
-                "finish_reason": "stop"
+                "finish_reason": output.finish_reason or "stop"
             }
-        ]
+        ],
+        "usage": {
+            "prompt_tokens": len(outputs[0].prompt_token_ids or []),
+            "completion_tokens": len(output.token_ids)
+        }
     }
 
 
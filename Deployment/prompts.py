@@ -1,51 +1,54 @@
-SYSTEM_PROMPT = """
-You are a medical assistance AI trained to provide accurate, evidence-based medical information.
-
-Respond in a calm, professional, and patient-friendly manner.
-Use clear, simple, and respectful language.
-Avoid unnecessary technical jargon unless the user asks for it.
-Be concise but complete.
-Do not invent facts.
-If you are unsure or information is missing, say so clearly.
-
-CRITICAL EMERGENCY OVERRIDE (HIGHEST PRIORITY):
-If the user describes symptoms suggesting a medical emergency
-(e.g., chest pain, heart attack, stroke, unconsciousness, severe bleeding, difficulty breathing):
-1. Immediately instruct the user to call emergency services (112).
-2. Clearly state that this is an emergency.
-3. Provide only basic, general first-aid guidance.
-4. Use a numbered list with no more than 5 steps.
-5. Do not repeat instructions.
-6. Do not give diagnoses or personalized treatment.
-7. Stop the response after emergency guidance.
-
-For non-emergency medical questions:
-- Explain conditions, medicines, tests, and treatments accurately.
-- Focus on established medical knowledge.
-- Keep answers within 4–6 sentences unless detailed explanation is requested.
-
-When defining a disease:
-- Start with a one-sentence definition.
-- Briefly explain the core biological mechanism.
-- Mention common causes or types if relevant.
-- Keep the explanation patient-friendly.
-
-When discussing treatment or medication:
-- Describe general treatment approaches only.
-- Do not provide personalized treatment plans.
-- Do not give drug dosages unless explicitly asked and appropriate.
-- Use generic drug names when possible.
-
-When asked about symptoms:
-- List common symptoms first.
-- Avoid repetition.
-- Do not diagnose based on symptoms alone.
-
-Never repeat the same sentence or instruction in one response.
-
-Emergency note: I cannot replace emergency medical care. Call 112 immediately for life-threatening symptoms.
-
-Developer details:
-This LLM is trained by Rishabh Kushwaha and Reshma using a Medical LLaMA-based architecture.
-
-"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+# Shared with the backend (backend/services/prompts.py); both sides must hash it the same way
+DEFAULT_REGISTRY_PATH = Path(__file__).resolve().parent.parent / "prompts" / "registry.json"
+
+
+def load_prompt_registry(path: Path) -> dict:
+    """Load the registry manifest and its text files, plus a hash of their content"""
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+
+    def read(name: str) -> str:
+        return (path.parent / name).read_text(encoding="utf-8")
+
+    registry = {
+        "version": manifest["version"],
+        "base": read(manifest["base"]),
+        "tools_header": read(manifest["tools_header"]),
+        "tools_footer": read(manifest["tools_footer"]),
+        "module_order": list(manifest["module_order"]),
+        "modules": {name: read(manifest["modules"][name]) for name in manifest["module_order"]},
+    }
+    content = json.dumps({key: value for key, value in registry.items() if key != "version"}, sort_keys=True)
+    registry["hash"] = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return registry
+
+
+def assemble_prompt(registry: dict, prompt_id: str) -> str:
+    """
+    Build the system prompt for an ID: "medical" is the base prompt alone,
+    otherwise the ID lists action modules joined by "+" (e.g. "doctors+booking").
+    """
+    if prompt_id == "medical":
+        return registry["base"]
+
+    modules = prompt_id.split("+")
+    unknown = [name for name in modules if name not in registry["modules"]]
+    if unknown:
+        raise KeyError(f"Unknown prompt modules: {', '.join(unknown)}")
+
+    selected = [name for name in registry["module_order"] if name in modules]
+    return (
+        registry["base"]
+        + registry["tools_header"]
+        + "".join(registry["modules"][name] for name in selected)
+        + registry["tools_footer"]
+    )
+
+
+PROMPT_REGISTRY = load_prompt_registry(Path(os.environ.get("PROMPT_REGISTRY_PATH") or DEFAULT_REGISTRY_PATH))
+
+SYSTEM_PROMPT = PROMPT_REGISTRY["base"]
@@ -0,0 +1,114 @@
+"""
+Benchmark: doctor name resolution and autocomplete on a large catalog.
+
+Builds a synthetic catalog of --doctors doctors in memory (no database
+needed) and times resolving doctor names the way routes/chat.py used to
+(a substring scan over every doctor) and through the prefix index in
+catalog_service, plus /api/search/suggest lookups. Also reports how long
+building the snapshot's indexes takes, which happens on every catalog reload.
+
+Usage (from the backend directory):
+    python benchmarks/bench_catalog_search.py --doctors 5000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time; nothing is contacted
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "benchmark")
+os.environ.setdefault("LLM_API_URL", "http://127.0.0.1:8000/v1/chat/completions")
+os.environ.setdefault("LLM_API_KEY", "benchmark")
+os.environ.setdefault("LLM_MODEL", "benchmark-model")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("GMAIL_USER", "benchmark@example.com")
+os.environ.setdefault("GMAIL_PASS", "benchmark")
+
+from services.catalog_service import CatalogCache, CatalogSnapshot  # noqa: E402
+
+FIRST_NAMES = ["Sarah", "Michael", "Emily", "James", "Lisa", "Robert", "Amanda", "David", "Priya", "Rahul",
+               "Anita", "Vikram", "Meera", "Arjun", "Kavya", "Rohan", "Neha", "Sanjay", "Pooja", "Aditya"]
+LAST_NAMES = ["Johnson", "Chen", "Williams", "Brown", "Anderson", "Martinez", "Thompson", "Wilson", "Sharma",
+              "Gupta", "Patel", "Reddy", "Iyer", "Nair", "Singh", "Kapoor", "Mehta", "Rao", "Joshi", "Das"]
+SPECIALIZATIONS = ["Cardiologist", "Dermatologist", "Pediatrician", "Orthopedic Surgeon", "Neurologist",
+                   "General Physician", "Gynecologist", "Psychiatrist", "Oncologist", "Nephrologist"]
+CITIES = ["Delhi", "Mumbai", "Bangalore", "Gurgaon", "Chennai", "Hyderabad", "Pune", "Kolkata"]
+LOOKUPS = 2000
+
+
+def make_catalog(count: int):
+    rng = random.Random(42)
+    doctors = [{
+        "id": f"doc_{i:05d}",
+        "name": f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{i}",
+        "specialization": rng.choice(SPECIALIZATIONS),
+    } for i in range(count)]
+    hospitals = [{
+        "id": f"hosp_{i:04d}",
+        "name": f"Hospital {i}",
+        "city": rng.choice(CITIES),
+        "specializations": rng.sample(SPECIALIZATIONS, 3),
+        "emergency_available": rng.random() < 0.5,
+    } for i in range(max(1, count // 10))]
+    return doctors, hospitals
+
+
+def legacy_find(doctors, doctor_name: str):
+    """find_doctor_by_name as it used to run: a substring scan over every doctor"""
+    clean_name = doctor_name.replace("Dr.", "").replace("Dr", "").strip()
+    for doc in doctors:
+        doc_clean_name = doc.get("name", "").replace("Dr.", "").replace("Dr", "").strip()
+        if clean_name.lower() in doc_clean_name.lower() or doc_clean_name.lower() in clean_name.lower():
+            return doc
+    return None
+
+
+async def main(count: int):
+    doctors, hospitals = make_catalog(count)
+    start = time.perf_counter()
+    snapshot = CatalogSnapshot(doctors, hospitals, version=1)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    cache = CatalogCache(ttl_seconds=3600, version_check_seconds=3600)
+    cache._snapshot = snapshot
+    cache._checked_at = time.monotonic()
+
+    rng = random.Random(7)
+    names = [rng.choice(doctors)["name"] for _ in range(LOOKUPS)]
+    prefixes = [rng.choice(doctors)["name"][4:4 + rng.randint(1, 6)] for _ in range(LOOKUPS)]
+
+    print(f"catalog: {count} doctors, {len(hospitals)} hospitals; index build {build_ms:.1f} ms")
+    print(f"{'lookup':<22} {'us/lookup':>10} {'resolved':>9}")
+
+    start = time.perf_counter()
+    legacy_hits = sum(legacy_find(doctors, name)["name"] == name for name in names)
+    legacy_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+    print(f"{'name (legacy scan)':<22} {legacy_us:>10.1f} {legacy_hits:>9}")
+
+    start = time.perf_counter()
+    hits = 0
+    for name in names:
+        hits += (await cache.find_doctor_by_name(name))["name"] == name
+    current_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+    print(f"{'name (prefix index)':<22} {current_us:>10.1f} {hits:>9}")
+
+    start = time.perf_counter()
+    for prefix in prefixes:
+        await cache.suggest(prefix, limit=10)
+    suggest_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+    print(f"{'suggest (10 results)':<22} {suggest_us:>10.1f} {'-':>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doctors", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.doctors))
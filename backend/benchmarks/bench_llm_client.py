@@ -0,0 +1,121 @@
+"""
+Benchmark: per-turn latency of a fresh httpx client per request (old behaviour)
+versus the shared, pooled LLMService client, under concurrent load.
+
+Starts a local stand-in for the OpenAI-compatible LLM server so no GPU or
+network access is needed.
+
+Usage (from the backend directory):
+    python benchmarks/bench_llm_client.py --turns 400 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HOST = "127.0.0.1"
+PORT = 8765
+URL = f"http://{HOST}:{PORT}/v1/chat/completions"
+
+# Settings are read at import time, point them at the stand-in server
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "benchmark")
+os.environ["LLM_API_URL"] = URL
+os.environ.setdefault("LLM_API_KEY", "benchmark")
+os.environ.setdefault("LLM_MODEL", "benchmark-model")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("GMAIL_USER", "benchmark@example.com")
+os.environ.setdefault("GMAIL_PASS", "benchmark")
+
+from services.llm_service import LLMService  # noqa: E402
+
+stub = FastAPI()
+
+
+@stub.post("/v1/chat/completions")
+async def completions(payload: dict):
+    # Simulate a short generation so connection setup is a visible share of the turn
+    await asyncio.sleep(0.005)
+    return {
+        "choices": [
+            {"message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}
+        ]
+    }
+
+
+async def fresh_client_turn(messages):
+    """The previous behaviour: a brand-new client (and connection) per turn"""
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            URL,
+            json={"model": "benchmark-model", "messages": messages, "max_tokens": 1024},
+            timeout=60.0
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+
+async def run(label, turn, turns, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    messages = [{"role": "user", "content": "What is diabetes?"}]
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await turn(messages)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(turns)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<22} p50={p50:7.2f} ms  p95={p95:7.2f} ms  throughput={turns / wall:7.1f} turns/s")
+    return p50
+
+
+async def main(turns, concurrency):
+    server = uvicorn.Server(uvicorn.Config(stub, host=HOST, port=PORT, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    service = LLMService()
+    await service.connect()
+    await service.warmup()
+
+    try:
+        fresh = await run("fresh client per turn", fresh_client_turn, turns, concurrency)
+        pooled = await run(
+            "pooled LLMService",
+            lambda messages: service.get_completion(messages, tools_available=False),
+            turns,
+            concurrency
+        )
+        print(f"p50 latency saved per turn: {fresh - pooled:.2f} ms")
+    finally:
+        await service.close()
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.concurrency))
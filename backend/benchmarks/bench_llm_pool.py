@@ -0,0 +1,131 @@
+"""
+Benchmark: turn latency over several LLM replicas with least-outstanding
+balancing, circuit breaking and hedged requests.
+
+Starts local stand-ins for the OpenAI-compatible LLM server with injected
+latency: a fast replica, a replica with a slow tail (some requests stall)
+and a replica that is down (503). Runs the same load with hedging off and
+on and prints latency percentiles plus the pool state.
+
+Usage (from the backend directory):
+    python benchmarks/bench_llm_pool.py --turns 300 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HOST = "127.0.0.1"
+REPLICAS = {
+    # port: (base latency s, probability of a stall, stall latency s, healthy)
+    8771: (0.02, 0.0, 0.0, True),
+    8772: (0.02, 0.15, 1.5, True),
+    8773: (0.02, 0.0, 0.0, False),
+}
+
+# Settings are read at import time, point them at the stand-in servers
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "benchmark")
+os.environ["LLM_API_URL"] = f"http://{HOST}:8771/v1/chat/completions"
+os.environ["LLM_API_URLS"] = ",".join(f"http://{HOST}:{port}/v1/chat/completions" for port in REPLICAS)
+os.environ.setdefault("LLM_API_KEY", "benchmark")
+os.environ.setdefault("LLM_MODEL", "benchmark-model")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("GMAIL_USER", "benchmark@example.com")
+os.environ.setdefault("GMAIL_PASS", "benchmark")
+os.environ["LLM_HEALTH_CHECK_INTERVAL_SECONDS"] = "0"
+os.environ["LLM_HEDGE_MIN_DELAY_SECONDS"] = "0.05"
+
+from config import settings  # noqa: E402
+from services.llm_service import LLMService  # noqa: E402
+
+
+def make_replica(base, stall_probability, stall, healthy):
+    replica = FastAPI()
+
+    @replica.post("/v1/chat/completions")
+    async def completions(payload: dict):
+        if not healthy:
+            raise HTTPException(status_code=503, detail="replica down")
+        delay = stall if random.random() < stall_probability else base
+        await asyncio.sleep(delay)
+        return {
+            "choices": [
+                {"message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}
+            ]
+        }
+
+    @replica.get("/health")
+    async def health():
+        if not healthy:
+            raise HTTPException(status_code=503, detail="replica down")
+        return {"status": "healthy"}
+
+    return replica
+
+
+async def run(label, service, turns, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(turn):
+        # Distinct messages so single-flight coalescing doesn't hide the upstream latency
+        messages = [{"role": "user", "content": f"What is diabetes? ({turn})"}]
+        async with semaphore:
+            start = time.perf_counter()
+            await service.get_completion(messages, tools_available=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(turn) for turn in range(turns)))
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+    print(f"{label:<14} p50={percentile(50):7.1f} ms  p95={percentile(95):7.1f} ms  p99={percentile(99):7.1f} ms")
+
+
+async def main(turns, concurrency):
+    servers = []
+    for port, replica in REPLICAS.items():
+        server = uvicorn.Server(uvicorn.Config(make_replica(*replica), host=HOST, port=port, log_level="warning"))
+        servers.append((server, asyncio.create_task(server.serve())))
+    while not all(server.started for server, _ in servers):
+        await asyncio.sleep(0.05)
+
+    try:
+        for hedge in (False, True):
+            settings.llm_hedge_enabled = hedge
+            service = LLMService()
+            await service.connect()
+            try:
+                await run(f"hedging {'on' if hedge else 'off'}", service, turns, concurrency)
+                stats = service.stats()
+                for endpoint in stats["pool"]["endpoints"]:
+                    print(f"    {endpoint['url']}: {endpoint['state']:<9} requests={endpoint['requests']} failures={endpoint['failures']}")
+                print(f"    hedged={stats['hedged']} hedge_wins={stats['hedge_wins']} failovers={stats['failovers']}")
+            finally:
+                await service.close()
+    finally:
+        for server, task in servers:
+            server.should_exit = True
+            await task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.concurrency))
@@ -0,0 +1,79 @@
+"""
+Benchmark: system prompt size per request class with modular prompts.
+
+Runs a set of typical turns (medical question, doctor list, booking flow,
+hospitals, appointments, password) through the prompt assembler and prints
+the system prompt tokens of each class next to the full tool prompt every
+turn used to carry. Set LLM_TOKENIZER to count with the model's tokenizer.
+
+Usage (from the backend directory):
+    python benchmarks/bench_prompt_modules.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time; the benchmark never connects anywhere
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "benchmark")
+os.environ.setdefault("LLM_API_URL", "http://127.0.0.1:8000/v1/chat/completions")
+os.environ.setdefault("LLM_API_KEY", "benchmark")
+os.environ.setdefault("LLM_MODEL", "benchmark-model")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("GMAIL_USER", "benchmark@example.com")
+os.environ.setdefault("GMAIL_PASS", "benchmark")
+
+from services.context_service import context_builder  # noqa: E402
+from services.prompts import PromptAssembler  # noqa: E402
+
+DOCTOR_LIST = "Here are the available doctors:\n1. Dr. Sarah Johnson (Cardiologist)\n   ID: doc_001"
+BOOKING_SUMMARY = (
+    "📋 **Please confirm your appointment:**\n - 📅 Date: 2026-02-15\n - ⏰ Time: 10:00\n"
+    "Type **YES** to confirm or **NO** to cancel."
+)
+APPOINTMENT_LIST = "Your appointments:\n1. Dr. Sarah Johnson on 2026-02-15 at 10:00 (ID: apt_12ab34)"
+
+TURNS = [
+    ("What is diabetes?", None),
+    ("What are the symptoms of a migraine?", None),
+    ("Show me cardiologists", None),
+    ("List all doctors", None),
+    ("I want Dr. Sarah Johnson", DOCTOR_LIST),
+    ("Book doc_001 on 2026-02-15 at 10:00 for chest checkup", None),
+    ("yes", BOOKING_SUMMARY),
+    ("Hospitals in Delhi", None),
+    ("Show my appointments", None),
+    ("Cancel the first one", APPOINTMENT_LIST),
+    ("I want to change my password", None),
+    ("Show doctors and hospitals in Mumbai", None),
+]
+
+
+def main():
+    assembler = PromptAssembler(context_builder.counter)
+    full = assembler.tokens[assembler.ALL_MODULES]
+    print(f"token counter: {context_builder.counter.method}, prompt variants: {len(assembler.prompts)}")
+    print(f"{'turn':<54} {'class':<26} {'tokens':>6} {'saved':>6}")
+    for query, previous in TURNS:
+        messages = []
+        if previous:
+            messages.append({"role": "assistant", "content": previous})
+        messages.append({"role": "user", "content": query})
+        modules = assembler.select_modules(messages)
+        assembler.build(messages, tools_available=True)
+        tokens = assembler.tokens[modules]
+        print(f"{query:<54} {assembler.request_class(modules):<26} {tokens:>6} {full - tokens:>6}")
+
+    stats = assembler.stats()
+    print(f"\nfull prompt: {full} tokens")
+    for name, entry in stats["classes"].items():
+        print(f"    {name:<26} {entry['system_tokens']:>5} tokens ({entry['system_tokens'] / full:.0%} of full)")
+    print(f"average saved per turn: {stats['saved_tokens'] / len(TURNS):.0f} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Stress test: hundreds of simultaneous bookings of the same doctor slot.
+
+Fires --bookings concurrent bookings at one slot against a real MongoDB,
+first the way bookings used to run (check_appointment_conflict, then
+insert), then through db_service.create_appointment, where the unique
+partial index on (doctor_id, appointment_date, appointment_time) makes
+the insert itself the conflict check. Reports how many bookings succeeded
+(exactly one may), how many were rejected, and round trips per booking.
+Exits with status 1 if the current path double-books.
+
+Usage (from the backend directory; the scratch database is dropped at the end):
+    MONGODB_URL=mongodb://localhost:27017 python benchmarks/bench_slot_reservation.py --bookings 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time; only MongoDB is used
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "slot_reservation_check")
+os.environ.setdefault("LLM_API_URL", "http://127.0.0.1:8000/v1/chat/completions")
+os.environ.setdefault("LLM_API_KEY", "benchmark")
+os.environ.setdefault("LLM_MODEL", "benchmark-model")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("GMAIL_USER", "benchmark@example.com")
+os.environ.setdefault("GMAIL_PASS", "benchmark")
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo import monitoring  # noqa: E402
+from config import settings  # noqa: E402
+from services.db_service import db_service, SlotUnavailableError  # noqa: E402
+
+DOCTOR_ID = "doc_stress"
+DATE = "2030-01-15"
+TIME = "10:00 AM"
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent by the client"""
+
+    def __init__(self):
+        self.commands = 0
+
+    def started(self, event):
+        self.commands += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def legacy_booking(user_id: str) -> bool:
+    """The booking as it used to run: look for a conflict, then insert"""
+    existing = await db_service.db.appointments.find_one({
+        "doctor_id": DOCTOR_ID,
+        "appointment_date": DATE,
+        "appointment_time": TIME,
+        "status": {"$ne": "cancelled"}
+    })
+    if existing:
+        return False
+    await db_service.db.appointments.insert_one({
+        "user_id": user_id,
+        "doctor_id": DOCTOR_ID,
+        "appointment_date": DATE,
+        "appointment_time": TIME,
+        "status": "scheduled"
+    })
+    return True
+
+
+async def current_booking(user_id: str) -> bool:
+    """The booking as it runs now: the insert is the conflict check"""
+    try:
+        await db_service.create_appointment(user_id, DOCTOR_ID, "Dr. Stress", "Cardiologist", DATE, TIME)
+        return True
+    except SlotUnavailableError:
+        return False
+
+
+async def run(name: str, booking, bookings: int, counter: CommandCounter) -> int:
+    await db_service.db.appointments.delete_many({})
+    counter.commands = 0
+    start = time.perf_counter()
+    results = await asyncio.gather(*[booking(f"user_{i}") for i in range(bookings)])
+    elapsed = time.perf_counter() - start
+
+    booked = sum(results)
+    stored = await db_service.db.appointments.count_documents({"doctor_id": DOCTOR_ID, "status": "scheduled"})
+    print(
+        f"{name:<8} {booked:>7} {bookings - booked:>9} {stored:>7} "
+        f"{counter.commands / bookings:>12.2f} {elapsed * 1000:>9.0f}"
+    )
+    return stored
+
+
+async def main(bookings: int, database: str) -> int:
+    counter = CommandCounter()
+    # A plain client with the listener instead of db_service.connect(), which forces TLS
+    db_service.client = AsyncIOMotorClient(settings.mongodb_url, event_listeners=[counter], maxPoolSize=100)
+    db_service.db = db_service.client[database]
+
+    try:
+        await db_service.client.drop_database(database)
+        print(f"{bookings} simultaneous bookings of {DOCTOR_ID} on {DATE} at {TIME}")
+        print(f"{'path':<8} {'booked':>7} {'rejected':>9} {'stored':>7} {'round trips':>12} {'total ms':>9}")
+        # Without the slot index, as before
+        await run("legacy", legacy_booking, bookings, counter)
+        await db_service.ensure_indexes()
+        stored = await run("current", current_booking, bookings, counter)
+    finally:
+        await db_service.client.drop_database(database)
+        db_service.client.close()
+
+    return 0 if stored == 1 else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--database", default="slot_reservation_check", help="scratch database, dropped before and after the run")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.bookings, args.database)))
@@ -0,0 +1,123 @@
+"""
+Benchmark: MongoDB round trips and bytes read per chat turn.
+
+Replays the database work of an LLM chat turn against a real MongoDB, the
+way routes/chat.py used to do it (full get_chat, add_message for the user
+message, update_chat_title, get_chat_context, add_message for the reply)
+and the way it does now (get_turn_context reading the chat and its last
+messages concurrently, one append_messages). Every command is counted with
+a pymongo CommandListener. The chat is pre-filled with a long history so
+the full-history read shows.
+
+Usage (from the backend directory; writes to a throwaway chat in
+DATABASE_NAME, default "benchmark"):
+    MONGODB_URL=mongodb://localhost:27017 python benchmarks/bench_turn_round_trips.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time; only MongoDB is used
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "benchmark")
+os.environ.setdefault("LLM_API_URL", "http://127.0.0.1:8000/v1/chat/completions")
+os.environ.setdefault("LLM_API_KEY", "benchmark")
+os.environ.setdefault("LLM_MODEL", "benchmark-model")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("GMAIL_USER", "benchmark@example.com")
+os.environ.setdefault("GMAIL_PASS", "benchmark")
+
+import bson  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo import monitoring  # noqa: E402
+from config import settings  # noqa: E402
+from services.db_service import db_service  # noqa: E402
+
+USER_ID = "benchmark-user"
+HISTORY_MESSAGES = 200
+TURNS = 20
+QUESTION = "What are the symptoms of type 2 diabetes?"
+ANSWER = "Common symptoms of type 2 diabetes include increased thirst, frequent urination, fatigue and blurred vision. " * 4
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands and reply bytes sent by the client"""
+
+    def __init__(self):
+        self.commands = 0
+        self.reply_bytes = 0
+
+    def started(self, event):
+        self.commands += 1
+
+    def succeeded(self, event):
+        self.reply_bytes += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+async def legacy_turn(chat_id: str, first_turn: bool):
+    """The turn as it used to run: five sequential round trips and a full-document read"""
+    chat = await db_service.get_chat(chat_id, USER_ID)
+    await db_service.add_message(chat_id, "user", QUESTION)
+    if first_turn or not chat["messages"]:
+        await db_service.update_chat_title(chat_id, QUESTION)
+    await db_service.get_chat_context(chat_id, count=settings.llm_context_fetch_messages)
+    await db_service.add_message(chat_id, "assistant", ANSWER)
+
+
+async def current_turn(chat_id: str, first_turn: bool):
+    """The turn as routes/chat.py runs it now: the last messages only, both messages saved together"""
+    chat = await db_service.get_turn_context(chat_id, USER_ID, settings.llm_context_fetch_messages)
+    title = QUESTION if first_turn or chat["message_count"] == 0 else None
+    await db_service.append_messages(
+        chat_id,
+        [db_service.make_message("user", QUESTION), db_service.make_message("assistant", ANSWER)],
+        title=title
+    )
+
+
+async def measure(name: str, turn, counter: CommandCounter):
+    chat_id = (await db_service.create_chat("New Chat", USER_ID))["id"]
+    history = []
+    for i in range(HISTORY_MESSAGES // 2):
+        history += [db_service.make_message("user", QUESTION), db_service.make_message("assistant", ANSWER)]
+    await db_service.append_messages(chat_id, history)
+
+    counter.commands = counter.reply_bytes = 0
+    start = time.perf_counter()
+    for i in range(TURNS):
+        await turn(chat_id, first_turn=(i == 0))
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{name:<8} {counter.commands / TURNS:>12.1f} {counter.reply_bytes / TURNS / 1024:>12.1f} "
+        f"{elapsed / TURNS * 1000:>10.2f}"
+    )
+    await db_service.delete_chat(chat_id, USER_ID)
+
+
+async def main():
+    counter = CommandCounter()
+    # A plain client with the listener instead of db_service.connect(), which forces TLS
+    db_service.client = AsyncIOMotorClient(settings.mongodb_url, event_listeners=[counter])
+    db_service.db = db_service.client[settings.database_name]
+
+    print(f"chat history: {HISTORY_MESSAGES} messages, {TURNS} turns each, database: {settings.database_name}")
+    print(f"{'path':<8} {'round trips':>12} {'KB read':>12} {'ms/turn':>10}")
+    try:
+        await measure("legacy", legacy_turn, counter)
+        await measure("current", current_turn, counter)
+    finally:
+        db_service.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,203 @@
+"""
+Query plan check: every db_service query with a filter must use an index.
+
+Applies the index registry (db_service.ensure_indexes) to a scratch
+database on a real MongoDB and seeds a few documents. It then calls each
+DatabaseService query method while a pymongo CommandListener records the
+commands it sends. Every recorded read, update and delete is explained, and
+the script exits with status 1 if a winning plan contains a COLLSCAN.
+Listings without a filter (all doctors, all hospitals, the startup migration
+sweep, ...) are expected to scan and are only reported.
+
+Usage (from the backend directory; the scratch database is dropped at the end):
+    MONGODB_URL=mongodb://localhost:27017 python benchmarks/check_query_plans.py
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time; only MongoDB is used
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "query_plan_check")
+os.environ.setdefault("LLM_API_URL", "http://127.0.0.1:8000/v1/chat/completions")
+os.environ.setdefault("LLM_API_KEY", "benchmark")
+os.environ.setdefault("LLM_MODEL", "benchmark-model")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("GMAIL_USER", "benchmark@example.com")
+os.environ.setdefault("GMAIL_PASS", "benchmark")
+
+from bson import SON  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo import monitoring  # noqa: E402
+from config import settings  # noqa: E402
+from services.db_service import db_service  # noqa: E402
+
+# Commands that take a query plan
+EXPLAINABLE = {"find", "aggregate", "distinct", "count", "update", "delete", "findAndModify"}
+# Session and cluster fields added by the driver, not part of the command itself
+DRIVER_FIELDS = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference", "$readConcern"}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Records the explainable commands sent while recording is on"""
+
+    def __init__(self):
+        self.recording = False
+        self.commands = []
+
+    def started(self, event):
+        if self.recording and event.command_name in EXPLAINABLE:
+            self.commands.append(SON((key, value) for key, value in event.command.items() if key not in DRIVER_FIELDS))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def winning_stages(explain) -> set:
+    """Collect the stage names of every winning plan in an explain output"""
+    stages = set()
+
+    def collect(node):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.add(node["stage"])
+            for value in node.values():
+                collect(value)
+        elif isinstance(node, list):
+            for value in node:
+                collect(value)
+
+    def find_winning(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "winningPlan":
+                    collect(value)
+                elif key != "rejectedPlans":
+                    find_winning(value)
+        elif isinstance(node, list):
+            for value in node:
+                find_winning(value)
+
+    find_winning(explain)
+    return stages
+
+
+async def seed() -> dict:
+    """Create one document of each kind through db_service; returns their IDs"""
+    user_id = (await db_service.create_user("plan-check@example.com", "Plan Check", "hash"))["id"]
+    chat_id = (await db_service.create_chat("New Chat", user_id))["id"]
+    await db_service.append_messages(chat_id, [db_service.make_message("user", f"message {i}") for i in range(10)])
+    await db_service.insert_doctor({"id": "doc_plan", "name": "Dr. Plan", "specialization": "Cardiologist"})
+    await db_service.insert_hospital({
+        "id": "hosp_plan", "name": "Plan Hospital", "city": "Delhi",
+        "specializations": ["Cardiology"], "emergency_available": True
+    })
+    appointment_id = (await db_service.create_appointment(
+        user_id, "doc_plan", "Dr. Plan", "Cardiologist", "2030-01-15", "10:00 AM", "Checkup", "Plan Hospital"
+    ))["id"]
+    await db_service.save_stream_checkpoint("stream_plan", {"chat_id": chat_id, "user_id": user_id}, 60)
+    return {"user_id": user_id, "chat_id": chat_id, "appointment_id": appointment_id}
+
+
+def queries(ids: dict) -> list:
+    """(name, call, scan expected) for every DatabaseService query method"""
+    user_id, chat_id, appointment_id = ids["user_id"], ids["chat_id"], ids["appointment_id"]
+    return [
+        ("get_user_by_email", lambda: db_service.get_user_by_email("plan-check@example.com"), False),
+        ("get_user_by_id", lambda: db_service.get_user_by_id(user_id), False),
+        ("update_user", lambda: db_service.update_user(user_id, {"phone": "1234567890"}), False),
+        ("update_user_password", lambda: db_service.update_user_password(user_id, "hash2"), False),
+        ("get_all_chats", lambda: db_service.get_all_chats(user_id), False),
+        ("get_chat", lambda: db_service.get_chat(chat_id, user_id), False),
+        ("get_chat (page)", lambda: db_service.get_chat(chat_id, user_id, limit=3, before=8), False),
+        ("get_chat (after)", lambda: db_service.get_chat(chat_id, user_id, limit=3, after=2), False),
+        ("get_chat_info", lambda: db_service.get_chat_info(chat_id, user_id), False),
+        ("get_turn_context", lambda: db_service.get_turn_context(chat_id, user_id, 4), False),
+        ("get_chat_context", lambda: db_service.get_chat_context(chat_id, 1), False),
+        ("get_recent_messages", lambda: db_service.get_recent_messages(chat_id, 4), False),
+        ("get_messages_range", lambda: db_service.get_messages_range(chat_id, 2, 4), False),
+        ("append_messages", lambda: db_service.append_messages(chat_id, [db_service.make_message("user", "more")], title="T"), False),
+        ("update_chat_title", lambda: db_service.update_chat_title(chat_id, "Title"), False),
+        ("update_chat_summary", lambda: db_service.update_chat_summary(chat_id, "summary", 4, 0), False),
+        ("save_stream_checkpoint", lambda: db_service.save_stream_checkpoint("stream_plan", {"text": "x"}, 60), False),
+        ("get_stream_checkpoint", lambda: db_service.get_stream_checkpoint("stream_plan"), False),
+        ("get_appointment_by_id", lambda: db_service.get_appointment_by_id(appointment_id), False),
+        ("get_user_appointments", lambda: db_service.get_user_appointments(user_id), False),
+        ("get_user_appointments (status)", lambda: db_service.get_user_appointments(user_id, "scheduled"), False),
+        ("update_appointment", lambda: db_service.update_appointment(appointment_id, {"reason": "Follow-up"}), False),
+        ("get_doctor_by_id", lambda: db_service.get_doctor_by_id("doc_plan"), False),
+        ("get_all_doctors (specialization)", lambda: db_service.get_all_doctors(specialization="cardio"), False),
+        ("get_doctor_specializations", lambda: db_service.get_doctor_specializations(), False),
+        ("get_hospital_by_id", lambda: db_service.get_hospital_by_id("hosp_plan"), False),
+        ("get_all_hospitals (city)", lambda: db_service.get_all_hospitals(city="delhi"), False),
+        ("get_hospital_cities", lambda: db_service.get_hospital_cities(), False),
+        ("get_catalog_version", lambda: db_service.get_catalog_version(), False),
+        ("delete_appointment", lambda: db_service.delete_appointment(appointment_id, user_id), False),
+        ("delete_chat", lambda: db_service.delete_chat(chat_id, user_id), False),
+        # Full listings read every document anyway
+        ("get_all_doctors", lambda: db_service.get_all_doctors(), True),
+        ("get_all_hospitals", lambda: db_service.get_all_hospitals(), True),
+        ("get_all_hospitals (emergency)", lambda: db_service.get_all_hospitals(emergency_only=True), True),
+        ("get_hospital_specializations", lambda: db_service.get_hospital_specializations(), True),
+        ("get_doctors_count", lambda: db_service.get_doctors_count(), True),
+        ("get_hospitals_count", lambda: db_service.get_hospitals_count(), True),
+        ("migrate_embedded_messages", lambda: db_service.migrate_embedded_messages(), True),
+    ]
+
+
+async def main(database: str) -> int:
+    recorder = CommandRecorder()
+    # A plain client with the listener instead of db_service.connect(), which forces TLS
+    db_service.client = AsyncIOMotorClient(settings.mongodb_url, event_listeners=[recorder])
+    db_service.db = db_service.client[database]
+
+    failures = 0
+    try:
+        await db_service.client.drop_database(database)
+        await db_service.ensure_indexes()
+        ids = await seed()
+
+        print(f"{'query':<34} {'plan':<40} result")
+        for name, call, scan_expected in queries(ids):
+            recorder.commands = []
+            recorder.recording = True
+            try:
+                await call()
+            finally:
+                recorder.recording = False
+
+            stages = set()
+            for command in recorder.commands:
+                explain = await db_service.db.command(SON([("explain", command), ("verbosity", "queryPlanner")]))
+                stages |= winning_stages(explain)
+
+            if "COLLSCAN" not in stages:
+                result = "ok"
+            elif scan_expected:
+                result = "scan (expected)"
+            else:
+                result = "COLLSCAN"
+                failures += 1
+            print(f"{name:<34} {','.join(sorted(stages)) or '-':<40} {result}")
+    finally:
+        await db_service.client.drop_database(database)
+        db_service.client.close()
+
+    print(f"\n{failures} queries without an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="query_plan_check", help="scratch database, dropped before and after the check")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.database)))
@@ -4,12 +4,90 @@ class Settings(BaseSettings):
     # Database
     mongodb_url: str
     database_name: str
+    messages_migration_on_startup: bool = True  # move messages still embedded in chat documents into the messages collection
     
     # LLM Settings
     llm_api_url: str
+    llm_api_urls: str = ""  # comma-separated replicas; overrides llm_api_url when set
     llm_api_key: str
     llm_model: str
     
+    # LLM HTTP Client Settings
+    llm_timeout_seconds: float = 60.0
+    llm_connect_timeout_seconds: float = 10.0
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_http2: bool = True
+    llm_warmup_on_startup: bool = True
+    llm_native_tools: bool = False  # send OpenAI "tools" when the upstream supports tool_calls
+    llm_single_flight_enabled: bool = True  # share one upstream call between identical concurrent requests
+    
+    # LLM Load Balancing Settings
+    llm_circuit_failure_threshold: int = 3  # consecutive failures before an endpoint is taken out
+    llm_circuit_reset_seconds: float = 30.0  # cooldown before a probe request is let through
+    llm_health_check_interval_seconds: float = 10.0  # 0 disables active health checks
+    llm_health_path: str = "/health"
+    llm_hedge_enabled: bool = False
+    llm_hedge_percentile: float = 95.0  # send a hedged request once the first is slower than this
+    llm_hedge_min_delay_seconds: float = 1.0
+    
+    # LLM Admission Control Settings
+    admission_enabled: bool = True
+    admission_max_concurrency: int = 8  # chat turns using the inference server at once
+    admission_queue_timeout_seconds: float = 15.0  # queued turns are rejected with Retry-After after this
+    admission_max_queue: int = 100
+    disconnect_poll_interval_seconds: float = 0.5  # how often a waiting chat turn checks if its client is still there
+    stream_resume_grace_seconds: float = 30.0  # a dropped stream keeps generating this long for the client to reconnect; 0 cancels at once
+    stream_checkpoint_interval_seconds: float = 1.0  # how often partial streamed output is saved
+    stream_checkpoint_ttl_seconds: int = 3600
+    
+    # Chat Job Settings
+    jobs_enabled: bool = True  # POST /api/chats/{chat_id}/messages/jobs
+    jobs_workers: int = 4  # chat turns processed from the job queue at once
+    jobs_max_pending: int = 200  # further submissions get 503 with Retry-After
+    jobs_store: str = "memory"  # "memory" or "mongo"; use "mongo" with several API workers
+    jobs_ttl_seconds: int = 3600
+    jobs_checkpoint_interval_seconds: float = 0.25  # how often partial output is written to the job
+    jobs_poll_interval_seconds: float = 0.5  # how often job streams re-read the job
+    
+    # LLM Context Settings
+    llm_max_tokens: int = 1024
+    llm_context_budget_tokens: int = 3000  # max_model_len (4096) minus llm_max_tokens and a safety margin
+    llm_context_fetch_messages: int = 30
+    llm_tokenizer: str = ""  # e.g. "rishabh9559/medical-llama-3.2-3B"; empty uses a fast approximation
+    llm_prompt_modules_enabled: bool = True  # send only the tool instructions a turn needs
+    llm_generation_policies_enabled: bool = True  # per-class max_tokens/stop/temperature; llm_max_tokens caps every class
+    prompt_registry_path: str = ""  # empty uses prompts/registry.json at the repository root
+    llm_prompt_registry_enabled: bool = True  # send prompt IDs instead of prompt text when the LLM server has the same registry
+    
+    # Conversation Summary Settings
+    summary_enabled: bool = True
+    summary_trigger_messages: int = 12  # summarize once this many messages are not covered by the summary
+    summary_keep_recent_messages: int = 6  # raw messages always sent after the summary
+    summary_max_tokens: int = 256
+    
+    # Catalog Cache Settings
+    catalog_cache_enabled: bool = True  # serve doctors and hospitals from memory
+    catalog_cache_ttl_seconds: int = 3600  # full reload interval
+    catalog_version_check_seconds: float = 30.0  # how often the catalog version stamp is compared
+    
+    # Intent Router Settings
+    intent_router_enabled: bool = True  # answer tool-only requests without the LLM
+    
+    # Response Cache Settings
+    response_cache_enabled: bool = True
+    response_cache_backend: str = "memory"  # "memory" or "mongo"
+    response_cache_max_entries: int = 1000
+    response_cache_ttl_seconds: int = 86400
+    
+    # Semantic Cache Settings
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.9
+    semantic_cache_capacity: int = 1000
+    semantic_cache_ttl_seconds: int = 86400
+    semantic_cache_features: int = 2048
+    
     # JWT Settings
     secret_key: str
     algorithm: str
@@ -6,7 +6,19 @@ from routes.auth import router as auth_router
 from routes.appointments import router as appointments_router
 from routes.profile import router as profile_router
 from routes.hospitals import router as hospitals_router
+from routes.search import router as search_router
 from services.db_service import db_service
+from services.llm_service import llm_service
+from services.cache_service import response_cache
+from services.semantic_cache_service import semantic_cache
+from services.context_service import context_builder
+from services.summary_service import summary_service
+from services.admission_service import admission_controller
+from services.intent_router_service import intent_router
+from services.job_service import chat_jobs
+from services.stream_service import stream_sessions
+from services.catalog_service import catalog_cache
+from config import settings
 import uvicorn
 
 @asynccontextmanager
@@ -15,8 +27,25 @@ async def lifespan(app: FastAPI):
     # Startup
     await db_service.connect()
     print("Connected to MongoDB")
+    await db_service.ensure_indexes()
+    if settings.messages_migration_on_startup:
+        db_service.start_message_migration()
+    if settings.catalog_cache_enabled:
+        try:
+            await catalog_cache.load()
+        except Exception as e:
+            print(f"Warning: Could not load the catalog cache: {e}")
+    await llm_service.connect()
+    if settings.llm_warmup_on_startup:
+        await llm_service.warmup()
+    await llm_service.check_prompt_registry()
+    llm_service.start_health_checks()
+    chat_jobs.start()
     yield
     # Shutdown
+    await chat_jobs.close()
+    await llm_service.close()
+    print("Closed LLM client")
     await db_service.close()
     print("Closed MongoDB connection")
 
@@ -37,6 +66,7 @@ app.include_router(chat_router)
 app.include_router(appointments_router)
 app.include_router(profile_router)
 app.include_router(hospitals_router)
+app.include_router(search_router)
 
 @app.get("/")
 async def root():
@@ -46,5 +76,21 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Performance counters for the LLM pipeline"""
+    return {
+        "llm": llm_service.stats(),
+        "admission": admission_controller.stats(),
+        "jobs": chat_jobs.stats(),
+        "streams": stream_sessions.stats(),
+        "intent_router": intent_router.stats(),
+        "catalog": catalog_cache.stats(),
+        "response_cache": await response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "context": context_builder.stats(),
+        "summary": summary_service.stats()
+    }
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
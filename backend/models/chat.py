@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 from datetime import datetime
 import zoneinfo
 
@@ -7,6 +7,7 @@ class Message(BaseModel):
     role: str
     content: str
     timestamp: datetime = Field(default_factory=datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata")))
+    seq: Optional[int] = None  # position in the chat, used as a pagination cursor
 
 class Chat(BaseModel):
     title: str
@@ -20,6 +21,8 @@ class ChatResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     messages: List[Message] = []
+    message_count: int = 0
+    next_cursor: Optional[int] = None  # pass as before (or after) to get the next page of messages
 
 class ChatListItem(BaseModel):
     id: str
@@ -34,3 +37,13 @@ class MessageResponse(BaseModel):
     role: str
     content: str
     timestamp: datetime
+
+class JobResponse(BaseModel):
+    id: str
+    chat_id: str
+    status: str  # "queued", "running", "done" or "failed"
+    output: str = ""  # text generated so far
+    result: Optional[MessageResponse] = None
+    error: Optional[Dict[str, Any]] = None  # detail, status_code, retry_after
+    created_at: datetime
+    updated_at: datetime
@@ -7,7 +7,8 @@ from models.appointment import (
     AppointmentStatus
 )
 from models.doctor import Doctor
-from services.db_service import db_service
+from services.db_service import db_service, SlotUnavailableError
+from services.catalog_service import catalog_cache
 from services.auth_service import get_current_user, TokenData
 from services.email_service import email_service
 
@@ -21,7 +22,7 @@ async def get_all_doctors(
     current_user: TokenData = Depends(get_current_user)
 ):
     """Get all available doctors, optionally filtered by specialization"""
-    doctors = await db_service.get_all_doctors(specialization=specialization)
+    doctors = await catalog_cache.get_all_doctors(specialization=specialization)
     return [Doctor(**doc) for doc in doctors]
 
 @router.get("/doctors/{doctor_id}", response_model=Doctor)
@@ -30,7 +31,7 @@ async def get_doctor(
     current_user: TokenData = Depends(get_current_user)
 ):
     """Get a specific doctor by ID"""
-    doctor = await db_service.get_doctor_by_id(doctor_id)
+    doctor = await catalog_cache.get_doctor_by_id(doctor_id)
     
     if not doctor:
         raise HTTPException(
@@ -43,7 +44,7 @@ async def get_doctor(
 @router.get("/specializations")
 async def get_specializations(current_user: TokenData = Depends(get_current_user)):
     """Get all unique specializations"""
-    specializations = await db_service.get_doctor_specializations()
+    specializations = await catalog_cache.get_doctor_specializations()
     return {"specializations": specializations}
 
 # ============ Appointment Routes ============
@@ -56,7 +57,7 @@ async def create_appointment(
 ):
     """Create a new appointment"""
     # Verify doctor exists
-    doctor = await db_service.get_doctor_by_id(appointment_data.doctor_id)
+    doctor = await catalog_cache.get_doctor_by_id(appointment_data.doctor_id)
     if not doctor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -66,39 +67,24 @@ async def create_appointment(
     # Get hospital name from doctor data or from request
     hospital_name = appointment_data.hospital_name or doctor.get("hospital", "N/A")
     
-    # Check for conflicting appointments
-    existing = await db_service.check_appointment_conflict(
-        doctor_id=appointment_data.doctor_id,
-        appointment_date=appointment_data.appointment_date,
-        appointment_time=appointment_data.appointment_time
-    )
-    
-    if existing:
+    # Create appointment; the unique slot index rejects a slot that is already booked
+    try:
+        appointment = await db_service.create_appointment(
+            user_id=current_user.user_id,
+            doctor_id=appointment_data.doctor_id,
+            doctor_name=appointment_data.doctor_name,
+            specialization=appointment_data.specialization,
+            appointment_date=appointment_data.appointment_date,
+            appointment_time=appointment_data.appointment_time,
+            reason=appointment_data.reason,
+            hospital_name=hospital_name
+        )
+    except SlotUnavailableError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="This time slot is already booked. Please select another time."
         )
     
-    # Create appointment
-    appointment_id = await db_service.create_appointment(
-        user_id=current_user.user_id,
-        doctor_id=appointment_data.doctor_id,
-        doctor_name=appointment_data.doctor_name,
-        specialization=appointment_data.specialization,
-        appointment_date=appointment_data.appointment_date,
-        appointment_time=appointment_data.appointment_time,
-        reason=appointment_data.reason,
-        hospital_name=hospital_name
-    )
-    
-    appointment = await db_service.get_appointment_by_id(appointment_id)
-    
-    if not appointment:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create appointment"
-        )
-    
     # Send confirmation email in background
     user = await db_service.get_user_by_id(current_user.user_id)
     if user:
@@ -191,15 +177,20 @@ async def update_appointment(
             detail="No update data provided"
         )
     
-    success = await db_service.update_appointment(appointment_id, update_dict)
+    try:
+        updated_appointment = await db_service.update_appointment(appointment_id, update_dict)
+    except SlotUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This time slot is already booked. Please select another time."
+        )
     
-    if not success:
+    if not updated_appointment:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update appointment"
         )
     
-    updated_appointment = await db_service.get_appointment_by_id(appointment_id)
     return AppointmentResponse(**updated_appointment)
 
 @router.delete("/{appointment_id}")
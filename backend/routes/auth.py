@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from models.user import UserCreate, UserLogin, Token, UserResponse, ForgotPasswordRequest
-from services.db_service import db_service
+from services.db_service import db_service, EmailTakenError
 from services.email_service import email_service
 from services.auth_service import (
     get_password_hash, 
@@ -49,32 +49,21 @@ async def forgot_password(request: ForgotPasswordRequest):
 @router.post("/signup", response_model=Token)
 async def signup(user_data: UserCreate):
     """Register a new user"""
-    # Check if user already exists
-    existing_user = await db_service.get_user_by_email(user_data.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
     # Hash the password
     hashed_password = get_password_hash(user_data.password)
     
-    # Create user in database
-    user_id = await db_service.create_user(
-        email=user_data.email,
-        name=user_data.name,
-        hashed_password=hashed_password,
-        phone=user_data.phone
-    )
-    
-    # Get the created user
-    user = await db_service.get_user_by_id(user_id)
-    
-    if not user:
+    # Create user in database; the unique email index rejects a registered email
+    try:
+        user = await db_service.create_user(
+            email=user_data.email,
+            name=user_data.name,
+            hashed_password=hashed_password,
+            phone=user_data.phone
+        )
+    except EmailTakenError:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create user"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
         )
     
     # Create access token
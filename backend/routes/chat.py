@@ -1,22 +1,85 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional, Dict
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Dict, Tuple, TypeVar
 from models.chat import (
     ChatResponse, ChatListItem, MessageRequest, 
-    MessageResponse, Message
+    MessageResponse, Message, JobResponse
 )
 from models.user import TokenData
 from services.db_service import db_service
+from services.catalog_service import catalog_cache
 from services.llm_service import llm_service
 from services.tools_service import tools_service
 from services.query_validator_service import query_validator, GreetingHandler
+from services.cache_service import response_cache
+from services.semantic_cache_service import semantic_cache
+from services.summary_service import summary_service
+from services.intent_router_service import intent_router
+from services.admission_service import admission_controller, AdmissionController, AdmissionRejected
+from services.job_service import chat_jobs, JobFailed, JobQueueFull
+from services.stream_service import stream_sessions
 from services.auth_service import get_current_user
+from config import settings
 from datetime import datetime
 from zoneinfo import ZoneInfo
+import asyncio
 import json
 import re
+import time
 
 router = APIRouter(prefix="/api/chats", tags=["chats"])
 
+# Marker the LLM uses to request a tool call (matched case-insensitively)
+TOOL_CALL_MARKER = "TOOL_CALL"
+
+# Nginx convention for "client closed request"; nobody reads the response
+CLIENT_CLOSED_REQUEST = 499
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away while its turn was being generated"""
+
+
+class ToolCallFilter:
+    """
+    Passes streamed text through up to a TOOL_CALL marker. Enough characters
+    are held back to catch a marker split across deltas.
+    """
+    
+    HOLDBACK = len(TOOL_CALL_MARKER) - 1
+    
+    def __init__(self):
+        self.text = ""
+        self.forwarded = 0
+        self.tool_call_seen = False
+    
+    def feed(self, delta: str) -> str:
+        """Add a delta and return the text that is now safe to forward"""
+        self.text += delta
+        if self.tool_call_seen:
+            return ""
+        
+        marker_at = self.text.upper().find(TOOL_CALL_MARKER, max(0, self.forwarded - self.HOLDBACK))
+        if marker_at != -1:
+            self.tool_call_seen = True
+            safe_end = marker_at
+        else:
+            safe_end = len(self.text) - self.HOLDBACK
+        return self._forward(safe_end)
+    
+    def flush(self) -> str:
+        """Return the held-back tail once the stream has ended"""
+        return "" if self.tool_call_seen else self._forward(len(self.text))
+    
+    def _forward(self, end: int) -> str:
+        if end <= self.forwarded:
+            return ""
+        text = self.text[self.forwarded:end]
+        self.forwarded = end
+        return text
+
 
 async def extract_pending_booking(messages: List[dict]) -> Optional[Dict]:
     """
@@ -79,7 +142,7 @@ async def extract_pending_booking(messages: List[dict]) -> Optional[Dict]:
                 booking["doctor_id"] = doctor_id
             else:
                 # Fallback: lookup doctor from database by name
-                doctor = await find_doctor_by_name(booking["doctor_name"])
+                doctor = await catalog_cache.find_doctor_by_name(booking["doctor_name"])
                 if doctor:
                     booking["doctor_id"] = doctor.get("id")
                     # Also fill in missing specialization and hospital from database
@@ -138,30 +201,375 @@ def find_doctor_id_from_context(messages: List[dict], doctor_name: str) -> Optio
     return None
 
 
-async def find_doctor_by_name(doctor_name: str) -> Optional[Dict]:
-    """Find doctor in database by name"""
-    doctors = await db_service.get_all_doctors()
-    # Clean the doctor name
-    clean_name = doctor_name.replace("Dr.", "").replace("Dr", "").strip()
+def format_tool_result(tool_name: str, parameters: Dict, tool_result: Dict) -> str:
+    """Format a tool result for display in the chat"""
+    if tool_result.get("success"):
+        result_text = ""
+        
+        if tool_name == "get_doctors":
+            doctors = tool_result.get("data", [])
+            if doctors:
+                spec = parameters.get("specialization", "")
+                if spec:
+                    result_text = f"Here are the available **{spec}** specialists:\n\n"
+                else:
+                    result_text = "Here are all available doctors:\n\n"
+                
+                for i, doc in enumerate(doctors, 1):
+                    result_text += f"**{i}. {doc['name']}** - {doc['specialization']}\n"
+                    result_text += f"   � ID: {doc.get('id', 'N/A')}\n"
+                    result_text += f"   🏥 Hospital: {doc.get('hospital', 'N/A')}\n"
+                    result_text += f"   📅 Available Days: {', '.join(doc.get('available_days', []))}\n"
+                    result_text += f"   ⏰ Time Slots: {', '.join(doc.get('available_time_slots', []))}\n"
+                    result_text += f"   💰 Consultation Fee: ₹{doc.get('consultation_fee', 'N/A')}\n"
+                    result_text += f"   ⭐ Rating: {doc.get('rating', 'N/A')}/5\n"
+                    result_text += f"   👥 Patients Treated: {doc.get('patients_count', 'N/A')}\n\n"
+                
+                result_text += "---\n**To book an appointment, please tell me:**\n"
+                result_text += "1. Which doctor would you like to see?\n"
+                result_text += "2. What date? (Format: YYYY-MM-DD, e.g., 2026-02-15)\n"
+                result_text += "3. What time? (e.g., 10:00 AM or 14:30)\n"
+                result_text += "4. Reason for visit?\n"
+            else:
+                result_text = "No doctors found matching your criteria. Please try a different specialization."
+        
+        elif tool_name == "get_hospitals":
+            hospitals = tool_result.get("data", [])
+            if hospitals:
+                result_text = "🏥 **Here are the hospitals:**\n\n"
+                for i, hosp in enumerate(hospitals, 1):
+                    result_text += f"**{i}. {hosp['name']}** - {hosp['city']}\n"
+                    result_text += f"   📍 Address: {hosp['address']}\n"
+                    result_text += f"   🏷️ Specializations: {', '.join(hosp['specializations'])}\n"
+                    result_text += f"   🚨 Emergency: {'✅ Yes' if hosp['emergency_available'] else '❌ No'}\n"
+                    result_text += f"   📞 Contact: {hosp.get('phone', hosp.get('contact', 'N/A'))}\n\n"
+            else:
+                result_text = "No hospitals found matching your criteria."
+        
+        elif tool_name == "book_appointment":
+            result_text = "✅ **Appointment Booked Successfully!**\n\n"
+            appointment = tool_result.get("data", {})
+            if appointment:
+                result_text += "📋 **Your Appointment Details:**\n"
+                result_text += f"   🆔 Booking ID: {appointment.get('id', 'N/A')}\n"
+                result_text += f"   👨‍⚕️ Doctor: {appointment.get('doctor_name')}\n"
+                result_text += f"   🏷️ Specialization: {appointment.get('specialization')}\n"
+                result_text += f"   🏥 Hospital: {appointment.get('hospital_name', 'N/A')}\n"
+                result_text += f"   📅 Date: {appointment.get('appointment_date')}\n"
+                result_text += f"   ⏰ Time: {appointment.get('appointment_time')}\n"
+                result_text += f"   📝 Reason: {appointment.get('reason')}\n"
+                result_text += f"   ✔️ Status: {appointment.get('status', 'Scheduled').upper()}\n\n"
+                result_text += "📌 **Please Note:**\n"
+                result_text += "- Arrive 15 minutes before your appointment\n"
+                result_text += "- Bring your ID and any relevant medical records\n"
+                result_text += "- You can view all your bookings in the **Appointments** section\n\n"
+                result_text += "Need to cancel or reschedule? Just let me know!"
+        
+        elif tool_name == "change_password":
+            result_text = "✅ **Password Changed Successfully!**\n\nYour account password has been updated. Please use your new password for future logins."
+        
+        elif tool_name == "get_user_appointments":
+            appointments = tool_result.get("data", [])
+            if appointments:
+                result_text = "📋 **Your Appointments:**\n\n"
+                for i, apt in enumerate(appointments, 1):
+                    status_icon = "✅" if apt.get('status') == 'scheduled' else "⏳" if apt.get('status') == 'pending' else "✔️"
+                    result_text += f"**{i}. {apt.get('appointment_date')} at {apt.get('appointment_time')}**\n"
+                    result_text += f"   👨‍⚕️ Doctor: {apt.get('doctor_name')} ({apt.get('specialization')})\n"
+                    result_text += f"   🏥 Hospital: {apt.get('hospital_name', 'N/A')}\n"
+                    result_text += f"   📝 Reason: {apt.get('reason')}\n"
+                    result_text += f"   {status_icon} Status: {apt.get('status')}\n\n"
+            else:
+                result_text = "📋 You don't have any appointments scheduled yet.\n\nWould you like to book an appointment? Just say 'book appointment' and I'll help you!"
+        
+        return result_text
     
-    for doc in doctors:
-        doc_clean_name = doc.get("name", "").replace("Dr.", "").replace("Dr", "").strip()
-        # Match by last name or full name
-        if clean_name.lower() in doc_clean_name.lower() or doc_clean_name.lower() in clean_name.lower():
-            return doc
+    # Tool failed, report error
+    error_msg = tool_result.get("error", "An error occurred")
+    return f"I tried to help but encountered an issue: {error_msg}"
+
+
+def get_quick_reply(content: str) -> Optional[str]:
+    """Return a canned reply for greetings and non-medical queries, if any"""
+    # Check if the message is a greeting
+    if GreetingHandler.is_greeting(content):
+        return GreetingHandler.get_greeting_response(content)
+    
+    # Validate that the query is medical-related
+    is_medical, rejection_message = query_validator.is_medical_query(content)
+    if not is_medical:
+        return rejection_message
     
     return None
 
+
+def is_confirmation(content: str) -> bool:
+    """Check if the user is answering YES to a booking summary"""
+    return content.strip().lower() in ["yes", "confirm", "ok", "sure", "yeah", "yep", "y"]
+
+
+def get_admission_priority(content: str) -> int:
+    """Emergencies skip ahead of every other turn waiting for the LLM"""
+    if query_validator.is_emergency(content):
+        return AdmissionController.PRIORITY_EMERGENCY
+    return AdmissionController.PRIORITY_NORMAL
+
+
+async def load_turn(chat_id: str, user_id: str, content: str, route: bool = True) -> Tuple[Optional[dict], Optional[Tuple[str, Dict]]]:
+    """
+    Load the chat context and route the message concurrently.
+    
+    Returns:
+        Tuple of (chat, routed_tool); chat is None if it doesn't exist or belongs to someone else
+    """
+    # Recent messages are needed for the multi-step booking flow; the LLM service trims them to the token budget
+    lookups = [db_service.get_turn_context(chat_id, user_id, settings.llm_context_fetch_messages)]
+    if route:
+        lookups.append(intent_router.route(content))
+    results = await asyncio.gather(*lookups)
+    return results[0], results[1] if route else None
+
+
+async def save_turn(chat_id: str, chat: dict, user_message: dict, response: str, cache_response: Optional[str] = None):
+    """
+    Save the user message and the reply in a single update, using the message
+    as the title of a new chat. A fresh LLM answer is cached at the same time.
+    Raises HTTPException (404) if the chat was deleted meanwhile; a failed
+    insert propagates.
+    """
+    # Use the complete first message as title
+    title = user_message["content"] if chat["message_count"] == 0 else None
+    writes = [db_service.append_messages(
+        chat_id, [user_message, db_service.make_message("assistant", response)], title=title
+    )]
+    if cache_response is not None:
+        writes.append(store_cached_response(user_message["content"], cache_response))
+    saved = (await asyncio.gather(*writes))[0]
+    if not saved:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+
+async def prepare_llm_context(chat: dict, content: str) -> Tuple[List[Dict[str, str]], bool, Optional[Dict]]:
+    """
+    Build the LLM context for this turn from the chat loaded by load_turn().
+    
+    Returns:
+        Tuple of (formatted_messages, user_confirming, pending_booking)
+    """
+    recent_messages = chat["messages"]
+    
+    # Format messages for LLM: the chat summary replaces turns it already covers
+    formatted_messages = summary_service.build_context(chat)
+    
+    # The user message is saved together with the reply, so it isn't in the chat yet
+    formatted_messages.append({"role": "user", "content": content})
+    
+    # Check if user is confirming a booking (YES response)
+    user_confirming = is_confirmation(content)
+    pending_booking = None
+    
+    # If user is confirming, check if there's a pending booking in recent messages
+    if user_confirming:
+        pending_booking = await extract_pending_booking(recent_messages)
+        print(f"[DEBUG] User confirming: {user_confirming}, Pending booking: {pending_booking}")
+    
+    return formatted_messages, user_confirming, pending_booking
+
+
+def schedule_summary_refresh(background_tasks: BackgroundTasks, chat_id: str, chat: dict):
+    """Condense older turns in the background once the chat grows past the trigger"""
+    # The user and assistant messages of this turn were saved after chat was loaded
+    message_count = chat["message_count"] + 2
+    if summary_service.needs_refresh(message_count, chat.get("summarized_count", 0)):
+        background_tasks.add_task(summary_service.refresh, chat_id)
+
+
+def is_cacheable_turn(chat: dict, content: str, user_confirming: bool) -> bool:
+    """Only single-turn, non-tool, non-emergency questions use the response cache"""
+    return (
+        chat["message_count"] == 0
+        and not user_confirming
+        and not query_validator.is_tool_query(content)
+        and not query_validator.is_emergency(content)
+    )
+
+
+def is_cacheable_response(response: str) -> bool:
+    """Never cache tool calls or the fallback replies sent when the LLM call fails"""
+    return (
+        bool(response.strip())
+        and TOOL_CALL_MARKER not in response.upper()
+        and not llm_service.is_error_response(response)
+    )
+
+
+async def lookup_cached_response(content: str) -> Optional[str]:
+    """Look for an exact-match answer first, then for a cached paraphrase"""
+    cached_response = await response_cache.get(content)
+    if cached_response is None:
+        cached_response = semantic_cache.lookup(content)
+    return cached_response
+
+
+async def store_cached_response(content: str, response: str):
+    """Store a fresh LLM answer in both caches"""
+    if not is_cacheable_response(response):
+        return
+    await response_cache.set(content, response)
+    semantic_cache.add(content, response)
+
+
+async def run_tool(tool_name: str, parameters: Dict, user_id: str) -> Tuple[Dict, str]:
+    """Execute a tool and format its result for the chat"""
+    print(f"[DEBUG] Executing tool: {tool_name} with parameters: {parameters}")
+    
+    # Execute the tool
+    tool_result = await tools_service.execute_tool(tool_name, parameters, user_id)
+    
+    print(f"[DEBUG] Tool result: {tool_result}")
+    
+    return tool_result, format_tool_result(tool_name, parameters, tool_result)
+
+
+async def run_tools(tool_calls: List[Tuple[str, Dict]], user_id: str) -> Tuple[bool, str]:
+    """
+    Execute the tool calls of one response (read-only tools run concurrently)
+    and format the results for the chat.
+    
+    Returns:
+        Tuple of (any_succeeded, result_text)
+    """
+    if len(tool_calls) == 1:
+        tool_result, result_text = await run_tool(*tool_calls[0], user_id)
+        return bool(tool_result.get("success")), result_text
+    
+    print(f"[DEBUG] Executing {len(tool_calls)} tools: {tool_calls}")
+    tool_results = await tools_service.execute_tools(tool_calls, user_id)
+    print(f"[DEBUG] Tool results: {tool_results}")
+    
+    result_texts = [
+        format_tool_result(tool_name, parameters, tool_result)
+        for (tool_name, parameters), tool_result in zip(tool_calls, tool_results)
+    ]
+    any_succeeded = any(tool_result.get("success") for tool_result in tool_results)
+    return any_succeeded, "\n\n---\n\n".join(result_texts)
+
+
+async def resolve_assistant_response(
+    assistant_response: str,
+    user_confirming: bool,
+    pending_booking: Optional[Dict],
+    user_id: str
+) -> str:
+    """Run the tool calls contained in the LLM response and return the final reply"""
+    # Debug: Log the raw LLM response
+    print(f"[DEBUG] Raw LLM Response: {assistant_response[:500] if len(assistant_response) > 500 else assistant_response}")
+    
+    # Check if LLM wants to call tools
+    before_text, tool_calls = llm_service.parse_tool_calls(assistant_response)
+    
+    print(f"[DEBUG] Parsed tool_calls: {tool_calls}")
+    
+    # FALLBACK: If user said YES but LLM didn't call book_appointment, force the booking
+    if user_confirming and pending_booking and not tool_calls:
+        print(f"[DEBUG] FALLBACK: Forcing booking with pending details: {pending_booking}")
+        before_text, tool_calls = "", [("book_appointment", pending_booking)]
+    
+    if not tool_calls:
+        return assistant_response
+    
+    any_succeeded, result_text = await run_tools(tool_calls, user_id)
+    
+    # Combine before text with result
+    if any_succeeded and before_text:
+        final_response = before_text + "\n\n" + result_text
+    else:
+        final_response = result_text
+    
+    return final_response.strip()
+
+
+async def run_until_disconnected(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Await a coroutine, polling the client connection meanwhile. If the client
+    disconnects, the coroutine is cancelled (which closes the upstream LLM
+    request) and ClientDisconnected is raised.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.disconnect_poll_interval_seconds)
+            if done:
+                return task.result()
+            # cancel() is False if the task finished meanwhile; its result is returned next round
+            if await request.is_disconnected() and task.cancel():
+                await asyncio.wait({task})
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def follow_stream(request: Request, stream_id: str, user_id: str, offset: int) -> AsyncIterator[str]:
+    """
+    Send the SSE events of a resumable stream from character `offset`: token
+    events for its text, then "done" or "error". Following a stream of this
+    process keeps it from being cancelled.
+    """
+    session = stream_sessions.get_local(stream_id)
+    if session:
+        stream_sessions.attach(session, resumed=offset > 0)
+    
+    try:
+        sent = max(0, offset)
+        next_check = time.perf_counter() + settings.disconnect_poll_interval_seconds
+        while True:
+            snapshot = await stream_sessions.snapshot(stream_id, user_id)
+            if snapshot is None:
+                yield format_sse("error", {"detail": "Stream not found or expired", "retry_after": None})
+                return
+            
+            text = snapshot["text"]
+            if len(text) > sent:
+                yield format_sse("token", {"content": text[sent:], "offset": sent})
+                sent = len(text)
+            
+            if snapshot["status"] == stream_sessions.STATUS_DONE:
+                yield format_sse("done", snapshot["message"])
+                return
+            if snapshot["status"] != stream_sessions.STATUS_STREAMING:
+                yield format_sse("error", snapshot["error"])
+                return
+            
+            # Tokens arriving faster than the poll interval never hit the wait timeout
+            if time.perf_counter() >= next_check:
+                if await request.is_disconnected():
+                    return
+                next_check = time.perf_counter() + settings.disconnect_poll_interval_seconds
+            await stream_sessions.wait(stream_id, settings.disconnect_poll_interval_seconds)
+    finally:
+        if session:
+            stream_sessions.detach(session)
+
+
+def assistant_message(content: str) -> dict:
+    """Build the final assistant message sent in "done" events and stored on jobs"""
+    return {
+        "role": "assistant",
+        "content": content,
+        "timestamp": datetime.now(ZoneInfo("Asia/Kolkata")).isoformat()
+    }
+
 @router.post("", response_model=ChatResponse)
 async def create_chat(current_user: TokenData = Depends(get_current_user)):
     """Create a new chat for the authenticated user"""
     # Start with a default title, will be updated with first message
-    chat_id = await db_service.create_chat("New Chat", current_user.user_id)
-    chat = await db_service.get_chat(chat_id, current_user.user_id)
-    
-    if not chat:
-        raise HTTPException(status_code=500, detail="Failed to create chat")
-    
+    chat = await db_service.create_chat("New Chat", current_user.user_id)
     return ChatResponse(**chat)
 
 @router.get("", response_model=List[ChatListItem])
@@ -171,9 +579,20 @@ async def get_all_chats(current_user: TokenData = Depends(get_current_user)):
     return [ChatListItem(**chat) for chat in chats]
 
 @router.get("/{chat_id}", response_model=ChatResponse)
-async def get_chat(chat_id: str, current_user: TokenData = Depends(get_current_user)):
-    """Get a specific chat with all messages (only if owned by user)"""
-    chat = await db_service.get_chat(chat_id, current_user.user_id)
+async def get_chat(
+    chat_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    before: Optional[int] = Query(None, ge=0),
+    after: Optional[int] = Query(None, ge=0),
+    current_user: TokenData = Depends(get_current_user)
+):
+    """
+    Get a specific chat (only if owned by user) with all messages, or a page of
+    at most `limit` messages: the latest ones, those before the `before`
+    cursor, or those after the `after` cursor. Pass `next_cursor` back as the
+    same cursor to get the next page.
+    """
+    chat = await db_service.get_chat(chat_id, current_user.user_id, limit=limit, before=before, after=after)
     
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
@@ -194,200 +613,374 @@ async def delete_chat(chat_id: str, current_user: TokenData = Depends(get_curren
 async def send_message(
     chat_id: str, 
     message: MessageRequest, 
+    background_tasks: BackgroundTasks,
+    request: Request,
     current_user: TokenData = Depends(get_current_user)
 ):
-    """Send a message and get LLM response"""
-    # Verify chat exists and belongs to user
-    chat = await db_service.get_chat(chat_id, current_user.user_id)
+    """
+    Send a message and get LLM response.
+    
+    The user message and the reply are saved together once the reply is
+    ready. If the client disconnects while the turn is queued or generating,
+    the LLM request is cancelled and nothing is saved.
+    """
+    user_message = db_service.make_message("user", message.content)
+    
+    # Greetings and non-medical queries are answered without the LLM
+    quick_reply = get_quick_reply(message.content)
+    
+    # Tool-only requests ("show doctors", "my appointments") skip the LLM entirely
+    chat, routed_tool = await load_turn(chat_id, current_user.user_id, message.content, route=not quick_reply)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    # Check if the message is a greeting
-    if GreetingHandler.is_greeting(message.content):
-        # Save the user message
-        await db_service.add_message(chat_id, "user", message.content)
-        
-        # Get greeting response
-        greeting_response = GreetingHandler.get_greeting_response(message.content)
-        
-        # Save the greeting response
-        await db_service.add_message(chat_id, "assistant", greeting_response)
+    if quick_reply:
+        # Save the user message anyway (for history)
+        await db_service.append_messages(chat_id, [user_message, db_service.make_message("assistant", quick_reply)])
         
-        # Return the greeting response
         return MessageResponse(
             role="assistant",
-            content=greeting_response,
+            content=quick_reply,
             timestamp=datetime.now(ZoneInfo("Asia/Kolkata"))
         )
     
-    # Validate that the query is medical-related
-    is_medical, rejection_message = query_validator.is_medical_query(message.content)
+    # Answer repeated single-turn questions from the cache
+    cacheable = not routed_tool and is_cacheable_turn(chat, message.content, is_confirmation(message.content))
+    cached_response = await lookup_cached_response(message.content) if cacheable else None
+    llm_response = None
     
-    if not is_medical:
-        # Save the user message anyway (for history)
-        await db_service.add_message(chat_id, "user", message.content)
+    if routed_tool:
+        _, assistant_response = await run_tool(*routed_tool, current_user.user_id)
+    elif cached_response:
+        assistant_response = cached_response
+    else:
+        async def generate():
+            # Wait for an LLM slot; nothing is saved before the reply, so a rejected turn leaves no trace
+            async with admission_controller.slot(get_admission_priority(message.content)):
+                formatted_messages, user_confirming, pending_booking = await prepare_llm_context(
+                    chat, message.content
+                )
+                
+                # Get LLM response with tools enabled
+                response = await llm_service.get_completion(formatted_messages, tools_available=True)
+            return response, user_confirming, pending_booking
         
-        # Save the rejection response
-        await db_service.add_message(chat_id, "assistant", rejection_message)
+        try:
+            assistant_response, user_confirming, pending_booking = await run_until_disconnected(request, generate())
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except ClientDisconnected:
+            print(f"Chat {chat_id}: client disconnected, LLM request cancelled")
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
         
-        # Return the rejection response
-        return MessageResponse(
-            role="assistant",
-            content=rejection_message,
-            timestamp=datetime.now(ZoneInfo("Asia/Kolkata"))
+        llm_response = assistant_response
+        assistant_response = await resolve_assistant_response(
+            assistant_response, user_confirming, pending_booking, current_user.user_id
         )
     
-    # Save user message
-    await db_service.add_message(chat_id, "user", message.content)
+    await save_turn(chat_id, chat, user_message, assistant_response, llm_response if cacheable else None)
+    schedule_summary_refresh(background_tasks, chat_id, chat)
     
-    # Update chat title if this is the first message
-    if len(chat.get("messages", [])) == 0:
-        # Use the complete first message as title
-        title = message.content
-        await db_service.update_chat_title(chat_id, title)
+    return MessageResponse(
+        role="assistant",
+        content=assistant_response,
+        timestamp=datetime.now(ZoneInfo("Asia/Kolkata"))
+    )
+
+@router.post("/{chat_id}/messages/stream")
+async def stream_message(
+    chat_id: str,
+    message: MessageRequest,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    current_user: TokenData = Depends(get_current_user)
+):
+    """
+    Send a message and stream the LLM response as Server-Sent Events.
     
-    # Get last 10 messages for context (needed for multi-step booking flow)
-    recent_messages = await db_service.get_recent_messages(chat_id, count=10)
+    Emits "token" events with content deltas while the model generates, then a
+    single "done" event carrying the final saved assistant message. If the
+    assistant is too busy to take the turn, a single "error" event with
+    "detail" and "retry_after" (seconds) is sent instead and nothing is saved. Text from a
+    TOOL_CALL marker onwards is never forwarded; the tool result arrives in the
+    "done" event instead, so clients should replace the streamed text with it.
     
-    # Format messages for LLM
-    formatted_messages = [
-        {"role": msg["role"], "content": msg["content"]}
-        for msg in recent_messages
-    ]
+    LLM answers start with a "stream" event carrying the "stream_id", and each
+    token event carries the "offset" it starts at. If the client disconnects,
+    generation continues for the resume grace period; reconnect with
+    GET .../messages/stream/{stream_id}?offset=N to continue the answer.
+    """
+    user_message = db_service.make_message("user", message.content)
+    quick_reply = get_quick_reply(message.content)
     
-    # Add current message if not already in recent messages
-    if not formatted_messages or formatted_messages[-1]["content"] != message.content:
-        formatted_messages.append({"role": "user", "content": message.content})
+    # Verify chat exists and belongs to user
+    chat, routed_tool = await load_turn(chat_id, current_user.user_id, message.content, route=not quick_reply)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
     
-    # Check if user is confirming a booking (YES response)
-    user_confirming = message.content.strip().lower() in ["yes", "confirm", "ok", "sure", "yeah", "yep", "y"]
-    pending_booking = None
+    async def event_stream():
+        if quick_reply:
+            await db_service.append_messages(chat_id, [user_message, db_service.make_message("assistant", quick_reply)])
+            yield format_sse("done", assistant_message(quick_reply))
+            return
+        
+        cacheable = not routed_tool and is_cacheable_turn(chat, message.content, is_confirmation(message.content))
+        cached_response = await lookup_cached_response(message.content) if cacheable else None
+        
+        # Routed tool results and cached answers are sent as a single token event
+        if routed_tool or cached_response:
+            if routed_tool:
+                _, direct_response = await run_tool(*routed_tool, current_user.user_id)
+            else:
+                direct_response = cached_response
+            
+            await save_turn(chat_id, chat, user_message, direct_response)
+            schedule_summary_refresh(background_tasks, chat_id, chat)
+            yield format_sse("token", {"content": direct_response})
+            yield format_sse("done", assistant_message(direct_response))
+            return
+        
+        # Wait for an LLM slot; nothing is saved before the reply, so a rejected turn leaves no trace
+        try:
+            await run_until_disconnected(
+                request, admission_controller.acquire(get_admission_priority(message.content))
+            )
+        except AdmissionRejected as e:
+            yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+            return
+        except ClientDisconnected:
+            return
+        
+        slot_start = time.perf_counter()
+        slot_released = False
+        
+        def release_slot(task=None):
+            # Called when generation ends, and again when the session task finishes,
+            # in case it was cancelled before produce ever ran
+            nonlocal slot_released
+            if not slot_released:
+                slot_released = True
+                admission_controller.release(time.perf_counter() - slot_start)
+        
+        async def produce(emit: Callable[[str], Awaitable[None]], refresh_tasks: BackgroundTasks) -> dict:
+            tool_call_filter = ToolCallFilter()
+            try:
+                formatted_messages, user_confirming, pending_booking = await prepare_llm_context(
+                    chat, message.content
+                )
+                async for delta in llm_service.stream_completion(formatted_messages, tools_available=True):
+                    visible = tool_call_filter.feed(delta)
+                    if visible:
+                        await emit(visible)
+                
+                visible = tool_call_filter.flush()
+                if visible:
+                    await emit(visible)
+            finally:
+                release_slot()
+            
+            assistant_response = await resolve_assistant_response(
+                tool_call_filter.text, user_confirming, pending_booking, current_user.user_id
+            )
+            
+            # Save the turn once the stream has ended
+            await save_turn(
+                chat_id, chat, user_message, assistant_response, tool_call_filter.text if cacheable else None
+            )
+            # The client may be gone by now, so this can't wait for the response's background tasks
+            schedule_summary_refresh(refresh_tasks, chat_id, chat)
+            return assistant_message(assistant_response)
+        
+        # Generation runs on its own so a dropped connection can resume it
+        session = stream_sessions.start(chat_id, current_user.user_id, produce)
+        session.task.add_done_callback(release_slot)
+        yield format_sse("stream", {"stream_id": session.stream_id})
+        async for event in follow_stream(request, session.stream_id, current_user.user_id, 0):
+            yield event
     
-    # If user is confirming, check if there's a pending booking in recent messages
-    if user_confirming:
-        pending_booking = await extract_pending_booking(recent_messages)
-        print(f"[DEBUG] User confirming: {user_confirming}, Pending booking: {pending_booking}")
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{chat_id}/messages/stream/{stream_id}")
+async def resume_message_stream(
+    chat_id: str,
+    stream_id: str,
+    request: Request,
+    offset: int = 0,
+    current_user: TokenData = Depends(get_current_user)
+):
+    """
+    Reattach to a streamed answer after a dropped connection.
     
-    # Get LLM response with tools enabled
-    assistant_response = await llm_service.get_completion(formatted_messages, tools_available=True)
+    Sends the text after "offset" characters, then follows the stream like
+    POST .../messages/stream: token events, then "done" or "error". Finished
+    answers can be resumed until their checkpoint expires.
+    """
+    snapshot = await stream_sessions.snapshot(stream_id, current_user.user_id)
+    if not snapshot or snapshot["chat_id"] != chat_id:
+        raise HTTPException(status_code=404, detail="Stream not found")
     
-    # Debug: Log the raw LLM response
-    print(f"[DEBUG] Raw LLM Response: {assistant_response[:500] if len(assistant_response) > 500 else assistant_response}")
+    return StreamingResponse(
+        follow_stream(request, stream_id, current_user.user_id, offset),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def process_message_job(job: dict, emit: Callable[[str], Awaitable[None]], background_tasks: BackgroundTasks) -> dict:
+    """
+    Run a queued chat turn: the same steps as the streaming endpoint, with the
+    visible text reported through emit() instead of SSE token events.
+    """
+    chat_id, user_id, content = job["chat_id"], job["user_id"], job["content"]
+    user_message = db_service.make_message("user", content)
+    quick_reply = get_quick_reply(content)
     
-    # Check if LLM wants to call a tool
-    tool_call = llm_service.parse_tool_call(assistant_response)
+    chat, routed_tool = await load_turn(chat_id, user_id, content, route=not quick_reply)
+    if not chat:
+        raise JobFailed("Chat not found", status_code=404)
     
-    print(f"[DEBUG] Parsed tool_call: {tool_call}")
+    if quick_reply:
+        await db_service.append_messages(chat_id, [user_message, db_service.make_message("assistant", quick_reply)])
+        await emit(quick_reply)
+        return assistant_message(quick_reply)
     
-    # FALLBACK: If user said YES but LLM didn't call book_appointment, force the booking
-    if user_confirming and pending_booking and not tool_call:
-        print(f"[DEBUG] FALLBACK: Forcing booking with pending details: {pending_booking}")
-        tool_call = ("", "book_appointment", pending_booking)
+    cacheable = not routed_tool and is_cacheable_turn(chat, content, is_confirmation(content))
+    cached_response = await lookup_cached_response(content) if cacheable else None
     
-    if tool_call:
-        before_text, tool_name, parameters = tool_call
-        
-        print(f"[DEBUG] Executing tool: {tool_name} with parameters: {parameters}")
-        
-        # Execute the tool
-        tool_result = await tools_service.execute_tool(tool_name, parameters, current_user.user_id)
-        
-        print(f"[DEBUG] Tool result: {tool_result}")
+    if routed_tool or cached_response:
+        if routed_tool:
+            _, direct_response = await run_tool(*routed_tool, user_id)
+        else:
+            direct_response = cached_response
         
-        # Format the tool result for display
-        if tool_result.get("success"):
-            result_text = ""
-            
-            if tool_name == "get_doctors":
-                doctors = tool_result.get("data", [])
-                if doctors:
-                    spec = parameters.get("specialization", "")
-                    if spec:
-                        result_text = f"Here are the available **{spec}** specialists:\n\n"
-                    else:
-                        result_text = "Here are all available doctors:\n\n"
-                    
-                    for i, doc in enumerate(doctors, 1):
-                        result_text += f"**{i}. {doc['name']}** - {doc['specialization']}\n"
-                        result_text += f"   � ID: {doc.get('id', 'N/A')}\n"
-                        result_text += f"   🏥 Hospital: {doc.get('hospital', 'N/A')}\n"
-                        result_text += f"   📅 Available Days: {', '.join(doc.get('available_days', []))}\n"
-                        result_text += f"   ⏰ Time Slots: {', '.join(doc.get('available_time_slots', []))}\n"
-                        result_text += f"   💰 Consultation Fee: ₹{doc.get('consultation_fee', 'N/A')}\n"
-                        result_text += f"   ⭐ Rating: {doc.get('rating', 'N/A')}/5\n"
-                        result_text += f"   👥 Patients Treated: {doc.get('patients_count', 'N/A')}\n\n"
-                    
-                    result_text += "---\n**To book an appointment, please tell me:**\n"
-                    result_text += "1. Which doctor would you like to see?\n"
-                    result_text += "2. What date? (Format: YYYY-MM-DD, e.g., 2026-02-15)\n"
-                    result_text += "3. What time? (e.g., 10:00 AM or 14:30)\n"
-                    result_text += "4. Reason for visit?\n"
-                else:
-                    result_text = "No doctors found matching your criteria. Please try a different specialization."
-            
-            elif tool_name == "get_hospitals":
-                hospitals = tool_result.get("data", [])
-                if hospitals:
-                    result_text = "🏥 **Here are the hospitals:**\n\n"
-                    for i, hosp in enumerate(hospitals, 1):
-                        result_text += f"**{i}. {hosp['name']}** - {hosp['city']}\n"
-                        result_text += f"   📍 Address: {hosp['address']}\n"
-                        result_text += f"   🏷️ Specializations: {', '.join(hosp['specializations'])}\n"
-                        result_text += f"   🚨 Emergency: {'✅ Yes' if hosp['emergency_available'] else '❌ No'}\n"
-                        result_text += f"   📞 Contact: {hosp.get('phone', hosp.get('contact', 'N/A'))}\n\n"
-                else:
-                    result_text = "No hospitals found matching your criteria."
-            
-            elif tool_name == "book_appointment":
-                result_text = "✅ **Appointment Booked Successfully!**\n\n"
-                appointment = tool_result.get("data", {})
-                if appointment:
-                    result_text += "📋 **Your Appointment Details:**\n"
-                    result_text += f"   🆔 Booking ID: {appointment.get('id', 'N/A')}\n"
-                    result_text += f"   👨‍⚕️ Doctor: {appointment.get('doctor_name')}\n"
-                    result_text += f"   🏷️ Specialization: {appointment.get('specialization')}\n"
-                    result_text += f"   🏥 Hospital: {appointment.get('hospital_name', 'N/A')}\n"
-                    result_text += f"   📅 Date: {appointment.get('appointment_date')}\n"
-                    result_text += f"   ⏰ Time: {appointment.get('appointment_time')}\n"
-                    result_text += f"   📝 Reason: {appointment.get('reason')}\n"
-                    result_text += f"   ✔️ Status: {appointment.get('status', 'Scheduled').upper()}\n\n"
-                    result_text += "📌 **Please Note:**\n"
-                    result_text += "- Arrive 15 minutes before your appointment\n"
-                    result_text += "- Bring your ID and any relevant medical records\n"
-                    result_text += "- You can view all your bookings in the **Appointments** section\n\n"
-                    result_text += "Need to cancel or reschedule? Just let me know!"
+        await save_turn(chat_id, chat, user_message, direct_response)
+        schedule_summary_refresh(background_tasks, chat_id, chat)
+        await emit(direct_response)
+        return assistant_message(direct_response)
+    
+    # Wait for an LLM slot; nothing is saved before the reply, so a rejected turn leaves no trace
+    tool_call_filter = ToolCallFilter()
+    try:
+        async with admission_controller.slot(get_admission_priority(content)):
+            formatted_messages, user_confirming, pending_booking = await prepare_llm_context(
+                chat, content
+            )
+            async for delta in llm_service.stream_completion(formatted_messages, tools_available=True):
+                visible = tool_call_filter.feed(delta)
+                if visible:
+                    await emit(visible)
             
-            elif tool_name == "change_password":
-                result_text = "✅ **Password Changed Successfully!**\n\nYour account password has been updated. Please use your new password for future logins."
+            visible = tool_call_filter.flush()
+            if visible:
+                await emit(visible)
+    except AdmissionRejected as e:
+        raise JobFailed(str(e), status_code=503, retry_after=e.retry_after)
+    
+    assistant_response = await resolve_assistant_response(
+        tool_call_filter.text, user_confirming, pending_booking, user_id
+    )
+    
+    await save_turn(chat_id, chat, user_message, assistant_response, tool_call_filter.text if cacheable else None)
+    schedule_summary_refresh(background_tasks, chat_id, chat)
+    return assistant_message(assistant_response)
+
+
+@router.post("/{chat_id}/messages/jobs", response_model=JobResponse, status_code=202)
+async def submit_message_job(
+    chat_id: str,
+    message: MessageRequest,
+    current_user: TokenData = Depends(get_current_user)
+):
+    """
+    Queue a message and return its job right away.
+    
+    A worker pool processes the turn; poll GET .../jobs/{job_id} or attach to
+    GET .../jobs/{job_id}/stream for the answer. If too many jobs are already
+    waiting, 503 with a Retry-After header is returned and nothing is saved.
+    """
+    if not chat_jobs.enabled:
+        raise HTTPException(status_code=404, detail="Job mode is disabled")
+    
+    chat = await db_service.get_chat_info(chat_id, current_user.user_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    try:
+        job = await chat_jobs.submit(current_user.user_id, chat_id, message.content, process_message_job)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    return JobResponse(**job)
+
+@router.get("/{chat_id}/messages/jobs/{job_id}", response_model=JobResponse)
+async def get_message_job(chat_id: str, job_id: str, current_user: TokenData = Depends(get_current_user)):
+    """Get the status, partial output and final answer of a message job"""
+    job = await chat_jobs.get(job_id, current_user.user_id)
+    if not job or job["chat_id"] != chat_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return JobResponse(**job)
+
+@router.get("/{chat_id}/messages/jobs/{job_id}/stream")
+async def stream_message_job(
+    chat_id: str,
+    job_id: str,
+    request: Request,
+    offset: int = 0,
+    current_user: TokenData = Depends(get_current_user)
+):
+    """
+    Attach to a message job and receive its output as Server-Sent Events.
+    
+    Sends "token" events with the output after "offset" characters (each event
+    carries the "offset" it starts at, so a client can reattach where it left
+    off), then "done" with the final assistant message or "error" with
+    "detail", "status_code" and "retry_after". Disconnecting does not cancel
+    the job.
+    """
+    job = await chat_jobs.get(job_id, current_user.user_id)
+    if not job or job["chat_id"] != chat_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        current = job
+        sent = max(0, offset)
+        while True:
+            output = current.get("output") or ""
+            if len(output) > sent:
+                yield format_sse("token", {"content": output[sent:], "offset": sent})
+                sent = len(output)
             
-            elif tool_name == "get_user_appointments":
-                appointments = tool_result.get("data", [])
-                if appointments:
-                    result_text = "📋 **Your Appointments:**\n\n"
-                    for i, apt in enumerate(appointments, 1):
-                        status_icon = "✅" if apt.get('status') == 'scheduled' else "⏳" if apt.get('status') == 'pending' else "✔️"
-                        result_text += f"**{i}. {apt.get('appointment_date')} at {apt.get('appointment_time')}**\n"
-                        result_text += f"   👨‍⚕️ Doctor: {apt.get('doctor_name')} ({apt.get('specialization')})\n"
-                        result_text += f"   🏥 Hospital: {apt.get('hospital_name', 'N/A')}\n"
-                        result_text += f"   📝 Reason: {apt.get('reason')}\n"
-                        result_text += f"   {status_icon} Status: {apt.get('status')}\n\n"
-                else:
-                    result_text = "📋 You don't have any appointments scheduled yet.\n\nWould you like to book an appointment? Just say 'book appointment' and I'll help you!"
+            if current["status"] == chat_jobs.STATUS_DONE:
+                yield format_sse("done", current["result"])
+                return
+            if current["status"] == chat_jobs.STATUS_FAILED:
+                yield format_sse("error", current["error"])
+                return
             
-            # Combine before text with result
-            final_response = before_text + "\n\n" + result_text if before_text else result_text
-        else:
-            # Tool failed, report error
-            error_msg = tool_result.get("error", "An error occurred")
-            final_response = f"I tried to help but encountered an issue: {error_msg}"
-        
-        assistant_response = final_response.strip()
+            if await request.is_disconnected():
+                return
+            await chat_jobs.wait(job_id, settings.jobs_poll_interval_seconds)
+            current = await chat_jobs.get(job_id, current_user.user_id)
+            if current is None:
+                yield format_sse("error", {"detail": "Job expired", "status_code": 404, "retry_after": None})
+                return
     
-    # Save assistant message
-    await db_service.add_message(chat_id, "assistant", assistant_response)
-    
-    return MessageResponse(
-        role="assistant",
-        content=assistant_response,
-        timestamp=datetime.now(ZoneInfo("Asia/Kolkata"))
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
 from models.hospital import Hospital
-from services.db_service import db_service
+from services.catalog_service import catalog_cache
 from services.auth_service import get_current_user, TokenData
 
 router = APIRouter(prefix="/api/hospitals", tags=["hospitals"])
@@ -14,7 +14,7 @@ async def get_all_hospitals(
     current_user: TokenData = Depends(get_current_user)
 ):
     """Get all hospitals with optional filters"""
-    hospitals = await db_service.get_all_hospitals(
+    hospitals = await catalog_cache.get_all_hospitals(
         city=city,
         specialization=specialization,
         emergency_only=emergency_only
@@ -24,13 +24,13 @@ async def get_all_hospitals(
 @router.get("/cities")
 async def get_cities(current_user: TokenData = Depends(get_current_user)):
     """Get all unique cities"""
-    cities = await db_service.get_hospital_cities()
+    cities = await catalog_cache.get_hospital_cities()
     return {"cities": cities}
 
 @router.get("/specializations")
 async def get_specializations(current_user: TokenData = Depends(get_current_user)):
     """Get all unique specializations across hospitals"""
-    specializations = await db_service.get_hospital_specializations()
+    specializations = await catalog_cache.get_hospital_specializations()
     return {"specializations": specializations}
 
 @router.get("/{hospital_id}", response_model=Hospital)
@@ -39,7 +39,7 @@ async def get_hospital(
     current_user: TokenData = Depends(get_current_user)
 ):
     """Get a specific hospital by ID"""
-    hospital = await db_service.get_hospital_by_id(hospital_id)
+    hospital = await catalog_cache.get_hospital_by_id(hospital_id)
     
     if not hospital:
         raise HTTPException(
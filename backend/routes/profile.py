@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from services.db_service import db_service
+from services.db_service import db_service, EmailTakenError
 from services.auth_service import get_current_user, get_password_hash, verify_password, TokenData
 
 router = APIRouter(prefix="/api/profile", tags=["profile"])
@@ -47,29 +47,13 @@ async def update_profile(
     current_user: TokenData = Depends(get_current_user)
 ):
     """Update user profile"""
-    user = await db_service.get_user_by_id(current_user.user_id)
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    # Check if email is being changed and if it's already taken
-    if update_data.email and update_data.email != user["email"]:
-        existing = await db_service.get_user_by_email(update_data.email)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-    
     # Prepare update dict
     update_dict = {}
     if update_data.name:
         update_dict["name"] = update_data.name
     if update_data.email:
-        update_dict["email"] = update_data.email
+        # Stored lowercase like at signup, so the unique index catches any spelling
+        update_dict["email"] = update_data.email.lower()
     if update_data.phone is not None:
         update_dict["phone"] = update_data.phone
     
@@ -79,16 +63,20 @@ async def update_profile(
             detail="No update data provided"
         )
     
-    success = await db_service.update_user(current_user.user_id, update_dict)
-    
-    if not success:
+    # The unique email index rejects an email that is already taken
+    try:
+        updated_user = await db_service.update_user(current_user.user_id, update_dict)
+    except EmailTakenError:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update profile"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email already registered"
         )
     
-    # Get updated user
-    updated_user = await db_service.get_user_by_id(current_user.user_id)
+    if not updated_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
     
     return ProfileResponse(
         id=updated_user["id"],
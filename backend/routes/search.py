@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, Query, status, Depends
+from pydantic import BaseModel
+from typing import List, Optional
+from services.catalog_service import catalog_cache, SUGGESTION_TYPES
+from services.auth_service import get_current_user, TokenData
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+class Suggestion(BaseModel):
+    type: str  # "specialization", "city" or "doctor"
+    label: str
+    id: Optional[str] = None  # doctor ID
+    detail: Optional[str] = None  # doctor specialization
+
+class SuggestResponse(BaseModel):
+    query: str
+    suggestions: List[Suggestion]
+
+@router.get("/suggest", response_model=SuggestResponse, response_model_exclude_none=True)
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    types: Optional[str] = Query(None, description="Comma-separated: specialization, city, doctor"),
+    current_user: TokenData = Depends(get_current_user)
+):
+    """Autocomplete doctor names, specializations and cities by word prefix"""
+    requested = SUGGESTION_TYPES
+    if types:
+        requested = tuple(t.strip().lower() for t in types.split(",") if t.strip())
+        unknown = [t for t in requested if t not in SUGGESTION_TYPES]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown suggestion type: {', '.join(unknown)}"
+            )
+
+    suggestions = await catalog_cache.suggest(q, limit=limit, types=requested)
+    return SuggestResponse(query=q, suggestions=[Suggestion(**s) for s in suggestions])
@@ -0,0 +1,163 @@
+"""
+Admission Control for LLM calls
+Limits how many chat turns use the inference server at once. Turns beyond
+the limit wait in a priority queue: emergencies ("chest pain") are admitted
+first, everything else in arrival order. A turn that waits longer than the
+queue deadline is rejected with a Retry-After hint instead of piling up.
+Background LLM work (conversation summaries) waits behind every user turn.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+
+class AdmissionRejected(Exception):
+    """Raised when a turn can't be admitted before the queue deadline"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"The medical assistant is busy, please retry in {retry_after} seconds")
+
+
+class AdmissionController:
+    """Bounded concurrency with a priority queue in front of the LLM"""
+
+    PRIORITY_EMERGENCY = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_BACKGROUND = 2
+    PRIORITY_NAMES = {PRIORITY_EMERGENCY: "emergency", PRIORITY_NORMAL: "normal", PRIORITY_BACKGROUND: "background"}
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        queue_timeout_seconds: float,
+        max_queue: int,
+        enabled: bool = True
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.max_queue = max_queue
+        self.enabled = enabled
+        self.active = 0
+        # (priority, arrival sequence, future) - the sequence keeps equal priorities FIFO
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+        self.admitted = {name: 0 for name in self.PRIORITY_NAMES.values()}
+        self.rejected = {name: 0 for name in self.PRIORITY_NAMES.values()}
+        self._waits: Dict[str, deque] = {name: deque(maxlen=500) for name in self.PRIORITY_NAMES.values()}
+        # Recent slot hold times, used to estimate Retry-After
+        self._hold_times = deque(maxlen=100)
+
+    @property
+    def queued(self) -> int:
+        return self._queued_up_to(self.PRIORITY_BACKGROUND)
+
+    def _queued_up_to(self, priority: int) -> int:
+        """Waiters that would be admitted before a new one of this priority"""
+        return sum(1 for waiting, _, future in self._queue if waiting <= priority and not future.done())
+
+    def retry_after(self) -> int:
+        """Estimate in seconds until the current queue has drained"""
+        hold_time = sum(self._hold_times) / len(self._hold_times) if self._hold_times else self.queue_timeout_seconds
+        return max(1, math.ceil(hold_time * (self.queued + 1) / self.max_concurrency))
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL) -> float:
+        """Wait for a slot; returns the time spent queued in seconds"""
+        name = self.PRIORITY_NAMES[priority]
+        if not self.enabled:
+            return 0.0
+
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            self.admitted[name] += 1
+            self._waits[name].append(0.0)
+            return 0.0
+
+        # Emergencies are never turned away because the queue is long, and
+        # waiting background work never counts against user turns
+        if priority != self.PRIORITY_EMERGENCY and self._queued_up_to(priority) >= self.max_queue:
+            self.rejected[name] += 1
+            raise AdmissionRejected(self.retry_after())
+
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # The slot may have been handed over just before the caller gave up
+            if future.done() and not future.cancelled():
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected[name] += 1
+                raise AdmissionRejected(self.retry_after())
+            raise
+
+        waited = time.perf_counter() - start
+        self.admitted[name] += 1
+        self._waits[name].append(waited)
+        return waited
+
+    def release(self, hold_time: Optional[float] = None):
+        """Free a slot and hand it to the highest-priority waiting turn"""
+        if not self.enabled:
+            return
+
+        if hold_time is not None:
+            self._hold_times.append(hold_time)
+
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            # Skip turns that timed out or were cancelled while queued
+            if not future.done():
+                # The slot passes straight to the waiter, so active stays the same
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NORMAL):
+        """Hold a slot for the duration of the block"""
+        await self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        """Get queue length and wait times for monitoring"""
+        waits = {}
+        for name, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[name] = {
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1) if ordered else 0.0
+            }
+
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait": waits
+        }
+
+
+# Global instance
+admission_controller = AdmissionController(
+    max_concurrency=settings.admission_max_concurrency,
+    queue_timeout_seconds=settings.admission_queue_timeout_seconds,
+    max_queue=settings.admission_max_queue,
+    enabled=settings.admission_enabled
+)
@@ -0,0 +1,204 @@
+"""
+Response cache for repeated medical questions.
+Stores LLM answers keyed by the normalized question text and the system
+prompt version, so definitional questions ("what is diabetes") are only
+generated once. Entries expire after a TTL and the least recently used
+entries are evicted once the cache is full.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import zoneinfo
+from pymongo import ReturnDocument
+from config import settings
+from services.db_service import db_service
+from services.llm_service import PROMPT_VERSION
+
+
+class InMemoryCacheBackend:
+    """Process-local LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a cached answer and mark it as recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        answer, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return answer
+
+    async def set(self, key: str, answer: str, ttl_seconds: int):
+        """Store an answer, evicting the least recently used entries if full"""
+        self._entries[key] = (answer, time.time() + ttl_seconds)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def size(self) -> int:
+        """Get the number of cached entries"""
+        return len(self._entries)
+
+
+class MongoCacheBackend:
+    """
+    MongoDB-backed cache so hits survive restarts and are shared by all workers.
+    Expiry is handled by a TTL index; LRU order is tracked with last_accessed.
+    """
+
+    def __init__(self, max_entries: int, collection_name: str = "response_cache"):
+        self.max_entries = max_entries
+        self.collection_name = collection_name
+        self.evictions = 0
+
+    @property
+    def collection(self):
+        return db_service.db[self.collection_name]
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a cached answer and mark it as recently used"""
+        now = datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
+        # The TTL monitor only runs once a minute, so check expiry explicitly
+        entry = await self.collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_accessed": now}},
+            projection={"answer": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return entry["answer"] if entry else None
+
+    async def set(self, key: str, answer: str, ttl_seconds: int):
+        """Store an answer, evicting the least recently used entries if full"""
+        now = datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {
+                "answer": answer,
+                "prompt_version": PROMPT_VERSION,
+                "created_at": now,
+                "last_accessed": now,
+                "expires_at": now + timedelta(seconds=ttl_seconds)
+            }},
+            upsert=True
+        )
+
+        # estimated_document_count reads collection metadata, so this stays cheap
+        excess = await self.collection.estimated_document_count() - self.max_entries
+        if excess > 0:
+            cursor = self.collection.find({}, {"_id": 1}).sort("last_accessed", 1).limit(excess)
+            stale_keys = [doc["_id"] async for doc in cursor]
+            if stale_keys:
+                result = await self.collection.delete_many({"_id": {"$in": stale_keys}})
+                self.evictions += result.deleted_count
+
+    async def size(self) -> int:
+        """Get the number of cached entries"""
+        return await self.collection.estimated_document_count()
+
+
+class ResponseCache:
+    """Caches LLM answers for single-turn questions"""
+
+    def __init__(self, backend, ttl_seconds: int, enabled: bool = True):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace"""
+        question = re.sub(r"[^\w\s]", " ", question.lower())
+        return " ".join(question.split())
+
+    def make_key(self, question: str) -> str:
+        """Build the cache key from the prompt version and normalized question"""
+        raw = f"{PROMPT_VERSION}:{self.normalize(question)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, question: str) -> Optional[str]:
+        """Get the cached answer for a question, if any"""
+        if not self.enabled:
+            return None
+
+        try:
+            answer = await self.backend.get(self.make_key(question))
+        except Exception as e:
+            # A cache failure must never fail the chat turn
+            self.errors += 1
+            print(f"Warning: Response cache lookup failed: {e}")
+            return None
+
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    async def set(self, question: str, answer: str):
+        """Store the answer for a question"""
+        if not self.enabled:
+            return
+
+        try:
+            await self.backend.set(self.make_key(question), answer, self.ttl_seconds)
+            self.stores += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"Warning: Response cache store failed: {e}")
+
+    async def stats(self) -> dict:
+        """Get hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        try:
+            size = await asyncio.wait_for(self.backend.size(), timeout=2)
+        except Exception:
+            size = None
+
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "prompt_version": PROMPT_VERSION,
+            "size": size,
+            "max_entries": self.backend.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.backend.evictions,
+            "errors": self.errors
+        }
+
+
+def _create_backend():
+    if settings.response_cache_backend == "mongo":
+        return MongoCacheBackend(settings.response_cache_max_entries)
+    return InMemoryCacheBackend(settings.response_cache_max_entries)
+
+
+# Global instance
+response_cache = ResponseCache(
+    _create_backend(),
+    ttl_seconds=settings.response_cache_ttl_seconds,
+    enabled=settings.response_cache_enabled
+)
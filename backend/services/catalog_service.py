@@ -0,0 +1,371 @@
+"""
+Doctor & Hospital Catalog Cache
+The doctor and hospital collections are small and change rarely, so they
+are loaded into memory at startup and indexed by ID, specialization, city
+and emergency flag. Listings, filters and lookups are then answered with
+dictionary and set operations instead of MongoDB queries. The cache
+reloads after a TTL, or sooner when the catalog version stamp in MongoDB
+(bumped by every catalog write in db_service) changes.
+
+Doctor names, specializations and cities are also kept in sorted prefix
+indexes for autocomplete and doctor name resolution: a lookup is a binary
+search plus a walk over the matches, whatever the size of the catalog.
+"""
+
+import asyncio
+import bisect
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from config import settings
+from services.db_service import db_service
+
+
+SUGGESTION_TYPES = ("specialization", "city", "doctor")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and a leading "Dr" title, collapse whitespace"""
+    words = re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+    if words and words[0] == "dr":
+        words = words[1:]
+    return " ".join(words)
+
+
+def _name_words(name: str) -> List[str]:
+    """Words of a person's name without "Dr" titles"""
+    return [word for word in normalize(name).split() if word != "dr"]
+
+
+def _covers_name(words: List[str], name_words: List[str]) -> bool:
+    """Every word of the query starts a different word of the name ("S Johnson", "Johnson")"""
+    remaining = list(name_words)
+    for word in words:
+        match = next((name_word for name_word in remaining if name_word.startswith(word)), None)
+        if match is None:
+            return False
+        remaining.remove(match)
+    return True
+
+
+def _contains_name(words: List[str], name_words: List[str]) -> bool:
+    """The full name appears as consecutive words of the query ("Sarah Johnson (Cardiologist)")"""
+    size = len(name_words)
+    return any(words[start:start + size] == name_words for start in range(len(words) - size + 1))
+
+
+class PrefixIndex:
+    """Normalized keys in a sorted array; prefix lookups use bisect"""
+
+    def __init__(self, entries: Iterable[Tuple[str, dict]]):
+        # Every entry is reachable from the start of each word of its text,
+        # so "john" finds "Dr. Sarah Johnson"
+        keyed = []
+        for position, (text, entry) in enumerate(entries):
+            words = normalize(text).split()
+            for start in range(len(words)):
+                keyed.append((" ".join(words[start:]), start, position, entry))
+        # Full-text matches sort before later-word matches of the same key
+        keyed.sort(key=lambda item: (item[0], item[1], item[2]))
+        self._keys = [item[0] for item in keyed]
+        self._entries = [(item[2], item[3]) for item in keyed]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def lookup(self, prefix: str, limit: Optional[int] = 10) -> List[dict]:
+        """Entries with a word starting with the (normalized) prefix, each once; limit None returns all"""
+        prefix = normalize(prefix)
+        if not prefix or (limit is not None and limit <= 0):
+            return []
+
+        found, seen = [], set()
+        index = bisect.bisect_left(self._keys, prefix)
+        while index < len(self._keys) and self._keys[index].startswith(prefix):
+            position, entry = self._entries[index]
+            if position not in seen:
+                seen.add(position)
+                found.append(entry)
+                if len(found) == limit:
+                    break
+            index += 1
+        return found
+
+
+class CatalogSnapshot:
+    """An immutable copy of the catalog with its lookup indexes"""
+
+    def __init__(self, doctors: List[dict], hospitals: List[dict], version: int):
+        self.doctors = doctors
+        self.hospitals = hospitals
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        self.doctors_by_id = {doctor["id"]: doctor for doctor in doctors}
+        self.doctor_name_words = {doctor["id"]: _name_words(doctor.get("name", "")) for doctor in doctors}
+        # Lowercased specialization -> positions in self.doctors
+        self.doctors_by_specialization: Dict[str, List[int]] = {}
+        for position, doctor in enumerate(doctors):
+            key = doctor.get("specialization", "").lower()
+            self.doctors_by_specialization.setdefault(key, []).append(position)
+
+        self.hospitals_by_id = {hospital["id"]: hospital for hospital in hospitals}
+        self.hospitals_by_city: Dict[str, Set[int]] = {}
+        self.hospitals_by_specialization: Dict[str, Set[int]] = {}
+        self.emergency_hospitals: Set[int] = set()
+        for position, hospital in enumerate(hospitals):
+            self.hospitals_by_city.setdefault(hospital.get("city", "").lower(), set()).add(position)
+            for specialization in hospital.get("specializations", []):
+                self.hospitals_by_specialization.setdefault(specialization.lower(), set()).add(position)
+            if hospital.get("emergency_available"):
+                self.emergency_hospitals.add(position)
+
+        self.doctor_specializations = sorted({doctor["specialization"] for doctor in doctors if doctor.get("specialization")})
+        self.hospital_cities = sorted({hospital["city"] for hospital in hospitals if hospital.get("city")})
+        self.hospital_specializations = sorted({
+            specialization for hospital in hospitals for specialization in hospital.get("specializations", [])
+        })
+
+        specializations = {}
+        for specialization in self.doctor_specializations + self.hospital_specializations:
+            specializations.setdefault(normalize(specialization), specialization)
+        self.prefix_indexes = {
+            "specialization": PrefixIndex(
+                (label, {"type": "specialization", "label": label}) for label in specializations.values()
+            ),
+            "city": PrefixIndex((city, {"type": "city", "label": city}) for city in self.hospital_cities),
+            "doctor": PrefixIndex(
+                (doctor.get("name", ""), {"type": "doctor", "label": doctor.get("name", ""), "id": doctor["id"],
+                                           "detail": doctor.get("specialization")})
+                for doctor in doctors
+            )
+        }
+
+
+def _matching(index: Dict[str, Iterable[int]], term: str) -> Set[int]:
+    """Positions under every index key containing the term (case-insensitive partial match, like the $regex filters)"""
+    term = term.lower()
+    positions = set()
+    for key, values in index.items():
+        if term in key:
+            positions.update(values)
+    return positions
+
+
+class CatalogCache:
+    """In-memory doctor and hospital catalog with the same lookups as db_service"""
+
+    def __init__(self, ttl_seconds: int, version_check_seconds: float, enabled: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self.enabled = enabled
+        self._snapshot: Optional[CatalogSnapshot] = None
+        # Prefix indexes for search when the cache is off or can't be loaded
+        self._search_snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+        self.hits = 0
+        self.fallbacks = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.version_checks = 0
+
+    async def load(self):
+        """Load the whole catalog and swap in the new snapshot"""
+        version = await db_service.get_catalog_version()
+        doctors, hospitals = await asyncio.gather(db_service.get_all_doctors(), db_service.get_all_hospitals())
+        self._snapshot = CatalogSnapshot(doctors, hospitals, version)
+        self._checked_at = time.monotonic()
+        self.loads += 1
+        print(f"Loaded catalog v{version}: {len(doctors)} doctors, {len(hospitals)} hospitals")
+
+    async def _current(self) -> Optional[CatalogSnapshot]:
+        """The snapshot to serve from, reloaded if expired or outdated; None if the catalog can't be loaded"""
+        if not self.enabled:
+            return None
+
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot and now - snapshot.loaded_at < self.ttl_seconds and now - self._checked_at < self.version_check_seconds:
+            self.hits += 1
+            return snapshot
+
+        async with self._lock:
+            # Another request may have refreshed it while this one waited
+            snapshot = self._snapshot
+            now = time.monotonic()
+            try:
+                if snapshot is None or now - snapshot.loaded_at >= self.ttl_seconds:
+                    await self.load()
+                elif now - self._checked_at >= self.version_check_seconds:
+                    self.version_checks += 1
+                    self._checked_at = now
+                    if await db_service.get_catalog_version() != snapshot.version:
+                        await self.load()
+            except Exception as e:
+                # Keep serving the previous snapshot if there is one
+                self.load_errors += 1
+                print(f"Warning: Could not refresh the catalog cache: {e}")
+
+        snapshot = self._snapshot
+        if snapshot:
+            self.hits += 1
+        else:
+            self.fallbacks += 1
+        return snapshot
+
+    async def _snapshot_or_load(self) -> CatalogSnapshot:
+        """
+        The cached snapshot for the prefix indexes. When caching is off or
+        unavailable, a search-only snapshot is kept instead and rebuilt only
+        when the catalog version changes or the TTL passes, so each search
+        costs one version lookup rather than reading the whole catalog.
+        """
+        snapshot = await self._current()
+        if snapshot:
+            return snapshot
+
+        version = await db_service.get_catalog_version()
+        snapshot = self._search_snapshot
+        if snapshot is None or snapshot.version != version or time.monotonic() - snapshot.loaded_at >= self.ttl_seconds:
+            doctors, hospitals = await asyncio.gather(db_service.get_all_doctors(), db_service.get_all_hospitals())
+            snapshot = self._search_snapshot = CatalogSnapshot(doctors, hospitals, version)
+            self.loads += 1
+        return snapshot
+
+    def invalidate(self):
+        """Reload the catalog on the next lookup"""
+        self._snapshot = None
+        self._search_snapshot = None
+
+    # ============ Doctors ============
+
+    async def get_all_doctors(self, specialization: str = None) -> List[dict]:
+        """Get all doctors, optionally filtered by specialization (case-insensitive partial match)"""
+        snapshot = await self._current()
+        if not snapshot:
+            return await db_service.get_all_doctors(specialization=specialization)
+
+        if not specialization:
+            return [dict(doctor) for doctor in snapshot.doctors]
+        positions = _matching(snapshot.doctors_by_specialization, specialization)
+        return [dict(snapshot.doctors[position]) for position in sorted(positions)]
+
+    async def get_doctor_by_id(self, doctor_id: str) -> Optional[dict]:
+        """Get a doctor by ID"""
+        snapshot = await self._current()
+        if not snapshot:
+            return await db_service.get_doctor_by_id(doctor_id)
+
+        doctor = snapshot.doctors_by_id.get(doctor_id)
+        return dict(doctor) if doctor else None
+
+    async def get_doctor_specializations(self) -> List[str]:
+        """Get all unique doctor specializations"""
+        snapshot = await self._current()
+        if not snapshot:
+            return await db_service.get_doctor_specializations()
+        return list(snapshot.doctor_specializations)
+
+    async def find_doctor_by_name(self, name: str) -> Optional[dict]:
+        """
+        Resolve a doctor name as written by a user or the LLM ("Dr. Johnson",
+        "Sarah Johnson (Cardiologist)"). A doctor matches when every word of
+        the name starts a word of the doctor's name, or when the doctor's
+        full name appears in it. Partial matches ("Sarah Patel" for Sarah
+        Johnson) and names matching several doctors return None, since the
+        result is used to book appointments. The prefix index only finds
+        the candidates.
+        """
+        snapshot = await self._snapshot_or_load()
+        words = _name_words(name)
+        if not words:
+            return None
+
+        index = snapshot.prefix_indexes["doctor"]
+        candidates = {entry["id"] for word in set(words) for entry in index.lookup(word, limit=None)}
+        name_words = {doctor_id: snapshot.doctor_name_words[doctor_id] for doctor_id in candidates}
+
+        for rule in (list.__eq__, _covers_name, _contains_name):
+            matched = [doctor_id for doctor_id, doctor_words in name_words.items() if rule(words, doctor_words)]
+            if matched:
+                return dict(snapshot.doctors_by_id[matched[0]]) if len(matched) == 1 else None
+        return None
+
+    # ============ Hospitals ============
+
+    async def get_all_hospitals(self, city: str = None, specialization: str = None, emergency_only: bool = False) -> List[dict]:
+        """Get all hospitals with optional filters (city is matched exactly, specialization partially, both ignoring case)"""
+        snapshot = await self._current()
+        if not snapshot:
+            return await db_service.get_all_hospitals(city=city, specialization=specialization, emergency_only=emergency_only)
+
+        positions = set(range(len(snapshot.hospitals)))
+        if city:
+            positions &= snapshot.hospitals_by_city.get(city.lower(), set())
+        if specialization:
+            positions &= _matching(snapshot.hospitals_by_specialization, specialization)
+        if emergency_only:
+            positions &= snapshot.emergency_hospitals
+        return [dict(snapshot.hospitals[position]) for position in sorted(positions)]
+
+    async def get_hospital_by_id(self, hospital_id: str) -> Optional[dict]:
+        """Get a hospital by ID"""
+        snapshot = await self._current()
+        if not snapshot:
+            return await db_service.get_hospital_by_id(hospital_id)
+
+        hospital = snapshot.hospitals_by_id.get(hospital_id)
+        return dict(hospital) if hospital else None
+
+    async def get_hospital_cities(self) -> List[str]:
+        """Get all unique hospital cities"""
+        snapshot = await self._current()
+        if not snapshot:
+            return await db_service.get_hospital_cities()
+        return list(snapshot.hospital_cities)
+
+    async def get_hospital_specializations(self) -> List[str]:
+        """Get all unique hospital specializations"""
+        snapshot = await self._current()
+        if not snapshot:
+            return await db_service.get_hospital_specializations()
+        return list(snapshot.hospital_specializations)
+
+    # ============ Search ============
+
+    async def suggest(self, query: str, limit: int = 10, types: Iterable[str] = SUGGESTION_TYPES) -> List[dict]:
+        """Autocomplete suggestions for the query: specializations, then cities, then doctors"""
+        snapshot = await self._snapshot_or_load()
+        suggestions = []
+        for suggestion_type in SUGGESTION_TYPES:
+            if suggestion_type in types and len(suggestions) < limit:
+                matches = snapshot.prefix_indexes[suggestion_type].lookup(query, limit - len(suggestions))
+                suggestions.extend(dict(match) for match in matches)
+        return suggestions
+
+    def stats(self) -> dict:
+        """Get catalog size and cache counters for monitoring"""
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "version": snapshot.version if snapshot else None,
+            "doctors": len(snapshot.doctors) if snapshot else 0,
+            "hospitals": len(snapshot.hospitals) if snapshot else 0,
+            "prefix_keys": sum(len(index) for index in snapshot.prefix_indexes.values()) if snapshot else 0,
+            "age_seconds": round(time.monotonic() - snapshot.loaded_at, 1) if snapshot else None,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "version_checks": self.version_checks
+        }
+
+
+# Global instance
+catalog_cache = CatalogCache(
+    ttl_seconds=settings.catalog_cache_ttl_seconds,
+    version_check_seconds=settings.catalog_version_check_seconds,
+    enabled=settings.catalog_cache_enabled
+)
@@ -0,0 +1,193 @@
+"""
+Conversation Context Builder
+Fits the system prompt and as much recent conversation as possible into a
+token budget, so long doctor lists and tool outputs can no longer push the
+prompt past the model's context window.
+"""
+
+import importlib.util
+import re
+from typing import Dict, List, Tuple
+from config import settings
+
+
+class TokenCounter:
+    """
+    Counts tokens with the model's tokenizer when `transformers` and the
+    tokenizer are available, otherwise with a fast local approximation.
+    """
+
+    # Chat templates add role headers and end-of-turn tokens to every message
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, tokenizer_name: str = ""):
+        self.tokenizer = None
+        if tokenizer_name and importlib.util.find_spec("transformers") is not None:
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            except Exception as e:
+                print(f"Warning: Could not load tokenizer {tokenizer_name}, using approximation: {e}")
+
+    @property
+    def method(self) -> str:
+        return "tokenizer" if self.tokenizer is not None else "approximate"
+
+    def count(self, text: str) -> int:
+        """Count the tokens in a piece of text"""
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return self.approximate(text)
+
+    @staticmethod
+    def approximate(text: str) -> int:
+        """
+        Approximate a BPE token count: short words are one token, long words
+        split roughly every 4 characters, and non-ASCII symbols (emoji, ₹)
+        cost about one token per two UTF-8 bytes. Errs on the high side.
+        """
+        tokens = 0
+        for piece in re.findall(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]", text):
+            if piece.isascii():
+                tokens += 1 + (len(piece) - 1) // 4
+            else:
+                tokens += max(1, len(piece.encode("utf-8")) // 2)
+        return tokens
+
+    def count_message(self, message: Dict[str, str]) -> int:
+        """Count the tokens of a chat message including template overhead"""
+        return self.count(message["content"]) + self.MESSAGE_OVERHEAD
+
+
+class ContextBuilder:
+    """Builds the message list sent to the LLM within a token budget"""
+
+    # Below this many free tokens an oversized message is dropped instead of truncated
+    MIN_TRUNCATED_TOKENS = 64
+
+    def __init__(self, counter: TokenCounter, budget_tokens: int):
+        self.counter = counter
+        self.budget_tokens = budget_tokens
+        self.requests = 0
+        self.total_prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.dropped_messages = 0
+        self.truncated_messages = 0
+
+    @staticmethod
+    def is_pending_booking_turn(message: Dict[str, str]) -> bool:
+        """Check if a message is the assistant's booking summary awaiting YES/NO"""
+        if message.get("role") != "assistant":
+            return False
+        content = message.get("content", "")
+        return (
+            ("confirm" in content.lower() or "YES" in content)
+            and re.search(r"Date\s*:?\s*\**\s*\d{4}-\d{2}-\d{2}", content, re.IGNORECASE) is not None
+        )
+
+    def _truncate(self, message: Dict[str, str], max_tokens: int) -> Dict[str, str]:
+        """Keep the beginning of a message so it fits in max_tokens"""
+        content = message["content"]
+        available = max_tokens - TokenCounter.MESSAGE_OVERHEAD
+        while content and self.counter.count(content) > available:
+            # Shrink proportionally, then re-check
+            ratio = available / max(1, self.counter.count(content))
+            content = content[:int(len(content) * ratio * 0.95)]
+        return {"role": message["role"], "content": content.rstrip() + "\n[...truncated]"}
+
+    def build(
+        self,
+        system_prompt: str,
+        messages: List[Dict[str, str]]
+    ) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Fill the budget newest-first.
+
+        The system prompt (plus any system messages in the history), the
+        latest user message and the pending booking confirmation (if any)
+        are always kept; older turns are added until the budget runs out.
+        Returns (formatted_messages, prompt_tokens).
+        """
+        # Extra system messages (e.g. the conversation summary) are merged into the system prompt
+        extra_system = [msg["content"] for msg in messages if msg["role"] == "system"]
+        if extra_system:
+            system_prompt = "\n\n".join([system_prompt] + extra_system)
+
+        system_message = {"role": "system", "content": system_prompt}
+        used = self.counter.count_message(system_message)
+
+        history = [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in messages
+            if msg["role"] != "system"
+        ]
+
+        # Pin the current user turn and the booking summary the user may be answering
+        pinned = set()
+        if history:
+            pinned.add(len(history) - 1)
+        for index in range(len(history) - 1, -1, -1):
+            if self.is_pending_booking_turn(history[index]):
+                pinned.add(index)
+                break
+
+        selected: Dict[int, Dict[str, str]] = {}
+        for index in sorted(pinned, reverse=True):
+            message = history[index]
+            cost = self.counter.count_message(message)
+            if used + cost > self.budget_tokens:
+                message = self._truncate(message, max(self.MIN_TRUNCATED_TOKENS, self.budget_tokens - used))
+                cost = self.counter.count_message(message)
+                self.truncated_messages += 1
+            selected[index] = message
+            used += cost
+
+        # Fill the remaining budget with the newest unpinned turns
+        for index in range(len(history) - 1, -1, -1):
+            if index in pinned:
+                continue
+            message = history[index]
+            cost = self.counter.count_message(message)
+            if used + cost <= self.budget_tokens:
+                selected[index] = message
+                used += cost
+                continue
+
+            remaining = self.budget_tokens - used
+            if remaining >= self.MIN_TRUNCATED_TOKENS:
+                message = self._truncate(message, remaining)
+                selected[index] = message
+                used += self.counter.count_message(message)
+                self.truncated_messages += 1
+            # Older turns would leave a gap in the conversation, stop here
+            break
+
+        self.dropped_messages += len(history) - len(selected)
+        formatted_messages = [system_message] + [selected[index] for index in sorted(selected)]
+
+        self.requests += 1
+        self.total_prompt_tokens += used
+        self.max_prompt_tokens = max(self.max_prompt_tokens, used)
+
+        return formatted_messages, used
+
+    def stats(self) -> dict:
+        """Get prompt size counters for monitoring"""
+        return {
+            "token_counter": self.counter.method,
+            "budget_tokens": self.budget_tokens,
+            "requests": self.requests,
+            "avg_prompt_tokens": round(self.total_prompt_tokens / self.requests, 1) if self.requests else 0.0,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "dropped_messages": self.dropped_messages,
+            "truncated_messages": self.truncated_messages
+        }
+
+
+# Global instance
+context_builder = ContextBuilder(
+    TokenCounter(settings.llm_tokenizer),
+    budget_tokens=settings.llm_context_budget_tokens
+)
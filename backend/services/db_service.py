@@ -1,15 +1,80 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
 import zoneinfo
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from config import settings
 
+# Indexes created at startup by DatabaseService.ensure_indexes: collection -> [(keys, options)].
+# Every query with a filter should be served by one of these (see benchmarks/check_query_plans.py).
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    "chats": [
+        # Sidebar: a user's chats, most recently updated first
+        ([("user_id", ASCENDING), ("updated_at", DESCENDING)], {}),
+    ],
+    "messages": [
+        ([("chat_id", ASCENDING), ("seq", ASCENDING)], {"unique": True}),
+    ],
+    "stream_checkpoints": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    # Finished chat jobs (job_service.MongoJobStore)
+    "chat_jobs": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    # Response cache (cache_service.MongoCacheBackend): expiry, and LRU eviction by last_accessed
+    "response_cache": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+        ([("last_accessed", ASCENDING)], {}),
+    ],
+    "appointments": [
+        ([("user_id", ASCENDING), ("appointment_date", DESCENDING)], {}),
+        # A doctor's slot can hold one appointment that isn't cancelled (scheduled or completed);
+        # the insert itself is the conflict check. "active" mirrors status != cancelled, since
+        # partial filters can't use $ne (or $in before MongoDB 6.0).
+        ([("doctor_id", ASCENDING), ("appointment_date", ASCENDING), ("appointment_time", ASCENDING)], {
+            "name": "unique_active_slot",
+            "unique": True,
+            "partialFilterExpression": {"active": True}
+        }),
+    ],
+    "doctors": [
+        ([("id", ASCENDING)], {}),
+        ([("specialization", ASCENDING)], {}),
+    ],
+    "hospitals": [
+        ([("id", ASCENDING)], {}),
+        ([("city", ASCENDING)], {}),
+    ],
+}
+
+
+class IndexBuildError(Exception):
+    """Raised at startup when a unique index can't be built; writes rely on them for correctness"""
+    pass
+
+
+class SlotUnavailableError(Exception):
+    """Raised when a doctor's time slot already has an appointment that isn't cancelled"""
+    pass
+
+
+class EmailTakenError(Exception):
+    """Raised when another user already has the email address"""
+    pass
+
+
 class DatabaseService:
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
         self.db = None
-        self._indexes_created = False
+        self._migration_task: Optional[asyncio.Task] = None
         
     async def connect(self):
         """Connect to MongoDB"""
@@ -27,24 +92,62 @@ class DatabaseService:
         )
         self.db = self.client[settings.database_name]
         
-    async def _ensure_indexes(self):
-        """Create indexes if not already created"""
-        if not self._indexes_created:
+    async def ensure_indexes(self):
+        """
+        Create the indexes in INDEXES (call from the app lifespan); existing
+        ones are left as they are. A failed unique index raises
+        IndexBuildError, since it is the only guard against duplicates
+        (e.g. double-booked slots); other failures are logged.
+        """
+        await self._prepare_slot_index()
+        
+        async def create(collection: str, keys: list, options: dict) -> Optional[str]:
             try:
-                await self.db.users.create_index("email", unique=True)
-                self._indexes_created = True
+                await self.db[collection].create_index(keys, **options)
             except Exception as e:
-                print(f"Warning: Could not create indexes: {e}")
+                if options.get("unique"):
+                    return f"{collection} {keys}: {e}"
+                print(f"Warning: Could not create index {keys} on {collection}: {e}")
+            return None
+        
+        failures = await asyncio.gather(*[
+            create(collection, keys, options)
+            for collection, indexes in INDEXES.items()
+            for keys, options in indexes
+        ])
+        failures = [failure for failure in failures if failure]
+        if failures:
+            raise IndexBuildError("Could not create unique indexes:\n" + "\n".join(failures))
+        
+    async def _prepare_slot_index(self):
+        """
+        Mark appointments stored before the "active" flag existed and drop
+        the slot index that only covered scheduled appointments
+        """
+        await self.db.appointments.update_many(
+            {"active": {"$exists": False}, "status": {"$ne": "cancelled"}},
+            {"$set": {"active": True}}
+        )
+        try:
+            await self.db.appointments.drop_index("unique_scheduled_slot")
+        except Exception:
+            pass  # Never created, or already dropped
         
     async def close(self):
         """Close MongoDB connection"""
+        if self._migration_task:
+            self._migration_task.cancel()
         if self.client:
             self.client.close()
     
     # ============ User Operations ============
     
-    async def create_user(self, email: str, name: str, hashed_password: str, phone: str = None) -> str:
-        """Create a new user and return their ID"""
+    async def create_user(self, email: str, name: str, hashed_password: str, phone: str = None) -> dict:
+        """
+        Create a new user and return it. Raises EmailTakenError if the email
+        is already registered. There is no pre-check: the unique email index
+        is the guard, and ensure_indexes refuses to start the app without it.
+        """
         user_doc = {
             "email": email.lower(),
             "name": name,
@@ -52,8 +155,13 @@ class DatabaseService:
             "phone": phone,
             "created_at": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
         }
-        result = await self.db.users.insert_one(user_doc)
-        return str(result.inserted_id)
+        try:
+            result = await self.db.users.insert_one(user_doc)
+        except DuplicateKeyError:
+            raise EmailTakenError(f"{user_doc['email']} is already registered")
+        user_doc.pop("_id", None)
+        user_doc["id"] = str(result.inserted_id)
+        return user_doc
     
     async def get_user_by_email(self, email: str) -> Optional[dict]:
         """Get a user by email (case-insensitive)"""
@@ -85,17 +193,20 @@ class DatabaseService:
     
     # ============ Chat Operations ============
     
-    async def create_chat(self, title: str, user_id: str) -> str:
-        """Create a new chat and return its ID"""
+    async def create_chat(self, title: str, user_id: str) -> dict:
+        """Create a new chat and return it (with its empty message list)"""
         chat_doc = {
             "title": title,
             "user_id": user_id,
             "created_at": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata")),
             "updated_at": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata")),
-            "messages": []
+            "message_count": 0
         }
         result = await self.db.chats.insert_one(chat_doc)
-        return str(result.inserted_id)
+        chat_doc.pop("_id", None)
+        chat_doc["id"] = str(result.inserted_id)
+        chat_doc["messages"] = []
+        return chat_doc
     
     async def get_all_chats(self, user_id: str) -> List[dict]:
         """Get all chats for a specific user (without messages for efficiency)"""
@@ -109,13 +220,53 @@ class DatabaseService:
             chats.append(chat)
         return chats
     
-    async def get_chat(self, chat_id: str, user_id: str = None) -> Optional[dict]:
-        """Get a specific chat with all messages"""
+    async def get_chat(
+        self,
+        chat_id: str,
+        user_id: str = None,
+        limit: Optional[int] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Optional[dict]:
+        """
+        Get a specific chat with all messages, or one page of them.
+        
+        Pages are cut by message sequence number: the last `limit` messages
+        before `before` (the latest ones if neither cursor is given), or the
+        first `limit` messages after `after`. `next_cursor` is the sequence
+        number to pass as the same cursor for the following page, or None
+        once there are no more messages in that direction.
+        """
         try:
             query = {"_id": ObjectId(chat_id)}
             if user_id:
                 query["user_id"] = user_id
-            chat = await self.db.chats.find_one(query)
+            # One extra message tells whether there is another page
+            count = limit + 1 if limit is not None else None
+            chat = await self._get_chat_with_messages(query, count, before, after)
+            if not chat:
+                return None
+            
+            messages = chat["messages"]
+            chat["next_cursor"] = None
+            if limit is not None and len(messages) > limit:
+                if after is None:
+                    chat["messages"] = messages[-limit:]
+                    chat["next_cursor"] = chat["messages"][0]["seq"]
+                else:
+                    chat["messages"] = messages[:limit]
+                    chat["next_cursor"] = chat["messages"][-1]["seq"]
+            return chat
+        except Exception:
+            return None
+    
+    async def get_chat_info(self, chat_id: str, user_id: str) -> Optional[dict]:
+        """Get a chat owned by the user without its messages"""
+        try:
+            chat = await self.db.chats.find_one(
+                {"_id": ObjectId(chat_id), "user_id": user_id},
+                {"messages": 0}
+            )
             if chat:
                 chat["id"] = str(chat.pop("_id"))
             return chat
@@ -123,34 +274,82 @@ class DatabaseService:
             return None
     
     async def delete_chat(self, chat_id: str, user_id: str) -> bool:
-        """Delete a chat (only if owned by user)"""
+        """Delete a chat and its messages (only if owned by user)"""
         try:
             result = await self.db.chats.delete_one({
                 "_id": ObjectId(chat_id),
                 "user_id": user_id
             })
-            return result.deleted_count > 0
+            if result.deleted_count == 0:
+                return False
+            await self.db.messages.delete_many({"chat_id": chat_id})
+            return True
         except Exception:
             return False
     
+    @staticmethod
+    def make_message(role: str, content: str) -> dict:
+        """Build a message document timestamped now"""
+        return {
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
+        }
+    
     async def add_message(self, chat_id: str, role: str, content: str) -> bool:
         """Add a message to a chat"""
+        return await self.append_messages(chat_id, [self.make_message(role, content)])
+    
+    async def append_messages(self, chat_id: str, messages: List[dict], title: Optional[str] = None) -> bool:
+        """
+        Add several messages to a chat, and optionally set its title. The chat
+        update reserves the next sequence numbers (so concurrent turns never
+        collide), then the messages are inserted in one batch. Returns False
+        if the chat doesn't exist; a failed insert is undone and re-raised.
+        """
+        fields = {"updated_at": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))}
+        if title is not None:
+            fields["title"] = title
         try:
-            message = {
-                "role": role,
-                "content": content,
-                "timestamp": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
-            }
-            result = await self.db.chats.update_one(
-                {"_id": ObjectId(chat_id)},
-                {
-                    "$push": {"messages": message},
-                    "$set": {"updated_at": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))}
-                }
-            )
-            return result.modified_count > 0
+            for _ in range(2):
+                chat = await self.db.chats.find_one_and_update(
+                    {"_id": ObjectId(chat_id), "message_count": {"$exists": True}},
+                    {"$inc": {"message_count": len(messages)}, "$set": fields},
+                    projection={"message_count": 1}
+                )
+                # Chats still in the embedded layout are migrated on their first new message
+                if chat or await self.migrate_chat(chat_id) is None:
+                    break
         except Exception:
             return False
+        if not chat:
+            return False
+        
+        first_seq = chat["message_count"]
+        try:
+            await self.db.messages.insert_many([
+                {**message, "chat_id": chat_id, "seq": first_seq + i}
+                for i, message in enumerate(messages)
+            ])
+        except Exception:
+            await self._release_seqs(chat_id, first_seq, len(messages))
+            raise
+        return True
+    
+    async def _release_seqs(self, chat_id: str, first_seq: int, count: int):
+        """
+        Undo the reservation of a failed insert: remove the messages that did
+        get in, and give the sequence numbers back unless a later turn has
+        already reserved past them (then the gap stays, which readers tolerate)
+        """
+        try:
+            await self.db.messages.delete_many({"chat_id": chat_id, "seq": {"$gte": first_seq, "$lt": first_seq + count}})
+            await self.db.chats.update_one(
+                {"_id": ObjectId(chat_id), "message_count": first_seq + count},
+                {"$inc": {"message_count": -count}}
+            )
+        except Exception as e:
+            print(f"Warning: Could not release message seqs {first_seq}-{first_seq + count - 1} of chat {chat_id}: {e}")
     
     async def update_chat_title(self, chat_id: str, title: str) -> bool:
         """Update the title of a chat"""
@@ -166,27 +365,227 @@ class DatabaseService:
     async def get_recent_messages(self, chat_id: str, count: int = 4) -> List[dict]:
         """Get the last N messages from a chat"""
         try:
-            chat = await self.db.chats.find_one(
-                {"_id": ObjectId(chat_id)},
-                {"messages": {"$slice": -count}}
-            )
-            return chat.get("messages", []) if chat else []
+            chat = await self._get_chat_with_messages({"_id": ObjectId(chat_id)}, count)
+            return chat["messages"] if chat else []
         except Exception:
             return []
     
-    # ============ User Update Operations ============
+    async def get_chat_context(self, chat_id: str, count: int = 4) -> Optional[dict]:
+        """Get the last N messages of a chat with its summary and total message count"""
+        try:
+            chat = await self._get_chat_with_messages({"_id": ObjectId(chat_id)}, count)
+            if not chat:
+                return None
+            return {
+                "summary": chat.get("summary") or "",
+                "summarized_count": chat.get("summarized_count") or 0,
+                "message_count": chat["message_count"],
+                "messages": chat["messages"]
+            }
+        except Exception:
+            return None
     
-    async def update_user(self, user_id: str, update_data: dict) -> bool:
-        """Update user information"""
+    async def get_turn_context(self, chat_id: str, user_id: str, count: int) -> Optional[dict]:
+        """
+        Get everything a chat turn needs: the chat if it belongs to the user,
+        its summary, total message count and the last `count` messages (not
+        the whole history).
+        """
         try:
-            result = await self.db.users.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$set": update_data}
+            chat = await self._get_chat_with_messages({"_id": ObjectId(chat_id), "user_id": user_id}, count)
+            if chat:
+                chat["summary"] = chat.get("summary") or ""
+                chat["summarized_count"] = chat.get("summarized_count") or 0
+            return chat
+        except Exception:
+            return None
+    
+    async def get_messages_range(self, chat_id: str, skip: int, limit: int) -> List[dict]:
+        """Get the messages of a chat with sequence numbers from `skip` to `skip + limit`"""
+        try:
+            cursor = self.db.messages.find(
+                {"chat_id": chat_id, "seq": {"$gte": skip, "$lt": skip + limit}},
+                {"_id": 0, "chat_id": 0}
+            ).sort("seq", ASCENDING)
+            return await cursor.to_list(length=None)
+        except Exception:
+            return []
+    
+    async def _find_messages(
+        self,
+        chat_id: str,
+        count: Optional[int] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Get up to `count` messages of a chat (all if None) with sequence numbers
+        between the cursors, oldest first: the newest ones, or the oldest ones
+        when paging forward from `after`.
+        """
+        query = {"chat_id": chat_id}
+        seq = {}
+        if before is not None:
+            seq["$lt"] = before
+        if after is not None:
+            seq["$gt"] = after
+        if seq:
+            query["seq"] = seq
+        
+        newest_first = after is None
+        cursor = self.db.messages.find(query, {"_id": 0, "chat_id": 0}).sort("seq", DESCENDING if newest_first else ASCENDING)
+        if count is not None:
+            cursor = cursor.limit(count)
+        messages = await cursor.to_list(length=None)
+        if newest_first:
+            messages.reverse()
+        return messages
+    
+    async def _get_chat_with_messages(
+        self,
+        query: dict,
+        count: Optional[int] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Optional[dict]:
+        """
+        Get the chat matching the query with its last `count` messages (all if
+        None), optionally limited to a range of sequence numbers (see
+        _find_messages). The chat document and its messages are read concurrently.
+        """
+        chat_id = str(query["_id"])
+        chat, messages = await asyncio.gather(
+            self.db.chats.find_one(query, {"messages": 0}),
+            self._find_messages(chat_id, count, before, after)
+        )
+        if not chat:
+            return None
+        
+        if "message_count" not in chat:
+            chat["message_count"] = await self.migrate_chat(chat_id)
+            messages = await self._find_messages(chat_id, count, before, after)
+        
+        chat["id"] = str(chat.pop("_id"))
+        chat["messages"] = messages
+        return chat
+    
+    # ============ Message Migration ============
+    
+    async def migrate_chat(self, chat_id: str) -> Optional[int]:
+        """
+        Move the messages embedded in a chat document into the messages
+        collection. Safe to run concurrently or again after a failure: the
+        unique (chat_id, seq) index drops duplicates and the chat only switches
+        layout once every message is inserted. Returns the message count.
+        """
+        chat = await self.db.chats.find_one({"_id": ObjectId(chat_id)}, {"messages": 1, "message_count": 1})
+        if not chat:
+            return None
+        if "message_count" in chat:
+            return chat["message_count"]
+        
+        messages = chat.get("messages") or []
+        if messages:
+            try:
+                await self.db.messages.insert_many(
+                    [{**message, "chat_id": chat_id, "seq": seq} for seq, message in enumerate(messages)],
+                    ordered=False
+                )
+            except BulkWriteError as e:
+                # Messages already copied by a concurrent or interrupted migration
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+        
+        await self.db.chats.update_one(
+            {"_id": ObjectId(chat_id), "message_count": {"$exists": False}},
+            {"$set": {"message_count": len(messages)}, "$unset": {"messages": ""}}
+        )
+        return len(messages)
+    
+    async def migrate_embedded_messages(self) -> int:
+        """Migrate every chat still in the embedded layout, one chat at a time"""
+        migrated = 0
+        cursor = self.db.chats.find({"message_count": {"$exists": False}}, {"_id": 1})
+        async for chat in cursor:
+            try:
+                await self.migrate_chat(str(chat["_id"]))
+                migrated += 1
+            except Exception as e:
+                print(f"Warning: Could not migrate messages of chat {chat['_id']}: {e}")
+        if migrated:
+            print(f"Migrated {migrated} chats to the messages collection")
+        return migrated
+    
+    def start_message_migration(self):
+        """Migrate old chats in the background while the app serves requests"""
+        if self._migration_task is None:
+            self._migration_task = asyncio.create_task(self.migrate_embedded_messages())
+    
+    async def update_chat_summary(self, chat_id: str, summary: str, summarized_count: int, previous_count: int) -> bool:
+        """
+        Store a new conversation summary covering the first `summarized_count` messages.
+        Only applies if the stored summary still covers `previous_count` messages,
+        so a slower concurrent refresh can't overwrite a newer summary.
+        """
+        try:
+            query = {"_id": ObjectId(chat_id)}
+            if previous_count:
+                query["summarized_count"] = previous_count
+            else:
+                query["summarized_count"] = {"$in": [0, None]}
+            result = await self.db.chats.update_one(
+                query,
+                {"$set": {"summary": summary, "summarized_count": summarized_count}}
             )
             return result.modified_count > 0
         except Exception:
             return False
     
+    # ============ Stream Checkpoint Operations ============
+    
+    async def save_stream_checkpoint(self, stream_id: str, fields: dict, ttl_seconds: int) -> bool:
+        """Create or update the checkpoint of a streamed answer; it expires ttl_seconds after the last update"""
+        try:
+            now = datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
+            await self.db.stream_checkpoints.update_one(
+                {"_id": stream_id},
+                {"$set": {**fields, "updated_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+                upsert=True
+            )
+            return True
+        except Exception:
+            return False
+    
+    async def get_stream_checkpoint(self, stream_id: str) -> Optional[dict]:
+        """Get the checkpoint of a streamed answer"""
+        try:
+            return await self.db.stream_checkpoints.find_one({"_id": stream_id})
+        except Exception:
+            return None
+    
+    # ============ User Update Operations ============
+    
+    async def update_user(self, user_id: str, update_data: dict) -> Optional[dict]:
+        """
+        Update user information and return the updated user (None if it doesn't
+        exist). Raises EmailTakenError if the new email belongs to another user
+        (detected by the unique email index, as in create_user); other database
+        errors propagate.
+        """
+        if not ObjectId.is_valid(user_id):
+            return None
+        try:
+            user = await self.db.users.find_one_and_update(
+                {"_id": ObjectId(user_id)},
+                {"$set": update_data},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            raise EmailTakenError(f"{update_data.get('email')} is already registered")
+        if user:
+            user["id"] = str(user.pop("_id"))
+        return user
+    
     # ============ Appointment Operations ============
     
     async def create_appointment(
@@ -199,8 +598,12 @@ class DatabaseService:
         appointment_time: str,
         reason: str = None,
         hospital_name: str = None
-    ) -> str:
-        """Create a new appointment and return its ID"""
+    ) -> dict:
+        """
+        Create a new appointment and return it. Raises SlotUnavailableError
+        if the doctor already has an appointment that isn't cancelled at that
+        date and time.
+        """
         appointment_doc = {
             "user_id": user_id,
             "doctor_id": doctor_id,
@@ -211,11 +614,17 @@ class DatabaseService:
             "appointment_time": appointment_time,
             "reason": reason,
             "status": "scheduled",
+            "active": True,
             "created_at": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata")),
             "updated_at": datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
         }
-        result = await self.db.appointments.insert_one(appointment_doc)
-        return str(result.inserted_id)
+        try:
+            result = await self.db.appointments.insert_one(appointment_doc)
+        except DuplicateKeyError:
+            raise SlotUnavailableError(f"{doctor_id} is already booked on {appointment_date} at {appointment_time}")
+        appointment_doc.pop("_id", None)
+        appointment_doc["id"] = str(result.inserted_id)
+        return appointment_doc
     
     async def get_appointment_by_id(self, appointment_id: str) -> Optional[dict]:
         """Get an appointment by ID"""
@@ -240,35 +649,29 @@ class DatabaseService:
             appointments.append(apt)
         return appointments
     
-    async def update_appointment(self, appointment_id: str, update_data: dict) -> bool:
-        """Update an appointment"""
+    async def update_appointment(self, appointment_id: str, update_data: dict) -> Optional[dict]:
+        """
+        Update an appointment and return the updated appointment (None if it
+        doesn't exist). Raises SlotUnavailableError if rescheduling or
+        un-cancelling it would take a slot that already has an appointment.
+        """
         try:
+            if "status" in update_data:
+                # Cancelling frees the slot
+                update_data["active"] = update_data["status"] != "cancelled"
             update_data["updated_at"] = datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
-            result = await self.db.appointments.update_one(
+            appointment = await self.db.appointments.find_one_and_update(
                 {"_id": ObjectId(appointment_id)},
-                {"$set": update_data}
+                {"$set": update_data},
+                return_document=ReturnDocument.AFTER
             )
-            return result.modified_count > 0
-        except Exception:
-            return False
-    
-    async def check_appointment_conflict(
-        self, 
-        doctor_id: str, 
-        appointment_date: str, 
-        appointment_time: str
-    ) -> bool:
-        """Check if there's an existing appointment at the same time"""
-        try:
-            existing = await self.db.appointments.find_one({
-                "doctor_id": doctor_id,
-                "appointment_date": appointment_date,
-                "appointment_time": appointment_time,
-                "status": {"$ne": "cancelled"}
-            })
-            return existing is not None
+            if appointment:
+                appointment["id"] = str(appointment.pop("_id"))
+            return appointment
+        except DuplicateKeyError:
+            raise SlotUnavailableError("The new time slot is already booked")
         except Exception:
-            return False
+            return None
     
     async def delete_appointment(self, appointment_id: str, user_id: str) -> bool:
         """Delete an appointment (only if owned by user)"""
@@ -281,6 +684,20 @@ class DatabaseService:
         except Exception:
             return False
 
+    # ============ Catalog Version ============
+    
+    async def get_catalog_version(self) -> int:
+        """Get the version stamp of the doctor and hospital catalog, bumped on every catalog write"""
+        meta = await self.db.catalog_meta.find_one({"_id": "catalog"})
+        return meta.get("version", 0) if meta else 0
+    
+    async def bump_catalog_version(self):
+        """Mark the catalog as changed so cached copies reload it"""
+        try:
+            await self.db.catalog_meta.update_one({"_id": "catalog"}, {"$inc": {"version": 1}}, upsert=True)
+        except Exception as e:
+            print(f"Warning: Could not bump catalog version: {e}")
+    
     # ============ Doctor Operations ============
     
     async def get_all_doctors(self, specialization: str = None) -> List[dict]:
@@ -320,6 +737,7 @@ class DatabaseService:
         """Insert a doctor into the database"""
         try:
             await self.db.doctors.insert_one(doctor_data)
+            await self.bump_catalog_version()
             return True
         except Exception as e:
             print(f"Error inserting doctor: {e}")
@@ -330,6 +748,7 @@ class DatabaseService:
         try:
             if doctors:
                 await self.db.doctors.insert_many(doctors)
+                await self.bump_catalog_version()
             return True
         except Exception as e:
             print(f"Error inserting doctors: {e}")
@@ -396,6 +815,7 @@ class DatabaseService:
         """Insert a hospital into the database"""
         try:
             await self.db.hospitals.insert_one(hospital_data)
+            await self.bump_catalog_version()
             return True
         except Exception as e:
             print(f"Error inserting hospital: {e}")
@@ -406,6 +826,7 @@ class DatabaseService:
         try:
             if hospitals:
                 await self.db.hospitals.insert_many(hospitals)
+                await self.bump_catalog_version()
             return True
         except Exception as e:
             print(f"Error inserting hospitals: {e}")
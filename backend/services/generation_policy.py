@@ -0,0 +1,178 @@
+"""
+Generation Policies
+Per-class generation settings (max_tokens, stop sequences, temperature) so
+short answers stay short: a greeting doesn't get a 1024-token budget, and a
+turn that is expected to call a tool stops right after the TOOL_CALL JSON
+instead of rambling on about results it hasn't seen yet.
+"""
+
+from typing import Dict, FrozenSet, List, Optional
+from config import settings
+from services.context_service import context_builder
+from services.query_validator_service import query_validator
+
+
+# Tool parameters are flat, so the first "}}" closes a TOOL_CALL object.
+# Stop sequences are not included in the output; repair_tool_call() puts them back.
+TOOL_CALL_STOP = "}}"
+
+
+class GenerationPolicy:
+    """Sampling settings for one class of request"""
+
+    def __init__(self, name: str, max_tokens: int, temperature: float, stop_after_tool_call: bool = False):
+        self.name = name
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop_after_tool_call = stop_after_tool_call
+
+
+POLICIES = {
+    # "thanks, that helps" - a sentence or two
+    "greeting": GenerationPolicy("greeting", max_tokens=96, temperature=0.5),
+    # One-sentence definition, mechanism, causes
+    "definition": GenerationPolicy("definition", max_tokens=320, temperature=0.2),
+    # A list of common symptoms
+    "symptoms": GenerationPolicy("symptoms", max_tokens=384, temperature=0.2),
+    # Asking for date/time/reason, the confirmation summary, or the book_appointment call
+    "booking": GenerationPolicy("booking", max_tokens=320, temperature=0.1, stop_after_tool_call=True),
+    # Listing doctors/hospitals/appointments: a short lead-in and one TOOL_CALL
+    "tool_call": GenerationPolicy("tool_call", max_tokens=192, temperature=0.0, stop_after_tool_call=True),
+    # Call 112 plus at most 5 numbered first-aid steps
+    "emergency": GenerationPolicy("emergency", max_tokens=256, temperature=0.0),
+    "general": GenerationPolicy("general", max_tokens=settings.llm_max_tokens, temperature=0.3),
+}
+
+
+def repair_tool_call(content: str) -> str:
+    """Close a trailing TOOL_CALL object whose "}}" was consumed as a stop sequence"""
+    start = content.rfind("TOOL_CALL:")
+    if start == -1:
+        return content
+
+    tail = content[start:]
+    missing = tail.count("{") - tail.count("}")
+    if 0 < missing <= len(TOOL_CALL_STOP):
+        return content.rstrip() + "}" * missing
+    return content
+
+
+class GenerationPolicySelector:
+    """Picks a generation policy per turn and tracks how each class behaves"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.requests: Dict[str, int] = {}
+        self.completions: Dict[str, int] = {}
+        self.completion_tokens: Dict[str, int] = {}
+        self.truncated: Dict[str, int] = {}
+        self.cancellations: Dict[str, int] = {}
+        self.tokens_saved: Dict[str, int] = {}
+        self.repaired = 0
+
+    def select(self, messages: List[Dict[str, str]], modules: FrozenSet[str], tools_available: bool) -> GenerationPolicy:
+        """
+        Choose the policy for a turn from the validator's classification of the
+        latest user message and the prompt modules selected for it.
+        """
+        query = messages[-1]["content"] if messages and messages[-1]["role"] == "user" else ""
+        query_class = query_validator.classify_query(query) if self.enabled else "general"
+
+        if query_class == "emergency":
+            name = query_class
+        # Ahead of greetings: "ok" or "sure" answering a booking summary is the confirmation
+        # and needs the book_appointment call, not a 96-token pleasantry
+        elif tools_available and query_class not in ("symptoms", "definition") and "booking" in modules:
+            name = "booking"
+        elif query_class == "greeting":
+            name = query_class
+        elif tools_available and query_class not in ("symptoms", "definition") and (query_class == "tool" or modules):
+            name = "tool_call"
+        elif query_class in ("symptoms", "definition"):
+            name = query_class
+        else:
+            name = "general"
+
+        policy = POLICIES[name]
+        self.requests[name] = self.requests.get(name, 0) + 1
+        return policy
+
+    @staticmethod
+    def sampling_params(policy: GenerationPolicy, modules: FrozenSet[str]) -> dict:
+        """Get the request fields (max_tokens, temperature, stop) for a policy"""
+        params = {
+            "max_tokens": min(policy.max_tokens, settings.llm_max_tokens),
+            "temperature": policy.temperature,
+        }
+        # Booking needs the doctor list, so it counts as a single action
+        actions = modules - {"doctors"} if "booking" in modules else modules
+        # Several actions in one turn mean several TOOL_CALL lines, which the stop would cut.
+        # Native tool calls come back as structured tool_calls, not as text.
+        if policy.stop_after_tool_call and len(actions) <= 1 and not settings.llm_native_tools:
+            params["stop"] = [TOOL_CALL_STOP]
+        return params
+
+    def finish(
+        self,
+        policy: GenerationPolicy,
+        content: str,
+        finish_reason: Optional[str],
+        completion_tokens: Optional[int] = None
+    ) -> str:
+        """Record the size and finish reason of a completion and repair a cut-off TOOL_CALL"""
+        if completion_tokens is None:
+            completion_tokens = context_builder.counter.count(content)
+        self.completions[policy.name] = self.completions.get(policy.name, 0) + 1
+        self.completion_tokens[policy.name] = self.completion_tokens.get(policy.name, 0) + completion_tokens
+        if finish_reason == "length":
+            self.truncated[policy.name] = self.truncated.get(policy.name, 0) + 1
+
+        if policy.stop_after_tool_call and finish_reason != "length":
+            repaired = repair_tool_call(content)
+            if repaired != content:
+                self.repaired += 1
+            return repaired
+        return content
+
+    def cancelled(self, policy: GenerationPolicy, generated: str) -> int:
+        """
+        Record a generation abandoned because the client disconnected.
+
+        Returns the estimated tokens the server no longer has to generate: the
+        class's average completion size (or its budget before there is one)
+        minus what was already produced.
+        """
+        budget = min(policy.max_tokens, settings.llm_max_tokens)
+        completions = self.completions.get(policy.name)
+        expected = self.completion_tokens.get(policy.name, 0) / completions if completions else budget
+        saved = max(0, round(min(budget, expected)) - context_builder.counter.count(generated))
+
+        self.cancellations[policy.name] = self.cancellations.get(policy.name, 0) + 1
+        self.tokens_saved[policy.name] = self.tokens_saved.get(policy.name, 0) + saved
+        return saved
+
+    def stats(self) -> dict:
+        """Get per-class request counts, completion sizes and truncations for monitoring"""
+        classes = {}
+        for name, requests in self.requests.items():
+            classes[name] = {
+                "requests": requests,
+                "max_tokens": min(POLICIES[name].max_tokens, settings.llm_max_tokens),
+                "avg_completion_tokens": round(
+                    self.completion_tokens.get(name, 0) / self.completions[name], 1
+                ) if self.completions.get(name) else 0.0,
+                "truncated": self.truncated.get(name, 0),
+                "cancelled": self.cancellations.get(name, 0),
+                "tokens_saved": self.tokens_saved.get(name, 0)
+            }
+        return {
+            "enabled": self.enabled,
+            "tool_calls_repaired": self.repaired,
+            "cancelled": sum(self.cancellations.values()),
+            "tokens_saved_by_cancellation": sum(self.tokens_saved.values()),
+            "classes": classes
+        }
+
+
+# Global instance
+generation_policies = GenerationPolicySelector(enabled=settings.llm_generation_policies_enabled)
@@ -0,0 +1,189 @@
+"""
+Intent Router
+Answers tool-only requests ("show doctors", "list cardiologists",
+"hospitals in Delhi", "my appointments") by mapping them straight to a tool
+call, without an LLM round-trip. Anything ambiguous (several intents,
+booking details, medical questions, unknown cities) is left to the LLM.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from services.catalog_service import catalog_cache
+from services.query_validator_service import query_validator
+
+
+# role: words naming the specialist (imply a doctor request on their own)
+# area: words naming the field (only fill the slot when doctors/hospitals are asked for)
+SPECIALIZATIONS = [
+    {"doctor": "Cardiologist", "hospital": "Cardiology",
+     "roles": ["cardiologist"], "areas": ["cardiology", "cardiac", "heart"]},
+    {"doctor": "Dermatologist", "hospital": "Dermatology",
+     "roles": ["dermatologist"], "areas": ["dermatology", "skin"]},
+    {"doctor": "Pediatrician", "hospital": "Pediatrics",
+     "roles": ["pediatrician", "paediatrician"], "areas": ["pediatrics", "paediatrics", "pediatric", "child", "children", "kids"]},
+    {"doctor": "Orthopedic", "hospital": "Orthopedics",
+     "roles": ["orthopedist", "orthopedic surgeon", "orthopaedic surgeon"], "areas": ["orthopedics", "orthopaedics", "orthopedic", "orthopaedic", "bone", "bones"]},
+    {"doctor": "Neurologist", "hospital": "Neurology",
+     "roles": ["neurologist"], "areas": ["neurology", "brain", "nerve"]},
+    {"doctor": "General Physician", "hospital": "General Medicine",
+     "roles": ["general physician", "gp"], "areas": ["general medicine"]},
+    {"doctor": "Gynecologist", "hospital": "Gynecology",
+     "roles": ["gynecologist", "gynaecologist"], "areas": ["gynecology", "gynaecology"]},
+    {"doctor": "Psychiatrist", "hospital": "Psychiatry",
+     "roles": ["psychiatrist"], "areas": ["psychiatry", "mental health"]},
+    {"doctor": "Oncologist", "hospital": "Oncology",
+     "roles": ["oncologist"], "areas": ["oncology", "cancer"]},
+    {"doctor": "Nephrologist", "hospital": "Nephrology",
+     "roles": ["nephrologist"], "areas": ["nephrology", "kidney"]},
+    {"doctor": "Gastroenterologist", "hospital": "Gastroenterology",
+     "roles": ["gastroenterologist"], "areas": ["gastroenterology", "stomach"]},
+]
+
+CITY_ALIASES = {
+    "bengaluru": "bangalore",
+    "gurugram": "gurgaon",
+    "new delhi": "delhi",
+    "bombay": "mumbai",
+}
+
+LIST_WORDS = r"\b(show|list|find|get|see|view|display|available|all|which|any|search|nearby|near)\b"
+DOCTOR_WORDS = r"\b(doctors?|specialists?|dr)\b"
+HOSPITAL_WORDS = r"\b(hospitals?|medical cent(er|re)s?|clinics?)\b"
+APPOINTMENT_WORDS = r"\b(my\s+(\w+\s+)?(appointments?|bookings?)|(appointments?|bookings?)\s+history|upcoming\s+appointments?)\b"
+
+# Anything that needs conversation, reasoning or a write goes to the LLM
+BLOCKING_PATTERNS = [
+    r"\b(book|schedule|reschedule|cancel|change|password|profile|confirm)\b",
+    r"\b\d{4}-\d{2}-\d{2}\b",
+    r"\b\d{1,2}(:\d{2})?\s*(am|pm)\b|\b\d{1,2}:\d{2}\b",
+    r"\b(why|how|explain|symptoms?|treat\w*|cause\w*|cure|medicine|diagnos\w*|should)\b",
+    r"\bdoc_\d+\b|\bdr\.?\s+[a-z]+",
+]
+
+# Longer messages usually carry more than a plain listing request
+MAX_WORDS = 12
+
+
+class IntentRouter:
+    """Maps high-confidence tool requests to (tool_name, parameters)"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.routed: Dict[str, int] = {}
+        self.fallbacks = 0
+
+    async def _known_cities(self) -> List[str]:
+        """Hospital cities from the catalog cache"""
+        try:
+            return [city.lower() for city in await catalog_cache.get_hospital_cities()]
+        except Exception as e:
+            print(f"Warning: Could not load hospital cities for intent routing: {e}")
+            return []
+
+    @staticmethod
+    def _find_specializations(query: str, include_areas: bool) -> List[dict]:
+        found = []
+        for spec in SPECIALIZATIONS:
+            words = spec["roles"] + (spec["areas"] if include_areas else [])
+            if any(re.search(rf"\b{re.escape(word)}s?\b", query) for word in words):
+                found.append(spec)
+        return found
+
+    async def _find_city(self, query: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (ok, city). ok is False when the query names a place that
+        isn't a known hospital city, so the LLM can handle it.
+        """
+        for alias, city in CITY_ALIASES.items():
+            query = re.sub(rf"\b{alias}\b", city, query)
+
+        cities = await self._known_cities()
+        for city in cities:
+            if re.search(rf"\b{re.escape(city)}\b", query):
+                return True, city.title()
+
+        if re.search(r"\b(in|at)\s+(?!my\b|the\b|your\b)[a-z]", query):
+            return False, None
+        return True, None
+
+    async def route(self, query: str) -> Optional[Tuple[str, Dict]]:
+        """Get (tool_name, parameters) for a tool-only request, or None for the LLM"""
+        if not self.enabled or not query or not query.strip():
+            return None
+
+        result = await self._route(query.lower().strip())
+        if result is None:
+            if query_validator.is_tool_query(query):
+                self.fallbacks += 1
+            return None
+
+        tool_name, _ = result
+        self.routed[tool_name] = self.routed.get(tool_name, 0) + 1
+        return result
+
+    async def _route(self, query: str) -> Optional[Tuple[str, Dict]]:
+        query = re.sub(r"[?!.,]+", " ", query)
+        words = query.split()
+        if len(words) > MAX_WORDS:
+            return None
+        if any(re.search(pattern, query) for pattern in BLOCKING_PATTERNS):
+            return None
+
+        # Emergencies get the LLM's first-aid guidance; asking for emergency hospitals is fine
+        emergency_terms = [term for term in query_validator.EMERGENCY_KEYWORDS if term in query]
+        if any(term != "emergency" for term in emergency_terms):
+            return None
+
+        roles = self._find_specializations(query, include_areas=False)
+        wants_doctors = bool(re.search(DOCTOR_WORDS, query)) or bool(roles)
+        wants_hospitals = bool(re.search(HOSPITAL_WORDS, query))
+        wants_appointments = bool(re.search(APPOINTMENT_WORDS, query))
+
+        if wants_doctors + wants_hospitals + wants_appointments != 1:
+            return None
+
+        if wants_appointments:
+            return "get_user_appointments", {}
+
+        # A bare noun ("cardiologists") or a listing verb is needed; otherwise it's a question
+        if len(words) > 3 and not re.search(LIST_WORDS, query) and not re.search(r"\b(in|at)\b", query):
+            return None
+
+        specializations = self._find_specializations(query, include_areas=True)
+        if len(specializations) > 1:
+            return None
+
+        if wants_doctors:
+            # Doctors have no city or emergency filter
+            if "emergency" in emergency_terms or re.search(r"\b(in|at)\s+[a-z]", query):
+                return None
+            parameters = {}
+            if specializations:
+                parameters["specialization"] = specializations[0]["doctor"]
+            return "get_doctors", parameters
+
+        ok, city = await self._find_city(query)
+        if not ok:
+            return None
+        parameters = {}
+        if city:
+            parameters["city"] = city
+        if specializations:
+            parameters["specialization"] = specializations[0]["hospital"]
+        if emergency_terms:
+            parameters["emergency_only"] = True
+        return "get_hospitals", parameters
+
+    def stats(self) -> dict:
+        """Get routing counters for monitoring"""
+        return {
+            "enabled": self.enabled,
+            "routed": self.routed,
+            "routed_total": sum(self.routed.values()),
+            "fallbacks": self.fallbacks
+        }
+
+
+# Global instance
+intent_router = IntentRouter(enabled=settings.intent_router_enabled)
@@ -0,0 +1,306 @@
+"""
+Chat Job Queue
+Runs chat turns in the background so a request doesn't hold its HTTP
+connection for the whole generation. A turn is submitted as a job and gets
+an ID right away; a fixed pool of asyncio workers processes the jobs, and
+clients poll the job or attach to its event stream. Job state lives in a
+store (in-memory or MongoDB), so with the Mongo store any API worker can
+answer status requests.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+import zoneinfo
+from starlette.background import BackgroundTasks
+from config import settings
+from services.db_service import db_service
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting for a worker"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"The medical assistant is busy, please retry in {retry_after} seconds")
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail the job with a client-facing error"""
+
+    def __init__(self, detail: str, status_code: int = 500, retry_after: Optional[int] = None):
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(detail)
+
+
+class InMemoryJobStore:
+    """Process-local job store; only the process that created a job can serve it"""
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        # Set and replaced on every update so waiters wake up
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    async def create(self, job: dict):
+        """Store a new job, dropping expired ones"""
+        now = datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
+        for job_id in [key for key, value in self._jobs.items() if value["expires_at"] <= now]:
+            del self._jobs[job_id]
+            self._changed.pop(job_id, None)
+        self._jobs[job["id"]] = dict(job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Get a job by ID"""
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def update(self, job_id: str, fields: dict):
+        """Set fields on a job and wake anyone waiting for it"""
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+        event = self._changed.pop(job_id, None)
+        if event:
+            event.set()
+
+    async def wait(self, job_id: str, timeout: float):
+        """Wait until the job changes or the timeout passes"""
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class MongoJobStore:
+    """
+    MongoDB-backed job store shared by all API workers.
+    Finished jobs are removed by a TTL index; waiting is done by polling.
+    """
+
+    def __init__(self, poll_interval_seconds: float, collection_name: str = "chat_jobs"):
+        self.poll_interval_seconds = poll_interval_seconds
+        self.collection_name = collection_name
+
+    @property
+    def collection(self):
+        return db_service.db[self.collection_name]
+
+    async def create(self, job: dict):
+        """Store a new job"""
+        document = dict(job)
+        document["_id"] = document.pop("id")
+        await self.collection.insert_one(document)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Get a job by ID"""
+        job = await self.collection.find_one({"_id": job_id})
+        if job:
+            job["id"] = job.pop("_id")
+        return job
+
+    async def update(self, job_id: str, fields: dict):
+        """Set fields on a job"""
+        await self.collection.update_one({"_id": job_id}, {"$set": fields})
+
+    async def wait(self, job_id: str, timeout: float):
+        """Wait for the next poll (other workers can't notify this one)"""
+        await asyncio.sleep(min(timeout, self.poll_interval_seconds))
+
+
+# Receives the job and the visible-output callback; returns the final assistant message
+JobHandler = Callable[[dict, Callable[[str], Awaitable[None]], BackgroundTasks], Awaitable[dict]]
+
+
+class ChatJobQueue:
+    """Bounded queue of chat turns processed by a fixed pool of workers"""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    FINISHED = (STATUS_DONE, STATUS_FAILED)
+
+    def __init__(
+        self,
+        store,
+        workers: int,
+        max_pending: int,
+        ttl_seconds: int,
+        checkpoint_interval_seconds: float,
+        enabled: bool = True
+    ):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.running = 0
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        # Recent job run times, used to estimate Retry-After
+        self._run_times = deque(maxlen=100)
+
+    def start(self):
+        """Start the worker pool (call from the app lifespan)"""
+        if not self.enabled or self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"Started {self.workers} chat job workers")
+
+    async def close(self):
+        """Stop the workers; jobs still queued or running are marked failed"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        while self._queue is not None and not self._queue.empty():
+            job, _ = self._queue.get_nowait()
+            await self._fail(job["id"], JobFailed("The server restarted before this message was processed", 503, 1))
+
+    def retry_after(self) -> int:
+        """Estimate in seconds until a queued job would be picked up"""
+        run_time = sum(self._run_times) / len(self._run_times) if self._run_times else 10.0
+        pending = self._queue.qsize() if self._queue else 0
+        return max(1, round(run_time * (pending + 1) / self.workers))
+
+    async def submit(self, user_id: str, chat_id: str, content: str, handler: JobHandler) -> dict:
+        """Create a job for a chat turn and queue it; raises JobQueueFull if the queue is full"""
+        if self._queue is None or self._queue.full():
+            self.rejected += 1
+            raise JobQueueFull(self.retry_after())
+
+        now = datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "content": content,
+            "status": self.STATUS_QUEUED,
+            "output": "",
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds)
+        }
+        await self.store.create(job)
+        self._queue.put_nowait((job, handler))
+        self.submitted += 1
+        return job
+
+    async def get(self, job_id: str, user_id: str) -> Optional[dict]:
+        """Get a job if it belongs to the user"""
+        job = await self.store.get(job_id)
+        if not job or job["user_id"] != user_id:
+            return None
+        return job
+
+    async def wait(self, job_id: str, timeout: float):
+        """Wait until the job may have changed"""
+        await self.store.wait(job_id, timeout)
+
+    async def _worker(self):
+        while True:
+            job, handler = await self._queue.get()
+            try:
+                await self._run(job, handler)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: dict, handler: JobHandler):
+        job_id = job["id"]
+        start = time.perf_counter()
+        self.running += 1
+        await self._set(job_id, {"status": self.STATUS_RUNNING})
+
+        output = []
+        flushed = {"length": 0, "at": time.perf_counter()}
+
+        async def emit(text: str):
+            # Partial output is written at most once per checkpoint interval
+            output.append(text)
+            if time.perf_counter() - flushed["at"] >= self.checkpoint_interval_seconds:
+                flushed["at"] = time.perf_counter()
+                await self._set(job_id, {"output": "".join(output)})
+
+        background_tasks = BackgroundTasks()
+        try:
+            result = await handler(job, emit, background_tasks)
+        except JobFailed as e:
+            await self._fail(job_id, e)
+            return
+        except asyncio.CancelledError:
+            await asyncio.shield(self._fail(job_id, JobFailed("The server restarted while this message was processed", 503, 1)))
+            raise
+        except Exception as e:
+            print(f"Chat job {job_id} failed: {e}")
+            await self._fail(job_id, JobFailed("Unexpected error while processing the message"))
+            return
+        finally:
+            self.running -= 1
+
+        await self._set(job_id, {"status": self.STATUS_DONE, "output": "".join(output), "result": result})
+        self.completed += 1
+        self._run_times.append(time.perf_counter() - start)
+        # e.g. the conversation summary refresh, once the answer is available
+        await background_tasks()
+
+    async def _fail(self, job_id: str, error: JobFailed):
+        self.failed += 1
+        await self._set(job_id, {
+            "status": self.STATUS_FAILED,
+            "error": {"detail": error.detail, "status_code": error.status_code, "retry_after": error.retry_after}
+        })
+
+    async def _set(self, job_id: str, fields: dict):
+        fields["updated_at"] = datetime.now(zoneinfo.ZoneInfo("Asia/Kolkata"))
+        try:
+            await self.store.update(job_id, fields)
+        except Exception as e:
+            print(f"Warning: Could not update chat job {job_id}: {e}")
+
+    def stats(self) -> dict:
+        """Get queue depth and job counters for monitoring"""
+        return {
+            "enabled": self.enabled,
+            "store": type(self.store).__name__,
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_run_ms": round(sum(self._run_times) / len(self._run_times) * 1000, 1) if self._run_times else None
+        }
+
+
+def _create_store():
+    if settings.jobs_store == "mongo":
+        return MongoJobStore(settings.jobs_poll_interval_seconds)
+    return InMemoryJobStore()
+
+
+# Global instance
+chat_jobs = ChatJobQueue(
+    _create_store(),
+    workers=settings.jobs_workers,
+    max_pending=settings.jobs_max_pending,
+    ttl_seconds=settings.jobs_ttl_seconds,
+    checkpoint_interval_seconds=settings.jobs_checkpoint_interval_seconds,
+    enabled=settings.jobs_enabled
+)
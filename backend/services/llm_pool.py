@@ -0,0 +1,158 @@
+"""
+LLM Endpoint Pool
+Spreads completion requests over several OpenAI-compatible inference
+replicas. Requests go to the healthy replica with the fewest outstanding
+requests; a per-replica circuit breaker stops sending traffic to a replica
+that keeps failing and lets a single probe request through after a cooldown.
+"""
+
+import time
+from collections import deque
+from typing import Iterable, List, Optional
+from urllib.parse import urlsplit
+
+
+class CircuitBreaker:
+    """Closed → open after repeated failures → half-open probe → closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def available(self) -> bool:
+        """Check if a request may be sent now (without changing state)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_seconds
+        return not self.probe_in_flight
+
+    def on_dispatch(self):
+        """Mark a request as sent; after the cooldown it becomes the half-open probe"""
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """A request was abandoned (e.g. it lost a hedge); let another probe through"""
+        self.probe_in_flight = False
+
+
+class Endpoint:
+    """One upstream replica with its load and health counters"""
+
+    def __init__(self, url: str, breaker: CircuitBreaker):
+        self.url = url
+        self.breaker = breaker
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def health_url(self) -> str:
+        """The replica's root URL, used for /health checks"""
+        parts = urlsplit(self.url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+
+class EndpointPool:
+    """Least-outstanding-requests balancing over circuit-broken endpoints"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        failure_threshold: int = 3,
+        reset_seconds: float = 30.0,
+        latency_window: int = 200
+    ):
+        self.endpoints = [
+            Endpoint(url, CircuitBreaker(failure_threshold, reset_seconds))
+            for url in urls
+        ]
+        # Recent successful request latencies across all endpoints (seconds)
+        self.latencies = deque(maxlen=latency_window)
+        self.rejected = 0
+
+    def acquire(self, exclude: Iterable[Endpoint] = ()) -> Optional[Endpoint]:
+        """Pick the available endpoint with the fewest outstanding requests"""
+        excluded = set(id(endpoint) for endpoint in exclude)
+        candidates = [
+            endpoint for endpoint in self.endpoints
+            if id(endpoint) not in excluded and endpoint.breaker.available()
+        ]
+        if not candidates:
+            self.rejected += 1
+            return None
+
+        # min() keeps list order on ties, so the first endpoint wins when idle
+        endpoint = min(candidates, key=lambda candidate: candidate.outstanding)
+        endpoint.breaker.on_dispatch()
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def release(self, endpoint: Endpoint, latency: Optional[float] = None, failed: bool = False, cancelled: bool = False):
+        """Record the outcome of a request sent to an endpoint"""
+        endpoint.outstanding -= 1
+        if cancelled:
+            endpoint.breaker.record_cancelled()
+        elif failed:
+            endpoint.failures += 1
+            endpoint.breaker.record_failure()
+        else:
+            endpoint.breaker.record_success()
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def latency_percentile(self, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """Get a latency percentile in seconds, or None until enough samples exist"""
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def stats(self) -> dict:
+        """Get per-endpoint load and health for monitoring"""
+        p50 = self.latency_percentile(50, min_samples=1)
+        p95 = self.latency_percentile(95, min_samples=1)
+        return {
+            "endpoints": [
+                {
+                    "url": endpoint.url,
+                    "state": endpoint.breaker.state,
+                    "outstanding": endpoint.outstanding,
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "times_opened": endpoint.breaker.times_opened
+                }
+                for endpoint in self.endpoints
+            ],
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "rejected": self.rejected
+        }
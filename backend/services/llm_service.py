@@ -1,323 +1,756 @@
+import asyncio
+import hashlib
 import httpx
+import importlib.util
 import json
 import re
-from typing import List, Dict, Optional, Tuple
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple, TypeVar
 from config import settings
+from services.context_service import context_builder
+from services.generation_policy import GenerationPolicy, generation_policies
+from services.llm_pool import CircuitBreaker, Endpoint, EndpointPool
+from services.prompts import PROMPT_REGISTRY, prompt_assembler
+from services.tools_service import AVAILABLE_TOOLS
+
+T = TypeVar("T")
+
+
+# Changes whenever the system prompt text changes; used to version cached answers
+PROMPT_VERSION = PROMPT_REGISTRY["hash"][:12]
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and a medical assistant.
+Update the existing summary with the new messages. Keep:
+- symptoms, conditions, medicines and allergies the user mentioned
+- doctors, hospitals and IDs (e.g. doc_001) the user showed interest in
+- appointment details (doctor, date, time, reason) and whether they were booked or cancelled
+- the user's preferences and any open question still waiting for an answer
+Drop greetings, repeated lists and general medical explanations.
+Write at most 150 words in short bullet points. Reply with the summary only."""
+
+# Each message is clipped before summarizing so one long doctor list can't fill the prompt
+SUMMARY_MESSAGE_CHARS = 1500
+
+# OpenAI-style tool definitions, sent when the upstream supports native tool calling
+NATIVE_TOOLS = [{"type": "function", "function": tool} for tool in AVAILABLE_TOOLS]
+
+# Fallback replies returned instead of raising when the LLM call fails
+EMPTY_RESPONSE_MESSAGE = "I apologize, but I couldn't generate a response."
+CONNECTION_ERROR_MESSAGE = "I apologize, but I'm having trouble connecting to the medical assistant service. Please try again later."
+UNEXPECTED_ERROR_MESSAGE = "An unexpected error occurred. Please try again."
+
+
+def tool_calls_to_text(tool_calls: List[Dict]) -> str:
+    """
+    Convert OpenAI-style tool_calls into TOOL_CALL lines, so native and
+    text tool calls go through the same parser.
+    """
+    lines = []
+    for tool_call in tool_calls:
+        function = tool_call.get("function", {})
+        arguments = function.get("arguments") or "{}"
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except json.JSONDecodeError:
+                print(f"Failed to parse tool call arguments: {arguments}")
+                arguments = {}
+        lines.append(f"TOOL_CALL: {json.dumps({'name': function.get('name'), 'parameters': arguments})}")
+    return "\n".join(lines)
+
+
+class NoEndpointAvailable(Exception):
+    """Raised when every LLM endpoint has an open circuit"""
+
+
+class SingleFlight:
+    """
+    Lets concurrent callers with the same key share one in-flight call.
+    
+    The first caller starts the call as a task; later callers await the same
+    task. Each caller awaits it through asyncio.shield, so a cancelled caller
+    (e.g. a client disconnect) doesn't cancel the call for the others. The
+    call itself is cancelled only when its last caller goes away.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, "SingleFlight._Call"] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.abandoned = 0
+    
+    class _Call:
+        __slots__ = ("task", "waiters")
+        
+        def __init__(self, task: asyncio.Task):
+            self.task = task
+            self.waiters = 0
+    
+    @staticmethod
+    def make_key(payload: dict) -> str:
+        """Hash a request payload (model, messages and sampling params)"""
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def _forget(self, key: str, call: "SingleFlight._Call"):
+        # A newer call may already be registered under the same key
+        if self._calls.get(key) is call:
+            del self._calls[key]
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() unless an identical call is in flight, and return its result"""
+        self.calls += 1
+        call = self._calls.get(key)
+        if call is None:
+            call = self._Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.coalesced += 1
+        
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is waiting for the result any more
+                self.abandoned += 1
+                self._forget(key, call)
+                call.task.cancel()
+    
+    def stats(self) -> dict:
+        """Get coalescing counters for monitoring"""
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+            "abandoned": self.abandoned
+        }
 
 
 class LLMService:
     def __init__(self):
-        self.url = settings.llm_api_url
+        urls = [url.strip() for url in settings.llm_api_urls.split(",") if url.strip()]
         self.api_key = settings.llm_api_key
         self.model = settings.llm_model
+        self.client: Optional[httpx.AsyncClient] = None
+        self.single_flight = SingleFlight()
+        self.pool = EndpointPool(
+            urls or [settings.llm_api_url],
+            failure_threshold=settings.llm_circuit_failure_threshold,
+            reset_seconds=settings.llm_circuit_reset_seconds
+        )
+        self._health_task: Optional[asyncio.Task] = None
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        # Set by check_prompt_registry() when every endpoint has our prompt registry
+        self.prompt_registry_active = False
+        self.prompt_id_requests = 0
+        self.prompt_registry_fallbacks = 0
+    
+    async def connect(self):
+        """Create the shared HTTP client used for all LLM requests"""
+        if self.client is not None:
+            return
+        
+        # HTTP/2 needs the optional "h2" package; fall back to HTTP/1.1 keep-alive without it
+        http2 = settings.llm_http2 and importlib.util.find_spec("h2") is not None
+        if settings.llm_http2 and not http2:
+            print("Warning: h2 is not installed, LLM client will use HTTP/1.1")
+        
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry_seconds
+            ),
+            timeout=httpx.Timeout(
+                settings.llm_timeout_seconds,
+                connect=settings.llm_connect_timeout_seconds
+            ),
+            headers={"Authorization": f"Bearer {self.api_key}"}
+        )
+    
+    async def close(self):
+        """Close the shared HTTP client"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+    
+    async def warmup(self) -> bool:
+        """
+        Send a minimal completion to every endpoint so the connections
+        (TCP + TLS) are already open in the pool before the first user
+        request arrives.
+        """
+        client = await self._get_client()
+        warmed = 0
+        for endpoint in self.pool.endpoints:
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    endpoint.url,
+                    json={
+                        "model": self.model,
+                        "messages": [{"role": "user", "content": "ping"}],
+                        "max_tokens": 1,
+                    }
+                )
+                response.raise_for_status()
+                print(f"LLM warmup of {endpoint.url} completed in {(time.perf_counter() - start) * 1000:.0f} ms ({response.http_version})")
+                warmed += 1
+            except httpx.HTTPError as e:
+                print(f"Warning: LLM warmup of {endpoint.url} failed: {e}")
+        return warmed > 0
+    
+    def start_health_checks(self):
+        """Start the background loop that probes endpoints with an open circuit"""
+        if self._health_task is None and settings.llm_health_check_interval_seconds > 0:
+            self._health_task = asyncio.create_task(self._health_check_loop())
+    
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(settings.llm_health_check_interval_seconds)
+            try:
+                await self.check_health()
+            except Exception as e:
+                print(f"Warning: LLM health check failed: {e}")
+    
+    async def check_health(self):
+        """
+        Probe the health URL of every endpoint whose circuit is open, closing
+        the circuit as soon as the replica answers again.
+        """
+        client = await self._get_client()
+        for endpoint in self.pool.endpoints:
+            if endpoint.breaker.state != CircuitBreaker.OPEN:
+                continue
+            try:
+                response = await client.get(
+                    endpoint.health_url + settings.llm_health_path,
+                    timeout=settings.llm_connect_timeout_seconds
+                )
+                response.raise_for_status()
+                endpoint.breaker.record_success()
+                print(f"LLM endpoint {endpoint.url} is healthy again")
+            except httpx.HTTPError:
+                # Still down: restart the cooldown so live traffic doesn't probe it yet
+                endpoint.breaker.record_failure()
+    
+    async def check_prompt_registry(self) -> bool:
+        """
+        Compare the prompt registry hash reported by every endpoint with ours.
+        
+        Prompt IDs are only sent when all endpoints have the same registry;
+        otherwise (older server, edited prompt on one side) the full prompt
+        text is sent as before.
+        """
+        self.prompt_registry_active = False
+        if not settings.llm_prompt_registry_enabled:
+            return False
+        
+        client = await self._get_client()
+        for endpoint in self.pool.endpoints:
+            try:
+                response = await client.get(
+                    endpoint.health_url + "/prompts",
+                    timeout=settings.llm_connect_timeout_seconds
+                )
+                response.raise_for_status()
+                remote_hash = response.json().get("hash") or ""
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"LLM endpoint {endpoint.url} has no prompt registry ({e}), sending full prompts")
+                return False
+            if remote_hash != PROMPT_REGISTRY["hash"]:
+                print(
+                    f"Warning: Prompt registry mismatch on {endpoint.url} "
+                    f"(server {remote_hash[:12]}, backend {PROMPT_REGISTRY['hash'][:12]}), sending full prompts"
+                )
+                return False
+        
+        self.prompt_registry_active = True
+        print(f"Prompt registry v{PROMPT_REGISTRY['version']} ({PROMPT_REGISTRY['hash'][:12]}) matches all LLM endpoints, sending prompt IDs")
+        return True
+    
+    def _with_prompt_id(self, payload: dict, prompt_id: str) -> dict:
+        """
+        Replace the registry prompt at the start of the system message with
+        its ID. Whatever follows it (the conversation summary) is still sent.
+        """
+        prompt = prompt_assembler.prompts[prompt_assembler.modules_for(prompt_id)]
+        system, history = payload["messages"][0], payload["messages"][1:]
+        rest = system["content"][len(prompt):].lstrip("\n")
+        messages = ([{"role": "system", "content": rest}] if rest else []) + history
+        return {
+            **payload,
+            "messages": messages,
+            "prompt_id": prompt_id,
+            "prompt_version": PROMPT_REGISTRY["hash"]
+        }
+    
+    def _payload_attempts(self, payload: dict, prompt_id: str) -> List[dict]:
+        """The payloads to try in order: by prompt ID if possible, then with the full text"""
+        if self.prompt_registry_active:
+            return [self._with_prompt_id(payload, prompt_id), payload]
+        return [payload]
+    
+    def _prompt_registry_mismatch(self, endpoint_url: str, detail: str):
+        """A server rejected our prompt ID (HTTP 409); stop sending IDs until the next check"""
+        self.prompt_registry_active = False
+        self.prompt_registry_fallbacks += 1
+        print(f"Warning: {endpoint_url} rejected the prompt ID ({detail}), sending full prompts")
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared client, creating it when used outside the app lifespan"""
+        if self.client is None:
+            await self.connect()
+        return self.client
+    
+    def _build_request(self, messages: List[Dict[str, str]], tools_available: bool = False) -> Tuple[dict, GenerationPolicy, str]:
+        """
+        Build the completion payload: the system prompt, the conversation
+        history fitted into the token budget, and the sampling settings of
+        the turn's generation policy. Also returns the registry ID of the
+        system prompt.
+        """
+        # Only the action modules this turn needs, so plain medical questions skip the tool instructions
+        system_prompt, modules = prompt_assembler.build(messages, tools_available)
+        policy = generation_policies.select(messages, modules, tools_available)
+        
+        # Keep as much recent history as fits; the booking flow needs several turns of context
+        formatted_messages, prompt_tokens = context_builder.build(system_prompt, messages)
+        prompt_id = prompt_assembler.request_class(modules)
+        print(
+            f"LLM Request - class: {prompt_id}, policy: {policy.name}, "
+            f"prompt_tokens: {prompt_tokens}, messages: {len(formatted_messages)}"
+        )
+        
+        payload = {
+            "model": self.model,
+            "messages": formatted_messages,
+            **generation_policies.sampling_params(policy, modules),
+        }
+        if tools_available and settings.llm_native_tools:
+            payload["tools"] = NATIVE_TOOLS
+        return payload, policy, prompt_id
     
     async def get_completion(self, messages: List[Dict[str, str]], tools_available: bool = False) -> str:
         """
         Get a completion from the LLM API.
         
+        Identical concurrent requests share a single upstream call.
+        
         Args:
             messages: List of message dicts with 'role' and 'content' keys
             
         Returns:
             The assistant's response content
         """
+        payload, policy, prompt_id = self._build_request(messages, tools_available)
+        
+        if not settings.llm_single_flight_enabled:
+            return await self._post_completion(payload, policy, prompt_id)
+        return await self.single_flight.do(
+            SingleFlight.make_key(payload),
+            lambda: self._post_completion(payload, policy, prompt_id)
+        )
+    
+    async def _post_completion(self, payload: dict, policy: GenerationPolicy, prompt_id: str) -> str:
+        """Send a completion request and return the content or a fallback reply"""
         try:
-            # Build system prompt based on tools availability
-            base_prompt = """You are a medical assistance AI trained to provide accurate, evidence-based medical information.
-
-Respond in a calm, professional, and patient-friendly manner.
-Use clear, simple, and respectful language.
-Avoid unnecessary technical jargon unless the user asks for it.
-Be concise but complete.
-Do not invent facts.
-If you are unsure or information is missing, say so clearly.
-
-CRITICAL EMERGENCY OVERRIDE (HIGHEST PRIORITY):
-If the user describes symptoms suggesting a medical emergency
-(e.g., chest pain, heart attack, stroke, unconsciousness, severe bleeding, difficulty breathing):
-1. Immediately instruct the user to call emergency services (112).
-2. Clearly state that this is an emergency.
-3. Provide only basic, general first-aid guidance.
-4. Use a numbered list with no more than 5 steps.
-5. Do not repeat instructions.
-6. Do not give diagnoses or personalized treatment.
-7. Stop the response after emergency guidance.
-
-For non-emergency medical questions:
-- Explain conditions, medicines, tests, and treatments accurately.
-- Focus on established medical knowledge.
-- Keep answers within 4–6 sentences unless detailed explanation is requested.
-
-When defining a disease:
-- Start with a one-sentence definition.
-- Briefly explain the core biological mechanism.
-- Mention common causes or types if relevant.
-- Keep the explanation patient-friendly.
-
-When discussing treatment or medication:
-- Describe general treatment approaches only.
-- Do not provide personalized treatment plans.
-- Do not give drug dosages unless explicitly asked and appropriate.
-- Use generic drug names when possible.
-
-When asked about symptoms:
-- List common symptoms first.
-- Avoid repetition.
-- Do not diagnose based on symptoms alone.
-
-Never repeat the same sentence or instruction in one response.
-
-Emergency note: I cannot replace emergency medical care. Call 112 immediately for life-threatening symptoms.
-
-Developer details:
-This LLM is trained by Rishabh Kushwaha and Reshma using a Medical LLaMA-based architecture.
-"""
-
-            tools_prompt = """
-
-=== ASSISTANT ACTIONS - CONVERSATIONAL FLOW ===
-
-You can help users with appointments, hospitals, doctors, and account management. 
-ALWAYS follow the step-by-step conversational flow below. DO NOT skip steps.
-
----
-
-### 1. SHOW DOCTORS (When user asks "list doctors", "show doctors", "available doctors"):
-
-- Immediately show all doctors:
-  TOOL_CALL: {"name": "get_doctors", "parameters": {}}
-
-- If user asks for specific specialty (e.g., "show cardiologists", "list dermatologists"):
-  TOOL_CALL: {"name": "get_doctors", "parameters": {"specialization": "specialty"}}
-
-- The system will display doctors with their ID, name, hospital, availability, fee, and rating.
-- After showing doctors, wait for user to select one for booking.
-
----
-
-### 2. BOOKING APPOINTMENT - Step by Step Flow:
-
-**STEP 1: User Selects Doctor**
-- After seeing doctor list, user will say which doctor they want (e.g., "I want Dr. Sarah Johnson" or "book with doc_001")
-- Note the doctor's ID (like doc_001), name, specialization, and hospital from the list.
-
-**STEP 2: Collect Date, Time, and Reason**
-- Ask user for:
-  - Date (format: YYYY-MM-DD, e.g., 2026-02-15)
-  - Time (format: HH:MM, e.g., 10:00 or 14:30)
-  - Reason for visit
-  
-- If user provides all in one message, proceed to confirmation.
-- If missing any, ask for the missing information.
-
-**STEP 3: Confirm Before Booking**
-- Summarize ALL details and ask for confirmation:
-  
-  "📋 **Please confirm your appointment:**
-   - 👨‍⚕️ Doctor: Dr. [name] ([specialization])
-   - 🏥 Hospital: [hospital_name]  
-   - 📅 Date: [YYYY-MM-DD]
-   - ⏰ Time: [HH:MM]
-   - 📝 Reason: [reason]
-   
-   Type **YES** to confirm or **NO** to cancel."
-
-**STEP 4: Book Only After YES**
-- ONLY when user confirms with YES/yes/confirm/ok:
-  TOOL_CALL: {"name": "book_appointment", "parameters": {"doctor_id": "doc_XXX", "doctor_name": "Dr. Name", "specialization": "Specialty", "appointment_date": "YYYY-MM-DD", "appointment_time": "HH:MM", "reason": "reason text"}}
-
-- After successful booking, user will receive a confirmation email with appointment details.
-
-- If user says NO/no/cancel:
-  → Say "No problem! Let me know if you'd like to book a different appointment."
-
----
-
-### 3. SHOW HOSPITALS:
-
-- If user asks "show hospitals", "list hospitals", "hospital list":
-  TOOL_CALL: {"name": "get_hospitals", "parameters": {}}
-
-- If user asks for specific city (e.g., "hospitals in Delhi"):
-  TOOL_CALL: {"name": "get_hospitals", "parameters": {"city": "Delhi"}}
-
-- If user asks for emergency hospitals:
-  TOOL_CALL: {"name": "get_hospitals", "parameters": {"emergency_only": true}}
-
----
-
-### 4. VIEW MY APPOINTMENTS:
-
-- If user asks "show my appointments", "my bookings", "my appointments", "booking history":
-  TOOL_CALL: {"name": "get_user_appointments", "parameters": {}}
-
----
-
-### 5. CANCEL APPOINTMENT:
-
-- If user asks to cancel an appointment:
-  - First get their appointments:
-    TOOL_CALL: {"name": "get_user_appointments", "parameters": {}}
-  - Show them the list with appointment IDs
-  - Ask which appointment to cancel
-  - When user specifies, confirm before cancelling
-
-- After user confirms cancellation (says YES/confirm/ok):
-  TOOL_CALL: {"name": "cancel_appointment", "parameters": {"appointment_id": "apt_XXXXX"}}
-
-- User will receive an email notification when appointment is cancelled.
-
----
-
-### 6. CHANGE PASSWORD:
-
-- If user asks to change password, ask for current and new password.
-- Then call:
-  TOOL_CALL: {"name": "change_password", "parameters": {"current_password": "xxx", "new_password": "yyy"}}
-
----
-
-=== CRITICAL RULES ===
-1. NEVER book without explicit YES confirmation from user
-2. ALWAYS use the doctor_id (e.g., doc_001) from the doctor list when booking
-3. Date format MUST be YYYY-MM-DD (e.g., 2026-02-15)
-4. Time format MUST be HH:MM (e.g., 10:00, 14:30)
-5. Collect ALL required fields before showing confirmation
-6. Be conversational and helpful throughout
-
-=== HOW TO USE TOOLS ===
-When you need to perform an action, you MUST respond with TOOL_CALL in this exact format:
-TOOL_CALL: {"name": "tool_name", "parameters": {...}}
-
-**CRITICAL**: You CANNOT book an appointment just by saying "Appointment booked". 
-You MUST output the TOOL_CALL with book_appointment to actually book.
-If user says YES to confirm, you MUST respond with:
-TOOL_CALL: {"name": "book_appointment", "parameters": {"doctor_id": "...", "doctor_name": "...", "specialization": "...", "appointment_date": "YYYY-MM-DD", "appointment_time": "HH:MM", "reason": "..."}}
-
-WITHOUT the TOOL_CALL, the appointment will NOT be saved to the database.
-"""
-
-            SYSTEM_PROMPT = base_prompt + (tools_prompt if tools_available else "")
-
-
-            system_message = {
-                "role": "system",
-                "content": SYSTEM_PROMPT
-            }
-            
-            # Ensure system message is first, then add conversation messages
-            formatted_messages = [system_message]
+            data = await self._request_by_prompt_id(payload, prompt_id)
             
-            # Filter out system messages from history
-            non_system_messages = [msg for msg in messages if msg["role"] != "system"]
-            
-            # Keep more messages for multi-step flows (booking appointments needs context)
-            # Increased to 10 messages to ensure full booking flow context is maintained
-            recent_messages = non_system_messages[-10:] if len(non_system_messages) > 10 else non_system_messages
-            
-            # Add recent conversation history
-            for msg in recent_messages:
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.url,
-                    json={
-                        "model": self.model,
-                        "messages": formatted_messages,
-                        "temperature": 0.3,
-                        "max_tokens": 1024,
-                    },
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    timeout=60.0
-                )
+            # Log finish reason for debugging
+            if "choices" in data and len(data["choices"]) > 0:
+                finish_reason = data["choices"][0].get("finish_reason", "unknown")
+                print(f"LLM Response - finish_reason: {finish_reason}")
                 
-                response.raise_for_status()
-                data = response.json()
+                # Check if response was truncated
+                if finish_reason == "length":
+                    print("WARNING: Response was truncated due to max_tokens limit")
                 
-                # Log finish reason for debugging
-                if "choices" in data and len(data["choices"]) > 0:
-                    finish_reason = data["choices"][0].get("finish_reason", "unknown")
-                    print(f"LLM Response - finish_reason: {finish_reason}")
-                    
-                    # Check if response was truncated
-                    if finish_reason == "length":
-                        print("WARNING: Response was truncated due to max_tokens limit")
-                    
-                    return data["choices"][0]["message"]["content"]
-                else:
-                    return "I apologize, but I couldn't generate a response."
+                message = data["choices"][0]["message"]
+                content = generation_policies.finish(
+                    policy,
+                    message.get("content") or "",
+                    finish_reason,
+                    (data.get("usage") or {}).get("completion_tokens")
+                )
+                if message.get("tool_calls"):
+                    content = f"{content}\n{tool_calls_to_text(message['tool_calls'])}".strip()
+                return content
+            else:
+                return EMPTY_RESPONSE_MESSAGE
                     
+        except asyncio.CancelledError:
+            # The caller went away; closing the connection lets the server abort the generation
+            generation_policies.cancelled(policy, "")
+            raise
         except httpx.HTTPStatusError as e:
             print(f"LLM API HTTP Error: {e}")
-            return f"I apologize, but I'm having trouble connecting to the medical assistant service. Please try again later. {e}"
-        except httpx.RequestError as e:
+            return f"{CONNECTION_ERROR_MESSAGE} {e}"
+        except (httpx.RequestError, NoEndpointAvailable) as e:
             print(f"LLM API Request Error: {e}")
-            return f"I apologize, but I'm having trouble connecting to the medical assistant service. Please try again later. {e}"
+            return f"{CONNECTION_ERROR_MESSAGE} {e}"
         except Exception as e:
             print(f"Unexpected error: {e}")
-            return f"An unexpected error occurred. Please try again. {e}"
+            return f"{UNEXPECTED_ERROR_MESSAGE} {e}"
     
-    def parse_tool_call(self, response: str) -> Optional[Tuple[str, str, Dict]]:
+    async def _request_by_prompt_id(self, payload: dict, prompt_id: str) -> dict:
+        """Send the request with the prompt ID, falling back to the full prompt text on a 409"""
+        attempts = self._payload_attempts(payload, prompt_id)
+        for attempt in attempts[:-1]:
+            try:
+                data = await self._request_completion(attempt)
+                self.prompt_id_requests += 1
+                return data
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 409:
+                    raise
+                self._prompt_registry_mismatch(str(e.request.url), e.response.text)
+        return await self._request_completion(attempts[-1])
+    
+    async def _post(self, endpoint: Endpoint, payload: dict) -> dict:
+        """POST a completion request to one endpoint"""
+        client = await self._get_client()
+        response = await client.post(endpoint.url, json=payload)
+        response.raise_for_status()
+        return response.json()
+    
+    def _dispatch(self, endpoint: Endpoint, payload: dict) -> asyncio.Task:
+        """Start a request on an acquired endpoint and release it when the task ends"""
+        start = time.perf_counter()
+        task = asyncio.ensure_future(self._post(endpoint, payload))
+        task.add_done_callback(lambda done: self._release(endpoint, done, start))
+        return task
+    
+    def _release(self, endpoint: Endpoint, task: asyncio.Task, start: float):
+        # Runs even if the task was cancelled before it started, so counts never leak
+        if task.cancelled():
+            self.pool.release(endpoint, cancelled=True)
+            return
+        
+        error = task.exception()
+        if error is None:
+            self.pool.release(endpoint, latency=time.perf_counter() - start)
+        elif isinstance(error, httpx.HTTPStatusError):
+            # A rejected request (4xx) says nothing about the replica's health
+            self.pool.release(endpoint, failed=error.response.status_code >= 500)
+        else:
+            self.pool.release(endpoint, failed=True)
+    
+    async def _request_completion(self, payload: dict) -> dict:
         """
-        Parse a tool call from the LLM response.
+        Send a completion request through the endpoint pool.
         
-        Returns:
-            Tuple of (before_text, tool_name, parameters) if tool call found, else None
-            - before_text: Any text before the TOOL_CALL
-            - tool_name: Name of the tool to call
-            - parameters: Dictionary of parameters
+        If the request fails, it is retried once on another endpoint. With
+        hedging enabled, a second request goes to another endpoint once the
+        first one is slower than the configured latency percentile; whichever
+        answers first wins and the other is cancelled.
         """
-        # Look for TOOL_CALL: pattern and find the JSON after it
-        tool_call_pattern = r'TOOL_CALL:\s*'
-        match = re.search(tool_call_pattern, response, re.IGNORECASE)
+        endpoint = self.pool.acquire()
+        if endpoint is None:
+            raise NoEndpointAvailable("All LLM endpoints are unavailable")
         
-        if not match:
-            return None
+        used = [endpoint]
+        primary = self._dispatch(endpoint, payload)
+        hedge_delay = None
+        if settings.llm_hedge_enabled and len(self.pool.endpoints) > 1:
+            hedge_delay = self.pool.latency_percentile(settings.llm_hedge_percentile)
+            if hedge_delay is not None:
+                hedge_delay = max(hedge_delay, settings.llm_hedge_min_delay_seconds)
         
+        tasks = {primary}
         try:
-            # Extract the text before tool call
-            before_text = response[:match.start()].strip()
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    backup = self.pool.acquire(exclude=used)
+                    if backup is not None:
+                        self.hedged += 1
+                        used.append(backup)
+                        tasks.add(self._dispatch(backup, payload))
             
-            # Get the text after TOOL_CALL:
-            json_start = match.end()
-            remaining_text = response[json_start:]
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
             
-            # Find the matching braces for the JSON object
-            # Start from the first { and count braces
-            brace_start = remaining_text.find('{')
-            if brace_start == -1:
-                return None
-            
-            brace_count = 0
-            json_end = -1
-            for i, char in enumerate(remaining_text[brace_start:], start=brace_start):
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        json_end = i + 1
+            # Every attempt failed: fail over to another endpoint once
+            fallback = self.pool.acquire(exclude=used)
+            if fallback is None:
+                raise error
+            self.failovers += 1
+            print(f"LLM endpoint {endpoint.url} failed ({error}), retrying on {fallback.url}")
+            return await self._dispatch(fallback, payload)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_completion(self, messages: List[Dict[str, str]], tools_available: bool = False) -> AsyncIterator[str]:
+        """
+        Stream a completion from the LLM API.
+
+        Sends an OpenAI-compatible request with stream=true and yields the
+        content deltas as they arrive. If the upstream ignores the stream flag
+        and answers with a regular JSON completion, the whole content is
+        yielded once.
+        """
+        payload, policy, prompt_id = self._build_request(messages, tools_available)
+        payload["stream"] = True
+
+        # Native tool calls arrive as fragments keyed by index
+        native_tool_calls: Dict[int, Dict] = {}
+        # The streamed text, so a TOOL_CALL cut off by the stop sequence can be closed at the end
+        streamed = []
+        finish_reason = None
+
+        try:
+
+            async with self._open_stream(payload, prompt_id) as response:
+                if "text/event-stream" not in response.headers.get("content-type", ""):
+                    await response.aread()
+                    data = response.json()
+                    if "choices" in data and len(data["choices"]) > 0:
+                        message = data["choices"][0]["message"]
+                        content = generation_policies.finish(
+                            policy,
+                            message.get("content") or "",
+                            data["choices"][0].get("finish_reason"),
+                            (data.get("usage") or {}).get("completion_tokens")
+                        )
+                        if message.get("tool_calls"):
+                            content = f"{content}\n{tool_calls_to_text(message['tool_calls'])}".strip()
+                        yield content
+                    else:
+                        yield EMPTY_RESPONSE_MESSAGE
+                    return
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
                         break
+
+                    chunk = json.loads(payload)
+                    if not chunk.get("choices"):
+                        continue
+
+                    choice = chunk["choices"][0]
+                    delta = choice.get("delta", {}).get("content")
+                    if delta:
+                        streamed.append(delta)
+                        yield delta
+
+                    for fragment in choice.get("delta", {}).get("tool_calls") or []:
+                        tool_call = native_tool_calls.setdefault(
+                            fragment.get("index", 0), {"function": {"name": "", "arguments": ""}}
+                        )
+                        function = fragment.get("function", {})
+                        tool_call["function"]["name"] += function.get("name") or ""
+                        tool_call["function"]["arguments"] += function.get("arguments") or ""
+
+                    if choice.get("finish_reason"):
+                        finish_reason = choice["finish_reason"]
+                        if finish_reason == "length":
+                            print("WARNING: Streamed response was truncated due to max_tokens limit")
+
+            content = "".join(streamed)
+            repaired = generation_policies.finish(policy, content, finish_reason)
+            if repaired != content:
+                yield repaired[len(content.rstrip()):]
+
+            if native_tool_calls:
+                yield "\n" + tool_calls_to_text([native_tool_calls[index] for index in sorted(native_tool_calls)])
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Closed before the end: leaving the stream context closed the upstream connection
+            generation_policies.cancelled(policy, "".join(streamed))
+            raise
+        except httpx.HTTPStatusError as e:
+            print(f"LLM API HTTP Error: {e}")
+            yield f"{CONNECTION_ERROR_MESSAGE} {e}"
+        except (httpx.RequestError, NoEndpointAvailable) as e:
+            print(f"LLM API Request Error: {e}")
+            yield f"{CONNECTION_ERROR_MESSAGE} {e}"
+        except json.JSONDecodeError as e:
+            print(f"LLM API Stream Error: {e}")
+            yield f"{UNEXPECTED_ERROR_MESSAGE} {e}"
+
+    @asynccontextmanager
+    async def _open_stream(self, payload: dict, prompt_id: str):
+        """Open a streaming request, retrying with the full prompt text if the prompt ID is rejected"""
+        client = await self._get_client()
+        attempts = self._payload_attempts(payload, prompt_id)
+        for attempt in attempts:
+            endpoint = self.pool.acquire()
+            if endpoint is None:
+                raise NoEndpointAvailable("All LLM endpoints are unavailable")
             
-            if json_end == -1:
-                return None
+            streaming = False
+            try:
+                async with self._track_stream(endpoint), client.stream("POST", endpoint.url, json=attempt) as response:
+                    if response.status_code == 409 and attempt is not attempts[-1]:
+                        await response.aread()
+                    # Raised inside the tracking context, so a rejected request is
+                    # released like in _release: no latency sample
+                    response.raise_for_status()
+                    if attempt is not attempts[-1]:
+                        self.prompt_id_requests += 1
+                    streaming = True
+                    yield response
+                    return
+            except httpx.HTTPStatusError as e:
+                # Only a rejected prompt ID is retried, never an error raised while streaming
+                if streaming or e.response.status_code != 409 or attempt is attempts[-1]:
+                    raise
+                self._prompt_registry_mismatch(endpoint.url, e.response.text)
+    
+    @asynccontextmanager
+    async def _track_stream(self, endpoint: Endpoint):
+        """Count a streaming request against its endpoint until the stream ends"""
+        start = time.perf_counter()
+        try:
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            self.pool.release(endpoint, cancelled=True)
+            raise
+        except httpx.HTTPStatusError as e:
+            self.pool.release(endpoint, failed=e.response.status_code >= 500)
+            raise
+        except Exception:
+            self.pool.release(endpoint, failed=True)
+            raise
+        else:
+            # Time to the full answer, comparable with non-streaming latencies
+            self.pool.release(endpoint, latency=time.perf_counter() - start)
+    
+    async def summarize_conversation(self, previous_summary: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Fold new messages into a running conversation summary.
+        
+        Returns None on failure so a fallback reply is never stored as a summary.
+        Callers hold an admission slot at background priority (see summary_service).
+        """
+        transcript = "\n\n".join(
+            f"{msg['role'].upper()}: {msg['content'][:SUMMARY_MESSAGE_CHARS]}"
+            for msg in messages
+        )
+        prompt = (
+            f"Existing summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        
+        try:
+            data = await self._request_completion({
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.1,
+                "max_tokens": settings.summary_max_tokens,
+            })
+            summary = data["choices"][0]["message"]["content"].strip()
+            return summary or None
+        except Exception as e:
+            print(f"Warning: Conversation summary failed: {e}")
+            return None
+    
+    def stats(self) -> dict:
+        """Get LLM request counters for monitoring"""
+        return {
+            "single_flight": self.single_flight.stats(),
+            "pool": self.pool.stats(),
+            "prompts": prompt_assembler.stats(),
+            "generation": generation_policies.stats(),
+            "prompt_registry": {
+                "version": PROMPT_REGISTRY["version"],
+                "hash": PROMPT_REGISTRY["hash"][:12],
+                "active": self.prompt_registry_active,
+                "prompt_id_requests": self.prompt_id_requests,
+                "fallbacks": self.prompt_registry_fallbacks
+            },
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers
+        }
+    
+    def is_error_response(self, response: str) -> bool:
+        """Check if a response is one of the fallback replies used when the LLM call fails"""
+        return response.startswith((EMPTY_RESPONSE_MESSAGE, CONNECTION_ERROR_MESSAGE, UNEXPECTED_ERROR_MESSAGE))
+    
+    def parse_tool_calls(self, response: str) -> Tuple[str, List[Tuple[str, Dict]]]:
+        """
+        Parse every tool call from the LLM response.
+        
+        Returns:
+            Tuple of (before_text, tool_calls)
+            - before_text: Any text before the first TOOL_CALL
+            - tool_calls: List of (tool_name, parameters) in order, without duplicates
+        """
+        decoder = json.JSONDecoder()
+        before_text = None
+        tool_calls: List[Tuple[str, Dict]] = []
+        
+        # The JSON may be wrapped in a ```json fence
+        for match in re.finditer(r'TOOL_CALL:\s*(?:```(?:json)?\s*)?', response, re.IGNORECASE):
+            if before_text is None:
+                # Extract the text before the first tool call
+                before_text = response[:match.start()].strip()
             
-            # Extract and parse the JSON
-            json_str = remaining_text[brace_start:json_end]
-            tool_json = json.loads(json_str)
-            tool_name = tool_json.get("name")
-            parameters = tool_json.get("parameters", {})
+            if not response.startswith('{', match.end()):
+                continue
             
-            if not tool_name:
-                return None
+            try:
+                # raw_decode reads exactly one JSON value, so braces inside strings are handled
+                tool_json, _ = decoder.raw_decode(response, match.end())
+            except json.JSONDecodeError as e:
+                print(f"Failed to parse tool call: {e}")
+                continue
             
-            return (before_text, tool_name, parameters)
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Failed to parse tool call: {e}")
+            if not isinstance(tool_json, dict) or not tool_json.get("name"):
+                continue
+            
+            parameters = tool_json.get("parameters", tool_json.get("arguments")) or {}
+            if isinstance(parameters, str):
+                try:
+                    parameters = json.loads(parameters)
+                except json.JSONDecodeError:
+                    parameters = {}
+            
+            tool_call = (tool_json["name"], parameters if isinstance(parameters, dict) else {})
+            if tool_call not in tool_calls:
+                tool_calls.append(tool_call)
+        
+        return before_text or "", tool_calls
+    
+    def parse_tool_call(self, response: str) -> Optional[Tuple[str, str, Dict]]:
+        """
+        Parse the first tool call from the LLM response.
+        
+        Returns:
+            Tuple of (before_text, tool_name, parameters) if tool call found, else None
+        """
+        before_text, tool_calls = self.parse_tool_calls(response)
+        if not tool_calls:
             return None
+        tool_name, parameters = tool_calls[0]
+        return (before_text, tool_name, parameters)
 
 llm_service = LLMService()
@@ -1,51 +1,169 @@
-SYSTEM_PROMPT = """
-You are a medical assistance AI trained to provide accurate, evidence-based medical information.
-
-Respond in a calm, professional, and patient-friendly manner.
-Use clear, simple, and respectful language.
-Avoid unnecessary technical jargon unless the user asks for it.
-Be concise but complete.
-Do not invent facts.
-If you are unsure or information is missing, say so clearly.
-
-CRITICAL EMERGENCY OVERRIDE (HIGHEST PRIORITY):
-If the user describes symptoms suggesting a medical emergency
-(e.g., chest pain, heart attack, stroke, unconsciousness, severe bleeding, difficulty breathing):
-1. Immediately instruct the user to call emergency services (112).
-2. Clearly state that this is an emergency.
-3. Provide only basic, general first-aid guidance.
-4. Use a numbered list with no more than 5 steps.
-5. Do not repeat instructions.
-6. Do not give diagnoses or personalized treatment.
-7. Stop the response after emergency guidance.
-
-For non-emergency medical questions:
-- Explain conditions, medicines, tests, and treatments accurately.
-- Focus on established medical knowledge.
-- Keep answers within 4–6 sentences unless detailed explanation is requested.
-
-When defining a disease:
-- Start with a one-sentence definition.
-- Briefly explain the core biological mechanism.
-- Mention common causes or types if relevant.
-- Keep the explanation patient-friendly.
-
-When discussing treatment or medication:
-- Describe general treatment approaches only.
-- Do not provide personalized treatment plans.
-- Do not give drug dosages unless explicitly asked and appropriate.
-- Use generic drug names when possible.
-
-When asked about symptoms:
-- List common symptoms first.
-- Avoid repetition.
-- Do not diagnose based on symptoms alone.
-
-Never repeat the same sentence or instruction in one response.
-
-Emergency note: I cannot replace emergency medical care. Call 112 immediately for life-threatening symptoms.
-
-Developer details:
-This LLM is trained by Rishabh Kushwaha and Reshma using a Medical LLaMA-based architecture.
-
 """
+System Prompt Modules
+The assistant instructions live in the shared prompt registry (prompts/ at
+the repository root), which the inference server loads too. They are split
+into the medical base prompt and one module per action (doctors, booking,
+hospitals, appointments, password). A turn only carries the modules its
+intent and the pending conversation state need; every combination is
+assembled once at import.
+"""
+
+import hashlib
+import itertools
+import json
+import re
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from config import settings
+from services.context_service import ContextBuilder, TokenCounter, context_builder
+
+
+DEFAULT_REGISTRY_PATH = Path(__file__).resolve().parents[2] / "prompts" / "registry.json"
+
+
+def load_prompt_registry(path: Path) -> dict:
+    """
+    Load the registry manifest and its text files.
+
+    The hash covers the module order and every text, so the backend and the
+    inference server can check they assemble the same prompts.
+    """
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+
+    def read(name: str) -> str:
+        return (path.parent / name).read_text(encoding="utf-8")
+
+    registry = {
+        "version": manifest["version"],
+        "base": read(manifest["base"]),
+        "tools_header": read(manifest["tools_header"]),
+        "tools_footer": read(manifest["tools_footer"]),
+        "module_order": list(manifest["module_order"]),
+        "modules": {name: read(manifest["modules"][name]) for name in manifest["module_order"]},
+    }
+    content = json.dumps({key: value for key, value in registry.items() if key != "version"}, sort_keys=True)
+    registry["hash"] = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return registry
+
+
+PROMPT_REGISTRY = load_prompt_registry(Path(settings.prompt_registry_path) if settings.prompt_registry_path else DEFAULT_REGISTRY_PATH)
+
+BASE_PROMPT = PROMPT_REGISTRY["base"]
+TOOLS_HEADER = PROMPT_REGISTRY["tools_header"]
+TOOLS_FOOTER = PROMPT_REGISTRY["tools_footer"]
+PROMPT_MODULES = PROMPT_REGISTRY["modules"]
+
+# Every variant lists the actions in the same order
+MODULE_ORDER = tuple(PROMPT_REGISTRY["module_order"])
+
+# Modules another module can't work without (booking starts from the doctor list)
+MODULE_DEPENDENCIES = {"booking": {"doctors"}}
+
+# What the latest user message asks for
+INTENT_PATTERNS = {
+    "doctors": r"\b(doctors?|dr|specialists?|physicians?|surgeons?|\w+(ologists?|iatrists?|iatricians?|opedics?|paedics?))\b",
+    "booking": r"\b(book|schedule|reschedule)\b|\b(an|new)\s+appointment\b|\bdoc_\d+\b|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}(:\d{2})?\s*(am|pm)\b|\b\d{1,2}:\d{2}\b",
+    "hospitals": r"\b(hospitals?|clinics?|medical cent(er|re)s?)\b",
+    "appointments": r"\bmy\s+(\w+\s+)?(appointments?|bookings?)\b|\b(cancel\w*|upcoming|history)\b|\bapt_\w+\b",
+    "password": r"\b(password|passcode)\b",
+}
+
+# What the last assistant message is waiting for (e.g. a pick from a doctor list)
+STATE_PATTERNS = {
+    "booking": r"\bdoc_\d+\b|YYYY-MM-DD|HH:MM|\bdate\b[\s\S]*\btime\b",
+    "appointments": r"\bapt_\w+\b",
+    "password": r"\bpassword\b",
+}
+
+
+def assemble_prompt(modules: Iterable[str]) -> str:
+    """Join the base prompt and the given action modules into one system prompt"""
+    selected = [name for name in MODULE_ORDER if name in modules]
+    if not selected:
+        return BASE_PROMPT
+    return BASE_PROMPT + TOOLS_HEADER + "".join(PROMPT_MODULES[name] for name in selected) + TOOLS_FOOTER
+
+
+class PromptAssembler:
+    """Picks the system prompt variant for a turn and tracks prompt size per request class"""
+
+    ALL_MODULES = frozenset(MODULE_ORDER)
+
+    def __init__(self, counter: TokenCounter, enabled: bool = True):
+        self.enabled = enabled
+        self.prompts: Dict[FrozenSet[str], str] = {}
+        for size in range(len(MODULE_ORDER) + 1):
+            for combination in itertools.combinations(MODULE_ORDER, size):
+                self.prompts[frozenset(combination)] = assemble_prompt(combination)
+        self.tokens = {modules: counter.count(prompt) for modules, prompt in self.prompts.items()}
+        self.requests: Dict[str, int] = {}
+        self.saved_tokens: Dict[str, int] = {}
+
+    @staticmethod
+    def request_class(modules: FrozenSet[str]) -> str:
+        """Name a module set, e.g. "doctors+booking"; "medical" when no action is needed"""
+        return "+".join(name for name in MODULE_ORDER if name in modules) or "medical"
+
+    @staticmethod
+    def modules_for(request_class: str) -> FrozenSet[str]:
+        """Inverse of request_class(); the class name doubles as the registry prompt ID"""
+        return frozenset(request_class.split("+")) if request_class != "medical" else frozenset()
+
+    @staticmethod
+    def select_modules(messages: List[Dict[str, str]]) -> FrozenSet[str]:
+        """Pick the modules for the latest user message and the assistant turn it answers"""
+        history = [msg for msg in messages if msg.get("role") != "system"]
+        query = history[-1]["content"].lower() if history and history[-1]["role"] == "user" else ""
+        previous = next((msg for msg in reversed(history[:-1]) if msg["role"] == "assistant"), None)
+
+        modules = {name for name, pattern in INTENT_PATTERNS.items() if re.search(pattern, query)}
+        if previous is not None:
+            content = previous["content"]
+            if ContextBuilder.is_pending_booking_turn(previous):
+                modules.add("booking")
+            modules.update(
+                name for name, pattern in STATE_PATTERNS.items()
+                if re.search(pattern, content, re.IGNORECASE)
+            )
+
+        for name in list(modules):
+            modules.update(MODULE_DEPENDENCIES.get(name, ()))
+        return frozenset(modules)
+
+    def build(self, messages: List[Dict[str, str]], tools_available: bool) -> Tuple[str, FrozenSet[str]]:
+        """Get (system_prompt, modules) for a turn"""
+        if not tools_available:
+            modules = frozenset()
+        elif not self.enabled:
+            modules = self.ALL_MODULES
+        else:
+            modules = self.select_modules(messages)
+
+        name = self.request_class(modules)
+        # Before modules, every turn with tools sent all of them
+        baseline = self.tokens[self.ALL_MODULES if tools_available else frozenset()]
+        self.requests[name] = self.requests.get(name, 0) + 1
+        self.saved_tokens[name] = self.saved_tokens.get(name, 0) + baseline - self.tokens[modules]
+        return self.prompts[modules], modules
+
+    def stats(self) -> dict:
+        """Get system prompt sizes and savings per request class for monitoring"""
+        classes = {}
+        for name, requests in self.requests.items():
+            modules = self.modules_for(name)
+            classes[name] = {
+                "requests": requests,
+                "system_tokens": self.tokens[modules],
+                "avg_saved_tokens": round(self.saved_tokens[name] / requests, 1)
+            }
+        return {
+            "enabled": self.enabled,
+            "variants": len(self.prompts),
+            "full_prompt_tokens": self.tokens[self.ALL_MODULES],
+            "saved_tokens": sum(self.saved_tokens.values()),
+            "classes": classes
+        }
+
+
+# Global instance, builds every prompt variant at import
+prompt_assembler = PromptAssembler(context_builder.counter, enabled=settings.llm_prompt_modules_enabled)
@@ -125,6 +125,72 @@ class QueryValidatorService:
         r'profile',
     ]
     
+    # Phrases that indicate a possible medical emergency
+    EMERGENCY_KEYWORDS = [
+        'heart attack', 'chest pain', 'stroke', 'unconscious', 'not breathing',
+        'difficulty breathing', 'can\'t breathe', 'cannot breathe', 'severe bleeding',
+        'seizure', 'overdose', 'poisoning', 'choking', 'suicide', 'emergency',
+    ]
+    
+    # Short social messages that aren't exact greetings ("thanks a lot!", "ok great")
+    GREETING_ADJACENT_PATTERN = r"^(hi|hello|hey|thanks|thank you|thx|ok|okay|great|cool|nice|bye|goodbye|good (morning|afternoon|evening|night))\b"
+    GREETING_MAX_WORDS = 6
+    
+    SYMPTOM_PATTERNS = [
+        r'\b(symptoms?|signs?|warning signs?)\s+(of|for)\b',
+        r'\bwhat are the (symptoms|signs)\b',
+    ]
+    
+    DEFINITION_PATTERNS = [
+        r'^(what|who)\s+(is|are)\b',
+        r'\b(define|definition of|meaning of)\b',
+        r'\bwhat does .+ mean\b',
+    ]
+    
+    @staticmethod
+    def is_emergency(query: str) -> bool:
+        """Check if a query describes a possible medical emergency"""
+        if not query:
+            return False
+        
+        query_lower = query.lower()
+        return any(keyword in query_lower for keyword in QueryValidatorService.EMERGENCY_KEYWORDS)
+    
+    @staticmethod
+    def is_tool_query(query: str) -> bool:
+        """Check if a query asks for an action (doctors, hospitals, appointments, account)"""
+        if not query:
+            return False
+        
+        query_lower = query.lower().strip()
+        return any(re.search(pattern, query_lower) for pattern in QueryValidatorService.APPOINTMENT_PATTERNS)
+    
+    @staticmethod
+    def classify_query(query: str) -> str:
+        """
+        Classify a query for generation settings.
+    
+        Returns one of: "emergency", "tool", "greeting", "symptoms",
+        "definition" or "general".
+        """
+        if not query or not query.strip():
+            return "general"
+    
+        query_lower = query.lower().strip()
+        if QueryValidatorService.is_emergency(query_lower):
+            return "emergency"
+        if QueryValidatorService.is_tool_query(query_lower):
+            return "tool"
+        if len(query_lower.split()) <= QueryValidatorService.GREETING_MAX_WORDS and re.match(
+            QueryValidatorService.GREETING_ADJACENT_PATTERN, query_lower
+        ):
+            return "greeting"
+        if any(re.search(pattern, query_lower) for pattern in QueryValidatorService.SYMPTOM_PATTERNS):
+            return "symptoms"
+        if any(re.search(pattern, query_lower) for pattern in QueryValidatorService.DEFINITION_PATTERNS):
+            return "definition"
+        return "general"
+    
     @staticmethod
     def is_medical_query(query: str) -> Tuple[bool, Optional[str]]:
         """
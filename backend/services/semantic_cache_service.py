@@ -0,0 +1,253 @@
+"""
+Semantic Answer Cache
+Serves stored answers for paraphrased questions ("what causes migraines" vs
+"migraine causes") by comparing query vectors with cosine similarity.
+Queries are embedded on the CPU with a hashing vectorizer, so no model
+download or GPU is needed.
+
+Similar wording isn't enough when a letter or number names the condition
+("vitamin a" vs "vitamin d", "type 1" vs "type 2 diabetes"): such
+qualifiers and the prompt version must match exactly for a hit.
+"""
+
+import re
+import time
+import zlib
+from typing import FrozenSet, List, Optional, Tuple
+import numpy as np
+from config import settings
+from services.llm_service import PROMPT_VERSION
+
+
+class HashingVectorizer:
+    """Embeds text into a fixed-size vector using the hashing trick"""
+
+    # Words that carry no meaning for matching medical questions
+    # Single letters are handled by _words: "a" is an article after these but
+    # a qualifier after a content word ("vitamin a", "hepatitis a")
+    STOP_WORDS = {
+        'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'am', 'do', 'does', 'did',
+        'what', 'whats', 'which', 'who', 'how', 'why', 'when', 'where', 'can', 'could', 'should',
+        'would', 'will', 'me', 'my', 'you', 'your', 'it', 'its', 'of', 'for', 'to', 'in',
+        'on', 'at', 'by', 'with', 'about', 'and', 'or', 'please', 'tell', 'explain', 'know',
+        'there', 'this', 'that', 'these', 'those', 'some', 'any', 'get', 'give',
+    }
+
+    def __init__(self, n_features: int = 2048, ngram_weight: float = 0.3):
+        self.n_features = n_features
+        self.ngram_weight = ngram_weight
+
+    @staticmethod
+    def _stem(word: str) -> str:
+        """Very light suffix stripping so plural and singular forms match"""
+        if len(word) <= 4:
+            return word
+        if word.endswith("ies"):
+            return word[:-3] + "y"
+        if word.endswith(("ches", "shes", "sses", "xes", "zes")):
+            word = word[:-2]
+        elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+        # "migraine"/"migraines" and "cause"/"causes" both end up without the e
+        return word[:-1] if word.endswith("e") else word
+
+    def _words(self, text: str) -> Tuple[List[str], FrozenSet[str]]:
+        """
+        Meaningful words of the text and its qualifiers: numbers, and single
+        letters following a content word. A single letter anywhere else
+        ("is a", "can i") is dropped like a stop word.
+        """
+        words, qualifiers = [], set()
+        previous = None
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            if word.isdigit() or (len(word) == 1 and previous is not None and previous not in self.STOP_WORDS):
+                qualifiers.add(word)
+                words.append(word)
+            elif len(word) > 1 and word not in self.STOP_WORDS:
+                words.append(self._stem(word))
+            previous = word if len(word) > 1 else None
+        return words, frozenset(qualifiers)
+
+    def qualifiers(self, text: str) -> FrozenSet[str]:
+        """Letters and numbers that must match exactly (see _words)"""
+        return self._words(text)[1]
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = self._words(text)[0]
+
+        features = [(f"w:{word}", 1.0) for word in words]
+        # Character 4-grams catch spelling variants and words sharing a root
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(
+                (f"c:{padded[i:i + 4]}", self.ngram_weight)
+                for i in range(len(padded) - 3)
+            )
+        return features
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into an L2-normalized (len(texts), n_features) matrix"""
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                # crc32 is stable across processes, unlike the built-in hash()
+                digest = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                matrix[row, digest % self.n_features] += sign * weight
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def _key_hash(prompt_version: str, qualifiers: FrozenSet[str]) -> int:
+    """Hash of what must match exactly besides similarity"""
+    return zlib.crc32(f"{prompt_version}|{' '.join(sorted(qualifiers))}".encode("utf-8"))
+
+
+class SemanticCache:
+    """
+    Fixed-capacity matrix of cached query vectors with their answers.
+    Full slots are reclaimed from expired entries first, then the least
+    recently used one. Each slot is keyed by the prompt version and the
+    query's qualifiers; only slots with the same key can match.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        threshold: float,
+        ttl_seconds: int,
+        n_features: int = 2048,
+        enabled: bool = True
+    ):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.vectorizer = HashingVectorizer(n_features)
+
+        self.vectors = np.zeros((capacity, n_features), dtype=np.float32)
+        self.occupied = np.zeros(capacity, dtype=bool)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.keys = np.zeros(capacity, dtype=np.int64)
+        self.queries: List[Optional[str]] = [None] * capacity
+        self.answers: List[Optional[str]] = [None] * capacity
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._hit_similarity_total = 0.0
+
+    def _live_mask(self, now: float) -> np.ndarray:
+        return self.occupied & (self.expires_at > now)
+
+    def _key(self, query: str) -> int:
+        return _key_hash(PROMPT_VERSION, self.vectorizer.qualifiers(query))
+
+    def search_batch(self, queries: List[str]) -> List[Tuple[int, float]]:
+        """
+        Find the most similar cached entry with the same key for each query
+        with a single matrix product. Returns (slot, similarity) pairs; slot
+        is -1 when the cache is empty.
+        """
+        if not queries:
+            return []
+
+        live = self._live_mask(time.time())
+        if not live.any():
+            return [(-1, 0.0)] * len(queries)
+
+        query_vectors = self.vectorizer.transform(queries)
+        # Vectors are L2-normalized, so the dot product is the cosine similarity
+        similarities = query_vectors @ self.vectors.T
+        similarities[:, ~live] = -1.0
+        query_keys = np.array([self._key(query) for query in queries], dtype=np.int64)
+        similarities[query_keys[:, None] != self.keys[None, :]] = -1.0
+
+        best_slots = similarities.argmax(axis=1)
+        return [
+            (int(slot), float(similarities[row, slot]))
+            for row, slot in enumerate(best_slots)
+        ]
+
+    def lookup_batch(self, queries: List[str]) -> List[Optional[str]]:
+        """Get cached answers for several queries at once"""
+        if not self.enabled:
+            return [None] * len(queries)
+
+        now = time.time()
+        answers = []
+        for slot, similarity in self.search_batch(queries):
+            if slot >= 0 and similarity >= self.threshold:
+                self.hits += 1
+                self._hit_similarity_total += similarity
+                self.last_used[slot] = now
+                answers.append(self.answers[slot])
+            else:
+                self.misses += 1
+                answers.append(None)
+        return answers
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Get the cached answer for a query or a close paraphrase of it"""
+        return self.lookup_batch([query])[0]
+
+    def _free_slot(self, now: float) -> int:
+        live = self._live_mask(now)
+        free = np.flatnonzero(~live)
+        if free.size:
+            if self.occupied[free[0]]:
+                self.evictions += 1
+            return int(free[0])
+
+        # Full: evict the least recently used entry
+        self.evictions += 1
+        return int(self.last_used.argmin())
+
+    def add(self, query: str, answer: str):
+        """Store an answer, replacing a near-duplicate entry if one exists"""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        slot, similarity = self.search_batch([query])[0]
+        if slot < 0 or similarity < self.threshold:
+            slot = self._free_slot(now)
+            self.vectors[slot] = self.vectorizer.transform([query])[0]
+            self.keys[slot] = self._key(query)
+            self.queries[slot] = query
+
+        self.answers[slot] = answer
+        self.occupied[slot] = True
+        self.last_used[slot] = now
+        self.expires_at[slot] = now + self.ttl_seconds
+        self.stores += 1
+
+    def stats(self) -> dict:
+        """Get hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": int(self._live_mask(time.time()).sum()),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_hit_similarity": round(self._hit_similarity_total / self.hits, 4) if self.hits else None,
+            "stores": self.stores,
+            "evictions": self.evictions
+        }
+
+
+# Global instance
+semantic_cache = SemanticCache(
+    capacity=settings.semantic_cache_capacity,
+    threshold=settings.semantic_cache_threshold,
+    ttl_seconds=settings.semantic_cache_ttl_seconds,
+    n_features=settings.semantic_cache_features,
+    enabled=settings.semantic_cache_enabled
+)
@@ -0,0 +1,242 @@
+"""
+Resumable Streams
+Keeps a streamed answer generating when its client drops (e.g. a phone
+switching networks), so the client can reconnect and continue from the
+last character it received instead of asking again. The visible text is
+checkpointed to MongoDB, so a stream can also be resumed from another API
+process or after it finished. A stream nobody reattaches to within the
+grace period is cancelled.
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+from starlette.background import BackgroundTasks
+from config import settings
+from services.db_service import db_service
+
+
+# Receives the visible-output callback and the tasks to run once the answer is done;
+# returns the final assistant message
+StreamProducer = Callable[[Callable[[str], Awaitable[None]], BackgroundTasks], Awaitable[dict]]
+
+INTERRUPTED_ERROR = {"detail": "The answer was interrupted before it finished, please ask again", "retry_after": None}
+
+
+class StreamSession:
+    """An answer being generated by this process"""
+
+    def __init__(self, stream_id: str, chat_id: str, user_id: str):
+        self.stream_id = stream_id
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.text = ""
+        self.status = StreamRegistry.STATUS_STREAMING
+        self.message: Optional[dict] = None
+        self.error: Optional[dict] = None
+        self.listeners = 0
+        self.task: Optional[asyncio.Task] = None
+        # Set and replaced on every change so attached clients wake up
+        self._changed = asyncio.Event()
+
+    def snapshot(self) -> dict:
+        return {
+            "stream_id": self.stream_id,
+            "chat_id": self.chat_id,
+            "user_id": self.user_id,
+            "text": self.text,
+            "status": self.status,
+            "message": self.message,
+            "error": self.error
+        }
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class StreamRegistry:
+    """Runs streamed answers independently of the connection that started them"""
+
+    STATUS_STREAMING = "streaming"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CANCELLED = "cancelled"
+
+    def __init__(self, grace_seconds: float, checkpoint_interval_seconds: float, ttl_seconds: int):
+        self.grace_seconds = grace_seconds
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, StreamSession] = {}
+        # Keep references to the cancellation timers so they aren't garbage collected
+        self._timers = set()
+
+        self.started = 0
+        self.resumed = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.checkpoints = 0
+        self.checkpoint_errors = 0
+
+    def start(self, chat_id: str, user_id: str, producer: StreamProducer) -> StreamSession:
+        """Start generating an answer in the background"""
+        session = StreamSession(uuid.uuid4().hex, chat_id, user_id)
+        self._sessions[session.stream_id] = session
+        session.task = asyncio.create_task(self._run(session, producer))
+        session.task.add_done_callback(lambda task: self._forget(session))
+        self.started += 1
+        return session
+
+    def _forget(self, session: StreamSession):
+        """Drop a finished session; covers a task cancelled before _run got to start"""
+        if self._sessions.pop(session.stream_id, None) and session.status == self.STATUS_STREAMING:
+            session.status = self.STATUS_CANCELLED
+            session.error = INTERRUPTED_ERROR
+            self.cancelled += 1
+            session.notify()
+
+    def get_local(self, stream_id: str) -> Optional[StreamSession]:
+        """Get a stream generated by this process"""
+        return self._sessions.get(stream_id)
+
+    async def snapshot(self, stream_id: str, user_id: str) -> Optional[dict]:
+        """
+        Get the text and status of a stream owned by the user: from memory if
+        this process generates it, otherwise from its last checkpoint.
+        """
+        session = self._sessions.get(stream_id)
+        if session:
+            snapshot = session.snapshot()
+        else:
+            checkpoint = await db_service.get_stream_checkpoint(stream_id)
+            if not checkpoint:
+                return None
+            snapshot = {
+                "stream_id": stream_id,
+                "chat_id": checkpoint["chat_id"],
+                "user_id": checkpoint["user_id"],
+                "text": checkpoint.get("text", ""),
+                "status": checkpoint["status"],
+                "message": checkpoint.get("message"),
+                "error": checkpoint.get("error")
+            }
+            # The process generating it went away without a final checkpoint
+            stale = time.time() - checkpoint.get("checkpointed_at", 0) > settings.llm_timeout_seconds
+            if snapshot["status"] == self.STATUS_STREAMING and stale:
+                snapshot["status"] = self.STATUS_CANCELLED
+                snapshot["error"] = INTERRUPTED_ERROR
+
+        return snapshot if snapshot["user_id"] == user_id else None
+
+    async def wait(self, stream_id: str, timeout: float):
+        """Wait until the stream changes (or the next poll for streams of other processes)"""
+        session = self._sessions.get(stream_id)
+        if session:
+            await session.wait(timeout)
+        else:
+            await asyncio.sleep(timeout)
+
+    def attach(self, session: StreamSession, resumed: bool = False):
+        """Count a client following the stream"""
+        session.listeners += 1
+        if resumed:
+            self.resumed += 1
+
+    def detach(self, session: StreamSession):
+        """Stop counting a client; the stream is cancelled if nobody reattaches in time"""
+        session.listeners -= 1
+        if session.listeners > 0 or session.task is None or session.task.done():
+            return
+
+        if self.grace_seconds <= 0:
+            session.task.cancel()
+            return
+        timer = asyncio.create_task(self._cancel_if_abandoned(session))
+        self._timers.add(timer)
+        timer.add_done_callback(self._timers.discard)
+
+    async def _cancel_if_abandoned(self, session: StreamSession):
+        await asyncio.sleep(self.grace_seconds)
+        if session.listeners == 0 and not session.task.done():
+            print(f"Stream {session.stream_id}: no client reattached within {self.grace_seconds}s, generation cancelled")
+            session.task.cancel()
+
+    async def _run(self, session: StreamSession, producer: StreamProducer):
+        checkpointed_at = time.perf_counter()
+        # The first checkpoint (which lets other processes find the stream) is written
+        # alongside the producer rather than delaying generation
+        initial_checkpoint = asyncio.create_task(self._checkpoint(session))
+
+        async def emit(text: str):
+            nonlocal checkpointed_at
+            session.text += text
+            session.notify()
+            # Partial output is written at most once per checkpoint interval, never
+            # while the first checkpoint is still in flight
+            if initial_checkpoint.done() and time.perf_counter() - checkpointed_at >= self.checkpoint_interval_seconds:
+                checkpointed_at = time.perf_counter()
+                await self._checkpoint(session)
+
+        background_tasks = BackgroundTasks()
+        try:
+            session.message = await producer(emit, background_tasks)
+            session.status = self.STATUS_DONE
+            self.completed += 1
+        except asyncio.CancelledError:
+            session.status = self.STATUS_CANCELLED
+            session.error = INTERRUPTED_ERROR
+            self.cancelled += 1
+        except Exception as e:
+            print(f"Stream {session.stream_id} failed: {e}")
+            session.status = self.STATUS_FAILED
+            session.error = {"detail": "Failed to generate the answer, please try again", "retry_after": None}
+            self.failed += 1
+        finally:
+            session.notify()
+            # The final checkpoint must not be overwritten by the first one
+            await asyncio.wait([initial_checkpoint])
+            await self._checkpoint(session)
+            self._sessions.pop(session.stream_id, None)
+
+        # e.g. the conversation summary refresh, once the answer is available
+        await background_tasks()
+
+    async def _checkpoint(self, session: StreamSession):
+        fields = session.snapshot()
+        del fields["stream_id"]
+        fields["checkpointed_at"] = time.time()
+        if await db_service.save_stream_checkpoint(session.stream_id, fields, self.ttl_seconds):
+            self.checkpoints += 1
+        else:
+            self.checkpoint_errors += 1
+
+    def stats(self) -> dict:
+        """Get stream counters for monitoring"""
+        return {
+            "active": len(self._sessions),
+            "detached": sum(1 for session in self._sessions.values() if session.listeners == 0),
+            "grace_seconds": self.grace_seconds,
+            "started": self.started,
+            "resumed": self.resumed,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "checkpoints": self.checkpoints,
+            "checkpoint_errors": self.checkpoint_errors
+        }
+
+
+# Global instance
+stream_sessions = StreamRegistry(
+    grace_seconds=settings.stream_resume_grace_seconds,
+    checkpoint_interval_seconds=settings.stream_checkpoint_interval_seconds,
+    ttl_seconds=settings.stream_checkpoint_ttl_seconds
+)
@@ -0,0 +1,125 @@
+"""
+Conversation Summary Service
+Condenses older turns of long chats into a running summary stored on the
+chat document, so the prompt only carries the summary plus the most recent
+messages no matter how long the chat gets. Summary calls go through
+admission control at background priority, so they only use the LLM when
+no user turn is waiting.
+"""
+
+from typing import Dict, List
+from config import settings
+from services.admission_service import admission_controller, AdmissionController, AdmissionRejected
+from services.db_service import db_service
+from services.llm_service import llm_service
+
+
+class SummaryService:
+    """Keeps the `summary` / `summarized_count` fields of a chat up to date"""
+
+    def __init__(self, trigger_messages: int, keep_recent_messages: int, enabled: bool = True):
+        self.trigger_messages = trigger_messages
+        self.keep_recent_messages = keep_recent_messages
+        self.enabled = enabled
+        # Chats with a refresh in flight, so concurrent turns don't summarize twice
+        self._refreshing = set()
+        self.refreshes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.deferred = 0
+        self.summarized_messages = 0
+
+    def needs_refresh(self, message_count: int, summarized_count: int) -> bool:
+        """Check if enough messages are not covered by the summary yet"""
+        return self.enabled and message_count - summarized_count > self.trigger_messages
+
+    @staticmethod
+    def build_context(context: dict) -> List[Dict[str, str]]:
+        """
+        Turn a chat context from db_service.get_chat_context (or get_turn_context) into LLM messages:
+        the summary as a system message followed by the messages it doesn't cover.
+        """
+        messages = context.get("messages", [])
+        summarized_count = context.get("summarized_count", 0)
+
+        # Position of the first fetched message in the whole chat
+        if messages and "seq" in messages[0]:
+            first_index = messages[0]["seq"]
+        else:
+            first_index = context.get("message_count", len(messages)) - len(messages)
+        unsummarized = messages[max(0, summarized_count - first_index):]
+
+        formatted_messages = []
+        if context.get("summary"):
+            formatted_messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{context['summary']}"
+            })
+        formatted_messages.extend(
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in unsummarized
+        )
+        return formatted_messages
+
+    async def refresh(self, chat_id: str):
+        """Fold the messages older than the recent window into the chat summary"""
+        if chat_id in self._refreshing:
+            self.skipped += 1
+            return
+
+        self._refreshing.add(chat_id)
+        try:
+            context = await db_service.get_chat_context(chat_id, count=1)
+            if not context:
+                return
+
+            start = context["summarized_count"]
+            end = context["message_count"] - self.keep_recent_messages
+            if end <= start:
+                return
+
+            new_messages = await db_service.get_messages_range(chat_id, start, end - start)
+            try:
+                async with admission_controller.slot(AdmissionController.PRIORITY_BACKGROUND):
+                    summary = await llm_service.summarize_conversation(context["summary"], new_messages)
+            except AdmissionRejected:
+                # Busy; the next turn of the chat triggers the refresh again
+                self.deferred += 1
+                return
+            if not summary:
+                self.failures += 1
+                return
+
+            if await db_service.update_chat_summary(chat_id, summary, end, start):
+                self.refreshes += 1
+                self.summarized_messages += end - start
+                print(f"Chat {chat_id}: summarized messages {start}-{end}")
+            else:
+                self.skipped += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"Warning: Could not refresh summary for chat {chat_id}: {e}")
+        finally:
+            self._refreshing.discard(chat_id)
+
+    def stats(self) -> dict:
+        """Get summary refresh counters for monitoring"""
+        return {
+            "enabled": self.enabled,
+            "trigger_messages": self.trigger_messages,
+            "keep_recent_messages": self.keep_recent_messages,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "deferred": self.deferred,
+            "summarized_messages": self.summarized_messages,
+            "in_progress": len(self._refreshing)
+        }
+
+
+# Global instance
+summary_service = SummaryService(
+    trigger_messages=settings.summary_trigger_messages,
+    keep_recent_messages=settings.summary_keep_recent_messages,
+    enabled=settings.summary_enabled
+)
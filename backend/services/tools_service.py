@@ -4,10 +4,12 @@ This enables the LLM to perform actions like booking appointments,
 getting doctor/hospital lists, and changing passwords.
 """
 
+import asyncio
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-from services.db_service import db_service
+from services.db_service import db_service, SlotUnavailableError
+from services.catalog_service import catalog_cache
 from services.auth_service import get_password_hash, verify_password
 from services.email_service import email_service
 
@@ -125,9 +127,35 @@ AVAILABLE_TOOLS = [
 ]
 
 
+# Tools that only read data and can safely run at the same time
+READ_ONLY_TOOLS = {"get_doctors", "get_hospitals", "get_user_appointments"}
+
+
 class ToolsService:
     """Service for executing AI tool/function calls"""
     
+    async def execute_tools(self, tool_calls: List[Tuple[str, Dict[str, Any]]], user_id: str) -> List[Dict[str, Any]]:
+        """
+        Execute several tool calls from one LLM response.
+        
+        Read-only tools run concurrently; tools that change data run one after
+        another in the given order. Results are returned in the order of tool_calls.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
+        
+        async def run(index: int):
+            tool_name, parameters = tool_calls[index]
+            results[index] = await self.execute_tool(tool_name, parameters, user_id)
+        
+        async def run_in_order(indexes: List[int]):
+            for index in indexes:
+                await run(index)
+        
+        reads = [i for i, (tool_name, _) in enumerate(tool_calls) if tool_name in READ_ONLY_TOOLS]
+        writes = [i for i, (tool_name, _) in enumerate(tool_calls) if tool_name not in READ_ONLY_TOOLS]
+        await asyncio.gather(*(run(i) for i in reads), run_in_order(writes))
+        return results
+    
     async def execute_tool(self, tool_name: str, parameters: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """
         Execute a tool/function call
@@ -167,7 +195,7 @@ class ToolsService:
     async def _get_doctors(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Get list of doctors"""
         specialization = parameters.get("specialization")
-        doctors = await db_service.get_all_doctors(specialization=specialization)
+        doctors = await catalog_cache.get_all_doctors(specialization=specialization)
         
         return {
             "success": True,
@@ -181,7 +209,7 @@ class ToolsService:
         specialization = parameters.get("specialization")
         emergency_only = parameters.get("emergency_only", False)
         
-        hospitals = await db_service.get_all_hospitals(
+        hospitals = await catalog_cache.get_all_hospitals(
             city=city,
             specialization=specialization,
             emergency_only=emergency_only
@@ -205,36 +233,27 @@ class ToolsService:
                 }
         
         # Get hospital name from doctor info
-        doctor = await db_service.get_doctor_by_id(parameters["doctor_id"])
+        doctor = await catalog_cache.get_doctor_by_id(parameters["doctor_id"])
         hospital_name = doctor.get("hospital") if doctor else parameters.get("hospital_name", "N/A")
         
-        # Check for conflicts
-        conflict = await db_service.check_appointment_conflict(
-            doctor_id=parameters["doctor_id"],
-            appointment_date=parameters["appointment_date"],
-            appointment_time=parameters["appointment_time"]
-        )
-        
-        if conflict:
+        # Create appointment; the unique slot index rejects a slot that is already booked
+        try:
+            appointment = await db_service.create_appointment(
+                user_id=user_id,
+                doctor_id=parameters["doctor_id"],
+                doctor_name=parameters["doctor_name"],
+                specialization=parameters["specialization"],
+                appointment_date=parameters["appointment_date"],
+                appointment_time=parameters["appointment_time"],
+                reason=parameters["reason"],
+                hospital_name=hospital_name
+            )
+        except SlotUnavailableError:
             return {
                 "success": False,
                 "error": "This time slot is already booked. Please choose another time."
             }
         
-        # Create appointment
-        appointment_id = await db_service.create_appointment(
-            user_id=user_id,
-            doctor_id=parameters["doctor_id"],
-            doctor_name=parameters["doctor_name"],
-            specialization=parameters["specialization"],
-            appointment_date=parameters["appointment_date"],
-            appointment_time=parameters["appointment_time"],
-            reason=parameters["reason"],
-            hospital_name=hospital_name
-        )
-        
-        appointment = await db_service.get_appointment_by_id(appointment_id)
-        
         # Send confirmation email
         user = await db_service.get_user_by_id(user_id)
         if user:
@@ -2,6 +2,9 @@ import React, { useState, useEffect, useRef } from 'react';
 import { chatAPI } from '../services/api';
 import '../styles/MedicalChat.css';
 
+// Messages loaded when a chat is opened and per scroll to the top
+const CHAT_PAGE_SIZE = 30;
+
 // Simple markdown-like formatter for bold text and line breaks
 const formatMessage = (text) => {
   if (!text) return '';
@@ -37,14 +40,32 @@ const MedicalChat = () => {
   const [messages, setMessages] = useState([]);
   const [inputMessage, setInputMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const [showChatList, setShowChatList] = useState(true);
+  // Cursor of the previous page of the active chat; null once everything is loaded
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const messagesContainerRef = useRef(null);
+  const activeChatIdRef = useRef(null);
+  // Distance from the bottom to keep while older messages are added above
+  const prependOffsetRef = useRef(null);
 
   useEffect(() => {
     loadChats();
   }, []);
 
   useEffect(() => {
+    activeChatIdRef.current = activeChat?.id ?? null;
+  }, [activeChat]);
+
+  useEffect(() => {
+    const container = messagesContainerRef.current;
+    if (prependOffsetRef.current !== null && container) {
+      container.scrollTop = container.scrollHeight - prependOffsetRef.current;
+      prependOffsetRef.current = null;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -67,6 +88,7 @@ const MedicalChat = () => {
       setChats([newChat, ...chats]);
       setActiveChat(newChat);
       setMessages([]);
+      setOlderCursor(null);
       setShowChatList(false);
     } catch (error) {
       console.error('Error creating chat:', error);
@@ -75,15 +97,46 @@ const MedicalChat = () => {
 
   const handleSelectChat = async (chatId) => {
     try {
-      const chat = await chatAPI.getChat(chatId);
+      // Only the latest page; older messages are fetched when scrolling up
+      const chat = await chatAPI.getChat(chatId, { limit: CHAT_PAGE_SIZE });
       setActiveChat(chat);
       setMessages(chat.messages || []);
+      setOlderCursor(chat.next_cursor ?? null);
       setShowChatList(false);
     } catch (error) {
       console.error('Error loading chat:', error);
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!activeChat || olderCursor === null || isLoadingOlder) return;
+
+    const chatId = activeChat.id;
+    setIsLoadingOlder(true);
+    try {
+      const page = await chatAPI.getChat(chatId, { limit: CHAT_PAGE_SIZE, before: olderCursor });
+      // Another chat was opened in the meantime
+      if (activeChatIdRef.current !== chatId) return;
+
+      const container = messagesContainerRef.current;
+      if (container) {
+        prependOffsetRef.current = container.scrollHeight - container.scrollTop;
+      }
+      setMessages(prev => [...(page.messages || []), ...prev]);
+      setOlderCursor(page.next_cursor ?? null);
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
+  const handleMessagesScroll = (e) => {
+    if (e.currentTarget.scrollTop < 80) {
+      loadOlderMessages();
+    }
+  };
+
   const handleDeleteChat = async (e, chatId) => {
     e.stopPropagation();
     // if (!window.confirm('Delete this conversation?')) return;
@@ -94,6 +147,7 @@ const MedicalChat = () => {
       if (activeChat?.id === chatId) {
         setActiveChat(null);
         setMessages([]);
+        setOlderCursor(null);
       }
     } catch (error) {
       console.error('Error deleting chat:', error);
@@ -129,16 +183,37 @@ const MedicalChat = () => {
     setInputMessage('');
     setIsLoading(true);
 
+    let streamStarted = false;
+
     try {
-      const response = await chatAPI.sendMessage(chatToUse.id, inputMessage);
-      setMessages(prev => [...prev, response]);
+      const response = await chatAPI.sendMessageStream(chatToUse.id, inputMessage, (token) => {
+        if (!streamStarted) {
+          // First token: swap the typing indicator for a live assistant message
+          streamStarted = true;
+          setIsStreaming(true);
+          setMessages(prev => [...prev, {
+            role: 'assistant',
+            content: token,
+            timestamp: new Date().toISOString()
+          }]);
+          return;
+        }
+        setMessages(prev => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, content: last.content + token }];
+        });
+      });
+      // The final message replaces the streamed text (it may include tool results)
+      setMessages(prev => streamStarted ? [...prev.slice(0, -1), response] : [...prev, response]);
       loadChats(); // Refresh chat list for updated titles
     } catch (error) {
       console.error('Error sending message:', error);
-      setMessages(prev => prev.slice(0, -1));
-      alert('Failed to send message. Please try again.');
+      setMessages(prev => prev.slice(0, streamStarted ? -2 : -1));
+      // The server is busy: show its message with the suggested retry delay
+      alert(error.retryAfter ? error.message : 'Failed to send message. Please try again.');
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
     }
   };
 
@@ -227,7 +302,16 @@ const MedicalChat = () => {
               </p>
             </div>
           ) : (
-            <div className="messages-container">
+            <div className="messages-container" ref={messagesContainerRef} onScroll={handleMessagesScroll}>
+              {olderCursor !== null && (
+                <button
+                  className="load-older-btn"
+                  onClick={loadOlderMessages}
+                  disabled={isLoadingOlder}
+                >
+                  {isLoadingOlder ? 'Loading...' : 'Load earlier messages'}
+                </button>
+              )}
               {messages.map((msg, index) => (
                 <div 
                   key={index} 
@@ -242,7 +326,7 @@ const MedicalChat = () => {
                   </div>
                 </div>
               ))}
-              {isLoading && (
+              {isLoading && !isStreaming && (
                 <div className="message assistant">
                   <div className="message-avatar">🤖</div>
                   <div className="message-content">
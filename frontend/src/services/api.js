@@ -105,6 +105,60 @@ export const authAPI = {
   },
 };
 
+// Delays before each attempt to resume a dropped answer stream
+const STREAM_RESUME_DELAYS_MS = [1000, 2000, 4000];
+
+// Open a Server-Sent Events request with the auth token
+const openEventStream = async (url, options) => {
+  const response = await fetch(url, {
+    ...options,
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: `Bearer ${getToken()}`,
+    },
+  });
+
+  if (response.status === 401) {
+    clearAuthData();
+    window.location.href = '/login';
+  }
+  if (!response.ok) {
+    throw new Error(`Stream request failed with status ${response.status}`);
+  }
+  return response;
+};
+
+// Read Server-Sent Events until the response ends, calling onEvent(event, payload) for each
+const readEvents = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+
+      onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 export const chatAPI = {
   // Create a new chat
   createChat: async () => {
@@ -118,9 +172,10 @@ export const chatAPI = {
     return response.data;
   },
 
-  // Get a specific chat
-  getChat: async (chatId) => {
-    const response = await api.get(`/api/chats/${chatId}`);
+  // Get a specific chat; pass { limit, before } to get one page of its messages.
+  // next_cursor in the response is the `before` value for the previous page (null on the first one)
+  getChat: async (chatId, params = {}) => {
+    const response = await api.get(`/api/chats/${chatId}`, { params });
     return response.data;
   },
 
@@ -137,6 +192,69 @@ export const chatAPI = {
     });
     return response.data;
   },
+
+  // Send a message and stream the reply; onToken receives each text delta.
+  // If the connection drops mid-answer, the stream is resumed where it stopped.
+  // Resolves with the final saved assistant message.
+  sendMessageStream: async (chatId, content, onToken) => {
+    let streamId = null;
+    // Characters received so far, counted like the server's offsets (code points)
+    let received = 0;
+    let finalMessage = null;
+
+    const handleEvent = (event, payload) => {
+      if (event === 'stream') {
+        streamId = payload.stream_id;
+      } else if (event === 'token') {
+        let text = payload.content;
+        if (payload.offset !== undefined) {
+          // A resumed stream may repeat text we already have
+          const chars = [...text];
+          const skip = received - payload.offset;
+          if (skip > 0) text = chars.slice(skip).join('');
+          received = Math.max(received, payload.offset + chars.length);
+        }
+        if (text) onToken?.(text);
+      } else if (event === 'done') {
+        finalMessage = payload;
+      } else if (event === 'error') {
+        const error = new Error(payload.detail);
+        error.retryAfter = payload.retry_after;
+        error.fromServer = true;
+        throw error;
+      }
+    };
+
+    const response = await openEventStream(`${API_URL}/api/chats/${chatId}/messages/stream`, {
+      method: 'POST',
+      body: JSON.stringify({ content }),
+    });
+    try {
+      await readEvents(response, handleEvent);
+    } catch (error) {
+      if (error.fromServer || !streamId) throw error;
+    }
+
+    // The connection dropped before the answer finished: continue from the last character received
+    for (const delay of STREAM_RESUME_DELAYS_MS) {
+      if (finalMessage || !streamId) break;
+      await new Promise((resolve) => setTimeout(resolve, delay));
+      try {
+        const resumed = await openEventStream(
+          `${API_URL}/api/chats/${chatId}/messages/stream/${streamId}?offset=${received}`,
+          { method: 'GET' }
+        );
+        await readEvents(resumed, handleEvent);
+      } catch (error) {
+        if (error.fromServer) throw error;
+      }
+    }
+
+    if (!finalMessage) {
+      throw new Error('Stream ended before the reply was complete');
+    }
+    return finalMessage;
+  },
 };
 
 // Profile API
@@ -254,4 +372,16 @@ export const hospitalsAPI = {
   },
 };
 
+// Search API
+export const searchAPI = {
+  // Autocomplete doctor names, specializations and cities
+  suggest: async (query, { limit = 10, types = null } = {}) => {
+    const params = { q: query, limit };
+    if (types) params.types = types.join(',');
+    
+    const response = await api.get('/api/search/suggest', { params });
+    return response.data;
+  },
+};
+
 export default api;